@@ -0,0 +1,249 @@
+"""
+Content addressed archive of downloaded LSR files
+
+Every file copied or moved into data/downloads is hashed and kept once under its sha256. An index maps
+each lsr name to the hashes it has held, so an identical re-download is spotted without reading the
+table and a changed one can be diffed row by row against the copy it replaces.
+
+The LSR carries no date, a download is named for the next month. A changed re-download of the month
+already merged is told apart from the next month by its rows: a new month changes nearly every count, a
+corrected download of the same month leaves most rows as they were.
+
+"""
+
+# system imports
+import datetime
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+# package imports
+from fs_reports.lazy import lazy_import
+pd = lazy_import('pandas')
+
+# module imports
+import fs_reports.files as files
+
+index_name = 'index.json'
+
+# results of adding a file
+NEW = 'new'
+DUPLICATE = 'duplicate'
+CHANGED = 'changed'
+
+# share of the merged month's rows a download must leave unchanged to be taken as that month again
+same_month_share = 0.5
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """
+    sha256 of a file, read in blocks
+
+    :param path: file to hash
+    :param block_size: bytes per read
+    :return string: hex digest
+    """
+    digest = hashlib.sha256()
+    with open(str(path), 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_keys(df):
+    """
+    key for each lsr row, (Desc, Name) numbered within repeats
+
+    :param df: lsr as read by pd.read_csv
+    :return MultiIndex: row keys
+    """
+    df = df.rename(columns={'Unnamed: 0': 'Desc'})
+    desc = df['Desc'].fillna('').astype(str) if 'Desc' in df.columns else pd.Series('', index=df.index)
+    name = df['Name'].fillna('').astype(str)
+    repeat = df.groupby([desc, name]).cumcount()
+    return pd.MultiIndex.from_arrays([desc.values, name.values, repeat.values], names=['Desc', 'Name', 'Repeat'])
+
+
+def diff_rows(old_file, new_file):
+    """
+    rows added, removed or changed between two lsr files
+
+    :param old_file: previous lsr
+    :param new_file: new lsr
+    :return dataframe: Change (added, removed or changed) plus the old and new values, indexed by row key
+    """
+    old = pd.read_csv(str(old_file))
+    new = pd.read_csv(str(new_file))
+    old.index = row_keys(old)
+    new.index = row_keys(new)
+    columns = [column for column in new.columns if column in old.columns and column not in ['Unnamed: 0', 'Name']]
+
+    added = new.index.difference(old.index)
+    removed = old.index.difference(new.index)
+    common = new.index.intersection(old.index)
+    old_common = old.loc[common, columns]
+    new_common = new.loc[common, columns]
+    different = ~((old_common == new_common) | (old_common.isna() & new_common.isna())).all(axis=1)
+    changed = common[different.values]
+
+    frames = []
+    for change, keys in [('added', added), ('removed', removed), ('changed', changed)]:
+        if len(keys) == 0:
+            continue
+        frame = pd.concat([old.reindex(keys)[columns].add_suffix(' old'),
+                           new.reindex(keys)[columns].add_suffix(' new')], axis=1)
+        frame.insert(0, 'Change', change)
+        frames.append(frame)
+    if len(frames) == 0:
+        return pd.DataFrame(columns=['Change'])
+    return pd.concat(frames)
+
+
+def not_loaded(result, name):
+    """
+    why an archived download is not to be merged as name
+
+    :param result: LsrArchive.add result
+    :param name: lsr file name the download was meant for
+    :return string: message, None when the download is to be merged
+    """
+    if result['status'] == DUPLICATE:
+        return 'Duplicate of ' + ', '.join(result['names']) + ', not loaded'
+    if result['name'] != name:
+        return ('Changed download of ' + result['name'] + ', ' + str(len(result['diff'])) +
+                ' rows differ, not loaded')
+    return None
+
+
+class LsrArchive:
+    """ hash index and object store for lsr files
+
+    """
+
+    def __init__(self, directory=None):
+        """ open (or create) the archive
+
+        :param directory: archive directory, default files.build_archive_directory
+        """
+        self.directory = Path(directory) if directory is not None else files.build_archive_directory()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index_file = self.directory.joinpath(index_name)
+        if index_file.exists():
+            with open(str(index_file), 'r') as fh:
+                self.index = json.load(fh)
+        else:
+            self.index = {'names': {}, 'hashes': {}}
+        self.last = None
+
+    def write_index(self):
+        """
+        write the index, renamed into place so a reader never sees a partial file
+
+        :return:
+        """
+        temp_name = self.directory.joinpath(index_name + '.tmp')
+        with open(str(temp_name), 'w') as fh:
+            json.dump(self.index, fh, indent=1)
+        os.replace(str(temp_name), str(self.directory.joinpath(index_name)))
+
+    def object_path(self, digest):
+        """
+        where the content for a hash is kept
+
+        :param digest: sha256 hex digest
+        :return Path: stored file
+        """
+        return self.directory.joinpath(digest[:2], digest + '.csv')
+
+    def current_hash(self, name):
+        """
+        latest hash held by a name
+
+        :param name: lsr file name, e.g. lsr_201601.csv
+        :return string: digest or None
+        """
+        versions = self.index['names'].get(name, [])
+        return versions[-1]['hash'] if versions else None
+
+    def add(self, source, name):
+        """
+        hash a file and store it under a name
+
+        duplicate means the content is already archived, either as the name's current content or under
+        another name, e.g. last month downloaded again. A duplicate of another name is not recorded under
+        this name. Changed means the name held different content before and the row diff is included
+
+        :param source: file to add
+        :param name: lsr file name it is stored as
+        :return dict: status, hash, previous hash, names already holding the content and the diff
+        """
+        digest = hash_file(source)
+        previous = self.current_hash(name)
+        holders = list(self.index['hashes'].get(digest, []))
+        result = {'status': NEW, 'name': name, 'hash': digest, 'previous': previous, 'names': holders,
+                  'diff': None}
+
+        if previous == digest or (len(holders) > 0 and name not in holders):
+            result['status'] = DUPLICATE
+            self.last = result
+            return result
+
+        path = self.object_path(digest)
+        if digest not in self.index['hashes']:
+            path.parent.mkdir(exist_ok=True)
+            shutil.copy(str(source), str(path))
+            self.index['hashes'][digest] = []
+        if previous is not None:
+            # new content, or the name going back to content it held before
+            result['status'] = CHANGED
+            result['diff'] = diff_rows(self.object_path(previous), path)
+
+        self.index['names'].setdefault(name, []).append(
+            {'hash': digest, 'added': datetime.datetime.now().isoformat(timespec='seconds')})
+        if name not in self.index['hashes'][digest]:
+            self.index['hashes'][digest].append(name)
+        self.write_index()
+        self.last = result
+        return result
+
+    def changed_month(self, source, name, share=None):
+        """
+        record a download as a changed copy of the month archived under name when most of its rows are
+        the same, so a corrected re-download of a merged month is not taken for the next month
+
+        :param source: download
+        :param name: lsr file name of the month last merged
+        :param share: rows that must be unchanged, default same_month_share
+        :return dict: add result with status CHANGED and the diff, None when it is not that month again
+        """
+        share = same_month_share if share is None else share
+        previous = self.current_hash(name)
+        if previous is None or hash_file(source) == previous:
+            return None
+        diff = diff_rows(self.object_path(previous), source)
+        rows = len(pd.read_csv(str(self.object_path(previous))).index)
+        unchanged = rows - (diff['Change'] != 'added').sum()
+        if rows == 0 or unchanged < share * rows:
+            return None
+        return self.add(source, name)
+
+    def names(self):
+        """
+        names held in the archive
+
+        :return list: lsr file names
+        """
+        return sorted(self.index['names'])
+
+    def restore(self, name, destination):
+        """
+        copy the latest content of a name back out
+
+        :param name: lsr file name
+        :param destination: Path to write
+        :return Path: destination
+        """
+        shutil.copy(str(self.object_path(self.current_hash(name))), str(destination))
+        return Path(destination)
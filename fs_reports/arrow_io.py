@@ -0,0 +1,218 @@
+"""
+Arrow IPC export and import of the table and aggregates
+
+Writes current_table, the ward x month cube and the leaderboards as Arrow IPC so other tools can map
+them without parsing csv, and streams the same tables over a pipe or socket.
+
+pyarrow is optional, it is only imported when one of these functions is used.
+
+"""
+
+# system imports
+from pathlib import Path
+
+# package imports
+import numpy as np
+import pandas as pd
+
+# module imports
+import fs_reports.cube as cube
+
+# schema metadata key holding the dataset name when streaming
+name_key = b'fs_reports.name'
+
+
+def require_arrow():
+    """
+    import pyarrow or explain how to get it
+
+    :return module: pyarrow
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Arrow export needs pyarrow, install it with pip install pyarrow')
+    return pyarrow
+
+
+def table_to_arrow(df):
+    """
+    convert the table, ward and name become dictionary columns
+
+    :param df: table with a DatetimeIndex, Sequence, Ward, Name, Indexed and Arbitrated
+    :return pyarrow.Table: converted table
+    """
+    pa = require_arrow()
+    dates = pd.DatetimeIndex(df.index).values.astype('datetime64[D]')
+    return pa.table({
+        'Date': pa.array(dates),
+        'Sequence': pa.array(df['Sequence'].values.astype(np.int64)),
+        'Ward': pa.array(df['Ward'].astype(object).values).dictionary_encode(),
+        'Name': pa.array(df['Name'].astype(object).values).dictionary_encode(),
+        'Indexed': pa.array(df['Indexed'].values.astype(np.int64)),
+        'Arbitrated': pa.array(df['Arbitrated'].values.astype(np.int64))
+    })
+
+
+def arrow_to_table(table):
+    """
+    convert back to the shape read_table_name builds from the csv
+
+    :param table: pyarrow.Table from table_to_arrow
+    :return dataframe: table with a DatetimeIndex
+    """
+    df = pd.DataFrame({
+        'Sequence': table.column('Sequence').to_numpy(),
+        'Ward': table.column('Ward').to_pandas().astype(object).values,
+        'Name': table.column('Name').to_pandas().astype(object).values,
+        'Indexed': table.column('Indexed').to_numpy(),
+        'Arbitrated': table.column('Arbitrated').to_numpy(),
+        'Date': pd.to_datetime(table.column('Date').to_numpy(zero_copy_only=False))
+    })
+    df = df.set_index(pd.DatetimeIndex(df.Date))
+    df.index.name = None
+    df['Month'] = df.index.month
+    df['Year'] = df.index.year
+    return df
+
+
+def cube_to_arrow(ward_cube):
+    """
+    long form cube, one row per ward and month
+
+    :param ward_cube: WardCube to convert
+    :return pyarrow.Table: Ward, MonthKey and one column per measure
+    """
+    pa = require_arrow()
+    month_count = ward_cube.month_count
+    columns = {
+        'Ward': pa.array(np.repeat(np.array(ward_cube.ward_names, dtype=object), month_count)),
+        'MonthKey': pa.array(np.tile(ward_cube.month_keys(), len(ward_cube.ward_names)))
+    }
+    for measure in ward_cube.measures:
+        columns[measure] = pa.array(np.ascontiguousarray(ward_cube.values(measure)).ravel())
+    return pa.table(columns)
+
+
+def arrow_to_cube(table):
+    """
+    rebuild a cube from its long form
+
+    :param table: pyarrow.Table from cube_to_arrow
+    :return WardCube: the cube
+    """
+    wards = table.column('Ward').to_pandas().astype(object).values
+    keys = table.column('MonthKey').to_numpy()
+    ward_names = list(dict.fromkeys(wards))
+    if len(keys) == 0:
+        return cube.WardCube()
+    first_key = int(keys.min())
+    month_count = int(keys.max()) - first_key + 1
+    values = {measure: table.column(measure).to_numpy().reshape(len(ward_names), month_count)
+              for measure in cube.WardCube.measures}
+    return cube.WardCube.from_values(ward_names, first_key, values)
+
+
+def leaders_to_arrow(my_data, months=(1, 3, 6), max_size=20):
+    """
+    the individual lists of the stake report as one table
+
+    :param my_data: IndexerValues with a table loaded
+    :param months: list of trailing month counts
+    :param max_size: maximum number of lines in each list
+    :return pyarrow.Table: Column, Months, Name and Value
+    """
+    pa = require_arrow()
+    frames = []
+    for column in ['Indexed', 'Arbitrated']:
+        for month_count in months:
+            individuals = my_data.individual_list(my_data.current_table, month_count, max_size, column)
+            frames.append(pd.DataFrame({'Column': column,
+                                        'Months': month_count,
+                                        'Name': individuals['Name'].astype(object).values,
+                                        'Value': individuals[column].values.astype(np.int64)}))
+    df = pd.concat(frames, ignore_index=True)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def export_tables(my_data):
+    """
+    every exported dataset by name
+
+    :param my_data: IndexerValues with a table loaded
+    :return dict: name to pyarrow.Table
+    """
+    return {'table': table_to_arrow(my_data.current_table),
+            'cube': cube_to_arrow(my_data.cube),
+            'leaders': leaders_to_arrow(my_data)}
+
+
+def write_files(tables, directory):
+    """
+    write each dataset as an Arrow IPC file, name.arrow
+
+    :param tables: dict of name to pyarrow.Table
+    :param directory: directory for the files
+    :return list: paths written
+    """
+    pa = require_arrow()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = directory.joinpath(name + '.arrow')
+        with pa.OSFile(str(path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        paths.append(path)
+    return paths
+
+
+def read_file(path):
+    """
+    memory map an Arrow IPC file, the columns are not copied
+
+    :param path: file written by write_files
+    :return pyarrow.Table: the dataset
+    """
+    pa = require_arrow()
+    with pa.memory_map(str(path), 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def send_tables(sink, tables):
+    """
+    write datasets one after another as Arrow IPC streams, e.g. to sock.makefile('wb')
+
+    :param sink: writable binary file object
+    :param tables: dict of name to pyarrow.Table
+    :return:
+    """
+    pa = require_arrow()
+    for name, table in tables.items():
+        metadata = dict(table.schema.metadata or {})
+        metadata[name_key] = name.encode()
+        table = table.replace_schema_metadata(metadata)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    sink.flush()
+
+
+def receive_tables(source):
+    """
+    read datasets written by send_tables until the sender closes
+
+    :param source: readable binary file object
+    :return dict: name to pyarrow.Table
+    """
+    pa = require_arrow()
+    tables = {}
+    while True:
+        try:
+            reader = pa.ipc.open_stream(source)
+        except pa.ArrowInvalid:
+            # nothing left on the stream
+            break
+        table = reader.read_all()
+        tables[table.schema.metadata[name_key].decode()] = table
+    return tables
@@ -0,0 +1,144 @@
+"""
+Zip bundle of the reports for distribution
+
+Reports are streamed into the zip as each one is rendered, copied in blocks so no PDF is held in memory.
+A new part is started before a part would pass the size limit (mail servers cap attachments) and
+every part carries the manifest of its own files, the full manifest is written next to the parts.
+
+"""
+
+# system imports
+import hashlib
+import json
+import zipfile
+from pathlib import Path
+
+# package imports
+# module imports
+
+manifest_name = 'MANIFEST.json'
+block_size = 1024 * 1024
+
+
+class ReportBundle:
+    """ zip parts being written
+
+    use as a context manager or call close after the last report
+    """
+
+    def __init__(self, directory, base_name, max_bytes=None, compression=zipfile.ZIP_DEFLATED):
+        """ set up the bundle, the first part is opened with the first report
+
+        :param directory: where the parts go
+        :param base_name: parts are base_name_part1.zip, base_name_part2.zip ...
+        :param max_bytes: largest part, None for a single part
+        :param compression: zipfile compression
+        """
+        self.directory = Path(directory)
+        self.base_name = base_name
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.parts = []
+        self.entries = []
+        self.zip_file = None
+        self.part_bytes = 0
+
+    def part_name(self, number):
+        """
+        file name of a part
+
+        :param number: part number, from 1
+        :return Path: part file name
+        """
+        return self.directory.joinpath(self.base_name + '_part' + str(number) + '.zip')
+
+    def close_part(self):
+        """
+        write the part's manifest and close it
+
+        :return:
+        """
+        if self.zip_file is None:
+            return
+        part = len(self.parts)
+        entries = [entry for entry in self.entries if entry['part'] == part]
+        self.zip_file.writestr(manifest_name, json.dumps(entries, indent=1))
+        self.zip_file.close()
+        self.zip_file = None
+
+    def open_part(self):
+        """
+        start the next part
+
+        :return:
+        """
+        self.close_part()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.part_name(len(self.parts) + 1)
+        self.zip_file = zipfile.ZipFile(str(path), 'w', self.compression)
+        self.parts.append(path)
+        self.part_bytes = 0
+
+    def add(self, path, arcname=None):
+        """
+        stream one file into the bundle
+
+        the file size is the limit check, a compressed file is never larger
+
+        :param path: file to add
+        :param arcname: name in the zip, default the file name
+        :return dict: manifest entry
+        """
+        path = Path(path)
+        size = path.stat().st_size
+        if self.zip_file is None or (self.max_bytes is not None and self.part_bytes > 0 and
+                                     self.part_bytes + size > self.max_bytes):
+            self.open_part()
+
+        digest = hashlib.sha256()
+        info = zipfile.ZipInfo.from_file(str(path), arcname or path.name)
+        info.compress_type = self.compression
+        with open(str(path), 'rb') as source, self.zip_file.open(info, 'w') as destination:
+            for block in iter(lambda: source.read(block_size), b''):
+                digest.update(block)
+                destination.write(block)
+        self.part_bytes += info.compress_size
+        entry = {'name': info.filename, 'part': len(self.parts), 'size': size,
+                 'compressed': info.compress_size, 'sha256': digest.hexdigest()}
+        self.entries.append(entry)
+        return entry
+
+    def close(self):
+        """
+        close the last part and write the full manifest
+
+        :return Path: manifest file
+        """
+        self.close_part()
+        manifest = self.directory.joinpath(self.base_name + '_manifest.json')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(str(manifest), 'w') as fh:
+            json.dump({'parts': [path.name for path in self.parts], 'files': self.entries}, fh, indent=1)
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def bundle_reports(paths, directory, base_name, max_bytes=None):
+    """
+    bundle reports that are already rendered
+
+    :param paths: report files
+    :param directory: where the parts go
+    :param base_name: base name of the parts
+    :param max_bytes: largest part, None for a single part
+    :return ReportBundle: the closed bundle with parts and entries
+    """
+    with ReportBundle(directory, base_name, max_bytes) as report_bundle:
+        for path in paths:
+            report_bundle.add(path)
+    return report_bundle
@@ -0,0 +1,263 @@
+"""
+Out of core processing of the table
+
+Streams the table in row chunks and keeps only state that grows with the number of wards, months
+and individuals (never with the number of rows): the ward x month cube, per person running totals
+and streaks, and mergeable top K leaderboards.
+
+The table is written in date order, chunks are expected to arrive in that order.
+
+"""
+
+# system imports
+import datetime
+import heapq
+
+# package imports
+import numpy as np
+import pandas as pd
+
+# module imports
+import fs_reports.cube as cube
+import fs_reports.history as history
+
+
+def key_date(key):
+    """
+    datetime for a month key
+
+    :param key: month key
+    :return datetime: first day of the month
+    """
+    return datetime.datetime(int(key) // 12, int(key) % 12 + 1, 1)
+
+
+def read_chunks(file_name, chunksize, date_format="%Y-%m-%d"):
+    """
+    read the table csv a chunk of rows at a time
+
+    :param file_name: table file name
+    :param chunksize: rows per chunk
+    :param date_format: format of the date column
+    :return generator: dataframes with Year, Month, Ward, Name, Indexed and Arbitrated
+    """
+    for chunk in pd.read_csv(file_name, index_col=0, chunksize=chunksize):
+        dates = pd.to_datetime(chunk.index, format=date_format)
+        chunk['Year'] = dates.year
+        chunk['Month'] = dates.month
+        yield chunk
+
+
+class TopK:
+    """ mergeable top K list
+
+    exact as long as a key is only offered once per list, which holds for one row per person per month
+    """
+
+    def __init__(self, k):
+        """ initialize an empty list
+
+        :param k: number of entries to keep
+        """
+        self.k = k
+        self.heap = []
+
+    def add(self, keys, values):
+        """
+        offer a batch of keys and values
+
+        :param keys: array of keys (names)
+        :param values: array of values
+        :return TopK: self
+        """
+        if len(values) > self.k:
+            # only the batch top K can make the list
+            top = np.argpartition(values, -self.k)[-self.k:]
+            keys = np.asarray(keys)[top]
+            values = np.asarray(values)[top]
+        for key, value in zip(keys, values):
+            item = (value, key)
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item > self.heap[0]:
+                heapq.heapreplace(self.heap, item)
+        return self
+
+    def merge(self, other):
+        """
+        fold another list into this one
+
+        :param other: TopK built from a different partition
+        :return TopK: self
+        """
+        values = [value for value, key in other.heap]
+        keys = [key for value, key in other.heap]
+        return self.add(keys, np.array(values))
+
+    def items(self):
+        """
+        entries largest first
+
+        :return list: (key, value) tuples
+        """
+        return [(key, value) for value, key in sorted(self.heap, reverse=True)]
+
+
+class ChunkedAggregator:
+    """ incremental aggregates over a stream of table chunks
+
+    """
+
+    def __init__(self, top=10, column='Indexed'):
+        """ initialize empty state
+
+        :param top: size of the leaderboards
+        :param column: Indexed or Arbitrated for leaderboards and streaks
+        """
+        self.top = top
+        self.column = column
+        self.cube = cube.WardCube()
+        self.rows = 0
+
+        # per person state, arrays indexed by the code in name_index
+        self.name_index = {}
+        self.names = []
+        self.totals = np.zeros(0, dtype=np.int64)
+        self.first_key = np.zeros(0, dtype=np.int64)
+        self.last_key = np.zeros(0, dtype=np.int64)
+        self.run = np.zeros(0, dtype=np.int64)
+        self.longest = np.zeros(0, dtype=np.int64)
+
+        self.monthly_leaders = {}
+        self.new_counts = {}
+
+    def _codes(self, names):
+        """
+        person codes for the names, adding new people
+
+        :param names: array of names
+        :return array: codes
+        """
+        new_names = [name for name in dict.fromkeys(names) if name not in self.name_index]
+        if len(new_names) > 0:
+            for name in new_names:
+                self.name_index[name] = len(self.names)
+                self.names.append(name)
+            grow = len(new_names)
+            self.totals = np.concatenate((self.totals, np.zeros(grow, dtype=np.int64)))
+            self.first_key = np.concatenate((self.first_key, np.full(grow, -1, dtype=np.int64)))
+            self.last_key = np.concatenate((self.last_key, np.full(grow, -1, dtype=np.int64)))
+            self.run = np.concatenate((self.run, np.zeros(grow, dtype=np.int64)))
+            self.longest = np.concatenate((self.longest, np.zeros(grow, dtype=np.int64)))
+        return np.array([self.name_index[name] for name in names], dtype=np.int64)
+
+    def add_chunk(self, chunk):
+        """
+        fold one chunk into the aggregates
+
+        :param chunk: dataframe from read_chunks
+        :return ChunkedAggregator: self
+        """
+        if len(chunk) == 0:
+            return self
+        self.rows += len(chunk)
+        keys = history.month_key(chunk['Year'].values, chunk['Month'].values).astype(np.int64)
+        first, last = keys.min(), keys.max()
+        chunk_cube = cube.WardCube().build(chunk, key_date(first), int(last - first + 1))
+        self.cube = cube.merge_cubes([self.cube, chunk_cube])
+
+        codes = self._codes(chunk['Name'].values)
+        values = chunk[self.column].values.astype(np.int64)
+        np.add.at(self.totals, codes, values)
+        wards = chunk['Ward'].values
+
+        for key in np.unique(keys):
+            in_month = keys == key
+            month_codes = codes[in_month]
+            month_values = values[in_month]
+
+            board = self.monthly_leaders.setdefault(int(key), TopK(self.top))
+            board.add(chunk['Name'].values[in_month], month_values)
+
+            # a person with rows in two wards counts once, in the ward of their last row as in the history
+            active = month_values > 0
+            active_codes, last_row = np.unique(month_codes[active][::-1], return_index=True)
+            active_wards = wards[in_month][active][::-1][last_row]
+            new = self.first_key[active_codes] == -1
+            if new.any():
+                counts = pd.Series(active_wards[new]).value_counts()
+                for ward, count in counts.items():
+                    self.new_counts[(ward, int(key))] = self.new_counts.get((ward, int(key)), 0) + int(count)
+            self.first_key[active_codes[new]] = key
+
+            # a person seen again in the same month (split across chunks) keeps the run
+            same = self.last_key[active_codes] == key
+            follows = self.last_key[active_codes] == key - 1
+            run = np.where(follows, self.run[active_codes] + 1, 1)
+            run = np.where(same, self.run[active_codes], run)
+            self.run[active_codes] = run
+            self.longest[active_codes] = np.maximum(self.longest[active_codes], run)
+            self.last_key[active_codes] = key
+        return self
+
+    def leaders(self):
+        """
+        all time leaderboard
+
+        :return dataframe: Name and total, largest first
+        """
+        board = TopK(self.top).add(np.array(self.names, dtype=object), self.totals)
+        return pd.DataFrame(board.items(), columns=['Name', self.column])
+
+    def month_leaders(self, month):
+        """
+        leaderboard for one month
+
+        :param month: datetime of the month
+        :return dataframe: Name and value, largest first
+        """
+        board = self.monthly_leaders.get(history.date_key(month), TopK(self.top))
+        return pd.DataFrame(board.items(), columns=['Name', self.column])
+
+    def new_by_ward(self):
+        """
+        first time indexers per ward and month
+
+        :return dataframe: wards x months
+        """
+        months = [key_date(key) for key in self.cube.month_keys()]
+        df = pd.DataFrame(0, index=self.cube.ward_names, columns=months)
+        for (ward, key), count in self.new_counts.items():
+            df.loc[ward, key_date(key)] = count
+        return df
+
+    def streaks(self):
+        """
+        current and longest streaks for everyone
+
+        a current streak only counts when it reaches the last month of the table
+
+        :return dataframe: Name, Current and Longest sorted by current then longest streak
+        """
+        last = self.cube.first_key + self.cube.month_count - 1
+        current = np.where(self.last_key == last, self.run, 0)
+        df = pd.DataFrame({'Name': self.names, 'Current': current, 'Longest': self.longest})
+        df = df[df.Longest > 0]
+        return df.sort_values(by=['Current', 'Longest', 'Name'], ascending=[False, False, True]).reset_index(
+            drop=True)
+
+
+def aggregate_file(file_name, chunksize=100000, top=10, column='Indexed'):
+    """
+    stream a table file through the chunked aggregator
+
+    :param file_name: table file name
+    :param chunksize: rows per chunk
+    :param top: size of the leaderboards
+    :param column: Indexed or Arbitrated
+    :return ChunkedAggregator: filled aggregator
+    """
+    aggregator = ChunkedAggregator(top, column)
+    for chunk in read_chunks(file_name, chunksize):
+        aggregator.add_chunk(chunk)
+    return aggregator
@@ -0,0 +1,496 @@
+"""
+Command line entry point for batch runs
+
+    fs-reports status
+    fs-reports ingest [--file LSR] [--watch]
+    fs-reports backfill
+    fs-reports render [--processes N] [--bundle] [--all-stakes]
+    fs-reports deliver --host HOST
+    fs-reports run --host HOST        (ingest, render and deliver in one go, for cron)
+    fs-reports bench [--repeat N] [--bench-directory DIR]
+
+Every command runs without a window and ends with a timing summary. --as-of YYYYMM opens the table as it
+was when that month was merged, e.g. to render a past month's reports again. --stake STAKE works on the
+stake kept in data/stakes/STAKE, its reports go to reports/stakes/STAKE.
+
+"""
+
+# system imports
+import argparse
+import contextlib
+import copy
+import datetime
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# package imports
+# module imports, the ones that pull in pandas or matplotlib are imported on first use
+from fs_reports.lazy import lazy_import
+import fs_reports.archive as archive
+import fs_reports.bundle as bundle
+import fs_reports.config as config
+import fs_reports.files as files
+import fs_reports.reportdir as reportdir
+import fs_reports.watcher as watcher
+index_data = lazy_import('fs_reports.index_data')
+mailer = lazy_import('fs_reports.mailer')
+pipeline = lazy_import('fs_reports.pipeline')
+reports = lazy_import('fs_reports.reports')
+stakes = lazy_import('fs_reports.stakes')
+
+# modules timed by bench, each in a fresh interpreter
+bench_imports = ['fs_reports.cli', 'fs_reports.index_data', 'pandas', 'numpy', 'matplotlib.figure',
+                 'fs_reports.reports']
+
+
+class Timings:
+    """ named steps and how long each took
+
+    """
+
+    def __init__(self):
+        self.steps = []
+
+    def time(self, step, func, *args, **kwargs):
+        """
+        run a step and record its time
+
+        :param step: name for the summary
+        :param func: callable to run
+        :return: result of func
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.add(step, time.perf_counter() - start)
+
+    def add(self, step, seconds):
+        self.steps.append((step, seconds))
+
+    def summary(self):
+        """
+        table of steps and seconds
+
+        :return string: summary text
+        """
+        width = max([len(step) for step, seconds in self.steps] + [5])
+        lines = [step.ljust(width) + '  ' + '{:9.3f}s'.format(seconds) for step, seconds in self.steps]
+        lines.append('total'.ljust(width) + '  ' + '{:9.3f}s'.format(sum(seconds for step, seconds in self.steps)))
+        return '\n'.join(lines)
+
+
+def lsr_month(path):
+    """
+    month of a renamed lsr file, lsr_201601.csv
+
+    :param path: Path of the file
+    :return datetime: first of the month or None
+    """
+    try:
+        return datetime.datetime.strptime(Path(path).stem, 'lsr_%Y%m')
+    except ValueError:
+        return None
+
+
+def use_stake(stake_name):
+    """
+    read and write one stake's data, kept in its own directory under data/stakes, and render into its own
+    reports directory under reports/stakes, the ini file stays shared
+
+    :param stake_name: name of the stake
+    :return Config: the configuration now in use
+    """
+    current = config.get_config()
+    return config.set_config(root=current.root, data_root=files.build_stake_directory(stake_name),
+                             reports_root=files.build_stake_reports_root(stake_name),
+                             downloads_dir=current.downloads_dir, ini_file=current.ini_file)
+
+
+def load_data(args, timings):
+    """
+    IndexerValues with the table read
+
+    :param args: parsed arguments
+    :param timings: Timings to record in
+    :return IndexerValues: loaded table
+    """
+    my_data = index_data.IndexerValues(args.stake, args.as_of)
+    timings.time('read table', my_data.read_table)
+    return my_data
+
+
+def merge_file(my_data, file_name):
+    """
+    load and merge one month file
+
+    :param my_data: IndexerValues with the table loaded
+    :param file_name: renamed lsr
+    :return datetime: month merged, None when it was already in the table
+    """
+    month = my_data.next_month
+    if my_data.load_this_month_file(file_name, month) is None:
+        return None
+    if my_data.bad_wards is not None:
+        raise ValueError('Unknown wards in ' + str(file_name) + ': ' +
+                         ', '.join(str(ward) for ward in my_data.bad_wards))
+    my_data.merge_month_to_table()
+    my_data.write_quarantine(month)
+    return month
+
+
+def save(my_data, timings):
+    timings.time('write table', my_data.write_table)
+
+
+def build_mailer(args):
+    """
+    Mailer from the smtp arguments
+
+    :param args: parsed arguments
+    :return Mailer: not connected yet
+    """
+    return mailer.Mailer(args.host, args.port, args.user, args.password, args.tls, retries=args.retries)
+
+
+def import_time(module):
+    """
+    seconds to import a module in a fresh interpreter, less the interpreter start up
+
+    :param module: module name
+    :return float: seconds
+    """
+    def run(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        return time.perf_counter() - start
+
+    return max(0.0, run('import ' + module) - run('pass'))
+
+
+def command_status(args, timings):
+    """
+    stake, last month in the table and any waiting download, without loading the table
+
+    :return string: status line
+    """
+    stake_name = args.stake or config.get_config().stake_name()
+    last_month = timings.time('last month', files.last_table_month, files.build_table_name())
+    waiting = files.locate_downloaded_lsr().exists()
+    return (stake_name + ': ' + (last_month.strftime('%B %Y') if last_month else 'empty table') +
+            (', download waiting' if waiting else ''))
+
+
+def command_ingest(args, timings):
+    """
+    move the download into data/downloads and merge it, or keep watching for downloads
+
+    :return string: status line
+    """
+    my_data = load_data(args, timings)
+    lsr_archive = archive.LsrArchive()
+    if args.watch:
+        def render(data, month):
+            timings.time('render ' + month.strftime('%Y%m'), reports.render_all, data)
+
+        download_watcher = watcher.DownloadWatcher(my_data, render if args.render else None,
+                                                   lsr_archive=lsr_archive)
+        download_watcher.run()
+        return download_watcher.status
+
+    source = Path(args.file) if args.file else files.locate_downloaded_lsr()
+    if not source.exists():
+        raise FileNotFoundError('Failed to find file ' + str(source))
+    destination = files.data_download_directory().joinpath(files.build_lsr_name(my_data.next_month))
+    timings.time('move', files.move_and_rename, source, destination, True, lsr_archive,
+                 files.build_lsr_name(my_data.last_month))
+    skipped = archive.not_loaded(lsr_archive.last, destination.name)
+    if skipped is not None:
+        return skipped
+    month = timings.time('merge', merge_file, my_data, destination)
+    if month is None:
+        return my_data.next_month.strftime('%Y %m ') + 'already in table.'
+    save(my_data, timings)
+    return month.strftime('%Y %m ') + 'loaded.'
+
+
+def command_backfill(args, timings):
+    """
+    merge every downloaded month after the last month in the table, in order
+
+    :return string: status line
+    """
+    my_data = load_data(args, timings)
+    merged = []
+    for file_name in sorted(files.data_download_directory().glob('lsr_*.csv')):
+        month = lsr_month(file_name)
+        if month is None or month <= my_data.last_month:
+            continue
+        if (month.year, month.month) != (my_data.next_month.year, my_data.next_month.month):
+            raise ValueError('Missing month before ' + file_name.name)
+        timings.time('merge ' + month.strftime('%Y%m'), merge_file, my_data, file_name)
+        merged.append(month)
+    if merged:
+        save(my_data, timings)
+    return str(len(merged)) + ' months loaded.'
+
+
+def prepare_reports(args, timings):
+    """
+    archive the previous run and prune old archives, only for the default report directory
+
+    :param args: parsed arguments
+    :param timings: Timings to record in
+    :return:
+    """
+    if args.directory is None:
+        max_bytes = None if args.keep_mb is None else args.keep_mb * 1024 * 1024
+        timings.time('prepare reports', reportdir.ReportDirectory().prepare, args.keep_days, max_bytes)
+
+
+def build_bundle(args, my_data):
+    """
+    zip bundle for the rendered reports when --bundle was given
+
+    :param args: parsed arguments
+    :param my_data: IndexerValues for the month
+    :return ReportBundle: bundle in the report directory, None when not asked for
+    """
+    if not args.bundle:
+        return None
+    directory = Path(args.directory) if args.directory else files.build_path_to_report_directory()
+    max_bytes = None if args.bundle_mb is None else args.bundle_mb * 1024 * 1024
+    return bundle.ReportBundle(directory, files.build_bundle_name(my_data.last_month), max_bytes)
+
+
+def render_reports(args, timings):
+    """
+    render every report for the last month of the table in use
+
+    :param args: parsed arguments
+    :param timings: Timings to record in
+    :return int: number of reports rendered
+    """
+    my_data = load_data(args, timings)
+    prepare_reports(args, timings)
+    finished = pipeline.run_pipeline(my_data, directory=args.directory, processes=args.processes, save=False,
+                                     report_bundle=build_bundle(args, my_data))
+    for stage, seconds in finished.timings.items():
+        if stage != 'total':
+            timings.add(stage, seconds)
+    return len(finished.rendered)
+
+
+def render_all_stakes(args, timings):
+    """
+    render every stake in data/stakes, each into its own reports directory
+
+    :param args: parsed arguments, --directory gets one sub directory per stake
+    :param timings: Timings to record in
+    :return dict: stake name to number of reports rendered
+    """
+    stake_names = stakes.StakeEngine().discover()
+    if len(stake_names) == 0:
+        raise FileNotFoundError('No stake tables in ' + str(files.build_stakes_directory()))
+    shared = config.get_config()
+    rendered = {}
+    try:
+        for stake_name in stake_names:
+            config.set_config(shared)
+            use_stake(stake_name)
+            stake_args = copy.copy(args)
+            stake_args.stake = stake_name
+            if args.directory:
+                stake_args.directory = str(Path(args.directory).joinpath(stake_name))
+            rendered[stake_name] = render_reports(stake_args, timings)
+    finally:
+        config.set_config(shared)
+    return rendered
+
+
+def command_render(args, timings):
+    """
+    render every report for the last month, for every stake with --all-stakes
+
+    :return string: status line
+    """
+    if args.all_stakes:
+        rendered = render_all_stakes(args, timings)
+        return (str(sum(rendered.values())) + ' reports rendered for ' + str(len(rendered)) + ' stakes: ' +
+                ', '.join(rendered) + '.')
+    return str(render_reports(args, timings)) + ' reports rendered.'
+
+
+def command_deliver(args, timings):
+    """
+    mail the reports already rendered
+
+    :return string: status line
+    """
+    my_data = load_data(args, timings)
+    sent = timings.time('deliver', mailer.deliver, my_data, build_mailer(args), None, args.directory)
+    return str(sent) + ' messages sent.'
+
+
+def command_run(args, timings):
+    """
+    the whole monthly job, ingest the download when there is one, render and deliver
+
+    :return string: status line
+    """
+    my_data = load_data(args, timings)
+    lsr_file = None
+    skipped = None
+    source = Path(args.file) if args.file else files.locate_downloaded_lsr()
+    if source.exists():
+        lsr_archive = archive.LsrArchive()
+        lsr_file = files.data_download_directory().joinpath(files.build_lsr_name(my_data.next_month))
+        timings.time('move', files.move_and_rename, source, lsr_file, True, lsr_archive,
+                     files.build_lsr_name(my_data.last_month))
+        skipped = archive.not_loaded(lsr_archive.last, lsr_file.name)
+        if skipped is not None:
+            lsr_file = None
+    report_mailer = build_mailer(args) if args.host else None
+    prepare_reports(args, timings)
+    finished = pipeline.run_pipeline(my_data, lsr_file=lsr_file, directory=args.directory,
+                                     report_mailer=report_mailer, processes=args.processes,
+                                     report_bundle=build_bundle(args, my_data))
+    for stage, seconds in finished.timings.items():
+        if stage != 'total':
+            timings.add(stage, seconds)
+    return ((skipped + '. ' if skipped else '') +
+            str(len(finished.rendered)) + ' reports rendered, ' + str(finished.sent) + ' messages sent for ' +
+            my_data.last_month.strftime('%B %Y') + '.')
+
+
+def command_bench(args, timings):
+    """
+    time the main steps on the current table, best of repeat runs
+
+    :return string: status line
+    """
+    for module in bench_imports:
+        timings.add('import ' + module, min(import_time(module) for _ in range(args.repeat)))
+    my_data = load_data(args, timings)
+    ward = my_data.sorted_wards[0]
+    stack = contextlib.ExitStack()
+    directory = args.bench_directory
+    if directory is None:
+        # the benchmark report is thrown away unless a directory is given
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+    steps = [
+        ('build history', my_data.build_person_history),
+        ('build cube', my_data.build_cube),
+        ('aggregate cube', lambda: my_data.aggregate(['Ward', 'Year'], ['Indexed'])),
+        ('aggregate scan', lambda: my_data.aggregate(['Ward', 'Year'], ['Indexed'], force_scan=True)),
+        ('individual list', lambda: my_data.individual_list(my_data.current_table, 6, 20, 'Indexed')),
+        ('year over year', lambda: (my_data.aggregates.clear(), my_data.year_over_year('Indexed'))),
+        ('render ward', lambda: reports.render_ward_report(my_data, ward, Path(directory).joinpath(
+            files.build_ward_month_name(ward, my_data.last_month)))),
+    ]
+    with stack:
+        for step, func in steps:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func()
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            timings.add(step, best)
+    return 'best of ' + str(args.repeat) + ' runs'
+
+
+def build_parser():
+    """
+    argument parser with every subcommand
+
+    :return ArgumentParser: parser
+    """
+    parser = argparse.ArgumentParser(prog='fs-reports', description='FamilySearch indexing reports')
+    parser.add_argument('--root', help='project root holding data and reports, default the parent of cwd')
+    parser.add_argument('--stake', help='use the table in data/stakes/STAKE, default the stake in the ini file')
+    parser.add_argument('--quiet', action='store_true', help='no timing summary')
+    parser.add_argument('--as-of', type=lambda value: datetime.datetime.strptime(value, '%Y%m'), default=None,
+                        metavar='YYYYMM', help='open the table as it was when this month was merged (read only)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def smtp_arguments(sub):
+        sub.add_argument('--host', help='SMTP server')
+        sub.add_argument('--port', type=int, default=25)
+        sub.add_argument('--user')
+        sub.add_argument('--password')
+        sub.add_argument('--tls', action='store_true', help='start TLS after connecting')
+        sub.add_argument('--retries', type=int, default=3)
+
+    sub = subparsers.add_parser('status', help='last month loaded and any waiting download')
+    sub.set_defaults(func=command_status)
+
+    sub = subparsers.add_parser('ingest', help='move and merge the downloaded LSR')
+    sub.add_argument('--file', help='LSR to load, default the browser download')
+    sub.add_argument('--watch', action='store_true', help='keep watching the downloads directory')
+    sub.add_argument('--render', action='store_true', help='with --watch, render after each month')
+    sub.set_defaults(func=command_ingest)
+
+    sub = subparsers.add_parser('backfill', help='merge every downloaded month missing from the table')
+    sub.set_defaults(func=command_backfill)
+
+    for name, func, text in [('render', command_render, 'render the reports'),
+                             ('deliver', command_deliver, 'mail the rendered reports'),
+                             ('run', command_run, 'ingest, render and deliver')]:
+        sub = subparsers.add_parser(name, help=text)
+        sub.add_argument('--directory', help='report directory, default reports/current '
+                                             '(reports/stakes/STAKE/current with --stake)')
+        if name != 'deliver':
+            sub.add_argument('--processes', type=int, default=None, help='render processes, default one per core')
+            sub.add_argument('--keep-days', type=int, default=None, help='prune report archives older than this')
+            sub.add_argument('--keep-mb', type=int, default=None, help='prune report archives above this size')
+            sub.add_argument('--bundle', action='store_true', help='also zip the reports as they are rendered')
+            sub.add_argument('--bundle-mb', type=int, default=20, help='largest zip part, for mail limits')
+        if name == 'render':
+            sub.add_argument('--all-stakes', action='store_true', help='render every stake in data/stakes')
+        if name == 'run':
+            sub.add_argument('--file', help='LSR to load, default the browser download')
+        if name != 'render':
+            smtp_arguments(sub)
+        sub.set_defaults(func=func)
+
+    sub = subparsers.add_parser('bench', help='time the main steps')
+    sub.add_argument('--repeat', type=int, default=3)
+    sub.add_argument('--bench-directory', help='keep the benchmark report here, default a temporary directory')
+    sub.set_defaults(func=command_bench)
+    return parser
+
+
+def main(argv=None):
+    """
+    console entry point
+
+    :param argv: arguments, default sys.argv
+    :return int: exit code
+    """
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'func', None) is command_deliver and not args.host:
+        build_parser().error('deliver needs --host')
+    if getattr(args, 'all_stakes', False) and args.stake:
+        build_parser().error('--all-stakes renders every stake, leave out --stake')
+    if args.root:
+        config.set_config(root=args.root)
+    if args.stake:
+        use_stake(args.stake)
+    timings = Timings()
+    code = 0
+    try:
+        print(args.func(args, timings))
+    except (FileNotFoundError, ValueError) as e:
+        print(e, file=sys.stderr)
+        code = 1
+    if not args.quiet:
+        print(timings.summary())
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Memory mapped column store for the table
+
+The table is kept as one fixed width numpy file per column (month key, ward code, person code,
+Indexed, Arbitrated and Sequence) plus a small json manifest holding the ward and individual names.
+Opening the store maps the files with np.memmap so nothing is read until a column is used.
+
+"""
+
+# system imports
+import json
+import os
+from pathlib import Path
+
+# package imports
+import numpy as np
+
+# module imports
+import fs_reports.shared as shared
+
+manifest_name = 'manifest.json'
+
+
+def is_column_store(path):
+    """
+    check if a path is a column store directory
+
+    :param path: path to check
+    :return boolean: True when the directory holds a manifest
+    """
+    return Path(path).joinpath(manifest_name).exists()
+
+
+def is_current(path, csv_name):
+    """
+    check if a column store is at least as new as the csv table it was written from
+
+    the csv is what write_table keeps up to date, a store older than it is missing later changes
+
+    :param path: store directory
+    :param csv_name: table csv file name
+    :return boolean: True when the store exists and the csv has not been written since
+    """
+    if not is_column_store(path):
+        return False
+    csv_name = Path(csv_name)
+    if not csv_name.exists():
+        return True
+    return Path(path).joinpath(manifest_name).stat().st_mtime >= csv_name.stat().st_mtime
+
+
+def write_columns(df, directory):
+    """
+    write the table as column files
+
+    the manifest is written last (and renamed into place) so a reader never sees a partial store
+
+    :param df: table with Year, Month, Ward, Name, Indexed, Arbitrated and Sequence
+    :param directory: directory to hold the store
+    :return Path: the store directory
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    arrays, ward_names, names = shared.encode_table(df)
+    for column, dtype in shared.shared_columns:
+        np.save(str(directory.joinpath(column + '.npy')), arrays[column])
+
+    manifest = {'rows': len(df),
+                'ward_names': ward_names,
+                'names': names,
+                'columns': {column: np.dtype(dtype).str for column, dtype in shared.shared_columns}}
+    temp_name = directory.joinpath(manifest_name + '.tmp')
+    with open(str(temp_name), 'w') as fh:
+        json.dump(manifest, fh)
+    os.replace(str(temp_name), str(directory.joinpath(manifest_name)))
+    return directory
+
+
+class ColumnStore:
+    """ memory mapped view of a column store
+
+    """
+
+    def __init__(self, directory):
+        """ read the manifest and map the columns
+
+        :param directory: store directory
+        """
+        self.directory = Path(directory)
+        with open(str(self.directory.joinpath(manifest_name)), 'r') as fh:
+            manifest = json.load(fh)
+        self.rows = manifest['rows']
+        self.ward_names = manifest['ward_names']
+        self.names = manifest['names']
+        self.columns = {column: np.load(str(self.directory.joinpath(column + '.npy')), mmap_mode='r')
+                        for column in manifest['columns']}
+
+    def build_cube(self):
+        """
+        ward x month cube from the mapped columns
+
+        :return WardCube: the cube
+        """
+        return shared.cube_from_columns(self.columns, self.ward_names)
+
+    def table(self):
+        """
+        table in the same shape read_table_name builds from the csv
+
+        Ward and Name come back as object columns, as in the csv table
+
+        :return dataframe: table with a DatetimeIndex
+        """
+        return shared.decode_table(self.columns, self.ward_names, self.names)
@@ -0,0 +1,103 @@
+"""
+Resolved locations and stake settings, loaded once per process
+
+The project root defaults to the parent of the working directory (where the code has always looked) and
+is resolved a single time, FS_REPORTS_ROOT or set_config override it. The ini file is parsed on first use
+and shared by every IndexerValues, so creating one per stake or per worker does not touch the disk.
+
+"""
+
+# system imports
+import configparser
+import os
+from pathlib import Path
+
+# package imports
+# module imports
+
+# environment variable holding the project root
+root_variable = 'FS_REPORTS_ROOT'
+
+
+class Config:
+    """ paths and the parsed ini file
+
+    """
+
+    def __init__(self, root=None, data_root=None, reports_root=None, downloads_dir=None, ini_file=None):
+        """ resolve every location now, the ini file is read on first use
+
+        :param root: project root holding data and reports, default FS_REPORTS_ROOT or the parent of cwd
+        :param data_root: data directory, default root/data
+        :param reports_root: reports directory, default root/reports
+        :param downloads_dir: browser download directory, default ~/Downloads
+        :param ini_file: ini file, default data_root/saved.ini
+        """
+        if root is None:
+            root = os.environ.get(root_variable) or Path.cwd().parent
+        self.root = Path(root).resolve()
+        self.data_root = Path(data_root) if data_root is not None else self.root.joinpath('data')
+        self.reports_root = Path(reports_root) if reports_root is not None else self.root.joinpath('reports')
+        self.downloads_dir = Path(downloads_dir) if downloads_dir is not None else Path.home().joinpath('Downloads')
+        self.ini_file = Path(ini_file) if ini_file is not None else self.data_root.joinpath('saved.ini')
+        self.parser = None
+
+    def ini(self):
+        """
+        the parsed ini file, read the first time it is asked for
+
+        :return ConfigParser: parsed ini
+        """
+        if self.parser is None:
+            parser = configparser.ConfigParser()
+            with open(str(self.ini_file), 'r') as fh:
+                parser.read_file(fh)
+            self.parser = parser
+        return self.parser
+
+    def reload(self):
+        """
+        forget the parsed ini, e.g. after it has been written
+
+        :return:
+        """
+        self.parser = None
+
+    def stake_name(self):
+        """
+        stake name from the ini file
+
+        :return string: stake name
+        """
+        return self.ini().defaults().get('stakename', '')
+
+
+# the process wide configuration
+_config = None
+
+
+def get_config():
+    """
+    the configuration, resolved on the first call
+
+    :return Config: process configuration
+    """
+    global _config
+    if _config is None:
+        _config = Config()
+    return _config
+
+
+def set_config(config=None, **kwargs):
+    """
+    override the configuration, set_config() alone goes back to the default on the next get_config
+
+    :param config: Config to use
+    :param kwargs: Config arguments when no config is given
+    :return Config: the configuration now in use
+    """
+    global _config
+    if config is None and len(kwargs) > 0:
+        config = Config(**kwargs)
+    _config = config
+    return _config
@@ -0,0 +1,324 @@
+"""
+Ward by month aggregate cube
+
+Holds the ward x month totals for each measure along with running (prefix) sums so that trailing
+window totals for any window length come from two column lookups. Adding a month only touches one
+column per measure.
+
+"""
+
+# system imports
+# package imports
+import numpy as np
+
+# module imports
+import fs_reports.history as history
+
+
+def year_grid(values, first_key):
+    """
+    fold the month axis into year x calendar month
+
+    months before the first month or after the last month are NaN
+
+    :param values: array with months on the last axis
+    :param first_key: month key of the first column
+    :return tuple: (first year, array shaped [..., years, 12])
+    """
+    lead = first_key % 12
+    month_count = values.shape[-1]
+    years = (lead + month_count + 11) // 12
+    grid = np.full(values.shape[:-1] + (years * 12,), np.nan)
+    grid[..., lead:lead + month_count] = values
+    return first_key // 12, grid.reshape(values.shape[:-1] + (years, 12))
+
+
+def shift_year(grid):
+    """
+    move each year down one so a cell holds the same month of the previous year
+
+    :param grid: array shaped [..., years, 12]
+    :return array: same shape, NaN for the first year
+    """
+    shifted = np.full_like(grid, np.nan)
+    shifted[..., 1:, :] = grid[..., :-1, :]
+    return shifted
+
+
+def year_comparison(values, first_key):
+    """
+    year to date and year over year values for every row at once
+
+    :param values: rows x month totals
+    :param first_key: month key of the first column
+    :return dict: years plus monthly, ytd, last_year, yoy and ytd_yoy arrays shaped rows x years x 12
+    """
+    first_year, monthly = year_grid(values, first_key)
+    missing = np.isnan(monthly)
+    ytd = np.where(missing, np.nan, np.nancumsum(monthly, axis=-1))
+    last_year = shift_year(monthly)
+    last_ytd = shift_year(ytd)
+    return {
+        'years': np.arange(first_year, first_year + monthly.shape[-2]),
+        'monthly': monthly,
+        'ytd': ytd,
+        'last_year': last_year,
+        'yoy': monthly - last_year,
+        'ytd_yoy': ytd - last_ytd
+    }
+
+
+class WardCube:
+    """ ward x month totals for the measures
+
+    Indexed and Arbitrated are summed, Count is the number of rows and Active the number of rows with
+    something indexed. Column j belongs to the month first_key + j.
+    """
+    measures = ['Indexed', 'Arbitrated', 'Count', 'Active']
+
+    def __init__(self):
+        """ initialize an empty cube
+
+        """
+        self.ward_names = np.array([], dtype=object)
+        self.ward_index = {}
+        self.first_key = 0
+        self.month_count = 0
+        # storage is allocated with spare month columns so appending a month does not copy
+        self._values = {measure: np.zeros((0, 0), dtype=np.int64) for measure in self.measures}
+        self._prefix = {measure: np.zeros((0, 1), dtype=np.int64) for measure in self.measures}
+
+    @staticmethod
+    def row_measures(df):
+        """
+        per row contribution of each measure
+
+        :param df: dataframe with Indexed and Arbitrated columns
+        :return dict: measure name to array of row values
+        """
+        indexed = df['Indexed'].values.astype(np.int64)
+        return {
+            'Indexed': indexed,
+            'Arbitrated': df['Arbitrated'].values.astype(np.int64),
+            'Count': np.ones(len(indexed), dtype=np.int64),
+            'Active': (indexed > 0).astype(np.int64)
+        }
+
+    def build(self, df, first_month, month_count):
+        """
+        build the cube from a complete table
+
+        :param df: dataframe with Year, Month, Ward, Indexed and Arbitrated
+        :param first_month: datetime of the first month column
+        :param month_count: number of month columns
+        :return WardCube: self
+        """
+        self.first_key = history.date_key(first_month)
+        self.month_count = month_count
+
+        self.ward_names, ward_codes = np.unique(df['Ward'].values.astype(object), return_inverse=True)
+        self.ward_index = {ward: idx for idx, ward in enumerate(self.ward_names)}
+        month_codes = history.month_key(df['Year'].values, df['Month'].values) - self.first_key
+        cells = ward_codes * month_count + month_codes
+        size = len(self.ward_names) * month_count
+
+        capacity = max(2 * month_count, 12)
+        for measure, row_values in self.row_measures(df).items():
+            totals = np.bincount(cells, weights=row_values, minlength=size).astype(np.int64)
+            values = np.zeros((len(self.ward_names), capacity), dtype=np.int64)
+            values[:, :month_count] = totals.reshape(len(self.ward_names), month_count)
+            prefix = np.zeros((len(self.ward_names), capacity + 1), dtype=np.int64)
+            prefix[:, 1:] = np.cumsum(values, axis=1)
+            self._values[measure] = values
+            self._prefix[measure] = prefix
+        return self
+
+    @classmethod
+    def from_values(cls, ward_names, first_key, values):
+        """
+        build a cube from ward x month arrays
+
+        :param ward_names: row labels
+        :param first_key: month key of the first column
+        :param values: dict of measure to ward x month array
+        :return WardCube: new cube
+        """
+        new_cube = cls()
+        new_cube.ward_names = np.array(list(ward_names), dtype=object)
+        new_cube.ward_index = {ward: idx for idx, ward in enumerate(new_cube.ward_names)}
+        new_cube.first_key = first_key
+        new_cube.month_count = values[cls.measures[0]].shape[1]
+        for measure in cls.measures:
+            new_cube._values[measure] = np.array(values[measure], dtype=np.int64)
+            prefix = np.zeros((len(new_cube.ward_names), new_cube.month_count + 1), dtype=np.int64)
+            prefix[:, 1:] = np.cumsum(new_cube._values[measure], axis=1)
+            new_cube._prefix[measure] = prefix
+        return new_cube
+
+    def collapse(self, label):
+        """
+        single row cube holding the total of every ward, e.g. a stake row for a region
+
+        :param label: name of the row
+        :return WardCube: new cube
+        """
+        values = {measure: self.values(measure).sum(axis=0, keepdims=True) for measure in self.measures}
+        return WardCube.from_values([label], self.first_key, values)
+
+    def _grow(self, ward_count, month_count):
+        """
+        make sure the storage holds at least the given wards and months
+
+        :param ward_count: rows needed
+        :param month_count: month columns needed
+        :return:
+        """
+        rows, capacity = self._values[self.measures[0]].shape
+        if ward_count <= rows and month_count <= capacity:
+            return
+        new_capacity = max(capacity, 12)
+        while new_capacity < month_count:
+            new_capacity *= 2
+        for measure in self.measures:
+            values = np.zeros((ward_count, new_capacity), dtype=np.int64)
+            values[:rows, :capacity] = self._values[measure]
+            prefix = np.zeros((ward_count, new_capacity + 1), dtype=np.int64)
+            prefix[:rows, :capacity + 1] = self._prefix[measure]
+            # running totals carry on past the filled months
+            prefix[:rows, capacity + 1:] = prefix[:rows, capacity:capacity + 1]
+            self._values[measure] = values
+            self._prefix[measure] = prefix
+
+    def append_month(self, df, month):
+        """
+        add a single month to the cube
+
+        only the new column and its running total are computed, O(wards) per measure
+
+        :param df: dataframe with Ward, Indexed and Arbitrated for the month
+        :param month: datetime of the month being added
+        :return WardCube: self
+        """
+        key = history.date_key(month)
+        if self.month_count == 0 and len(self.ward_names) == 0:
+            self.first_key = key
+        column_idx = key - self.first_key
+        if column_idx < self.month_count:
+            raise ValueError('month ' + month.strftime('%Y-%m') + ' already in cube')
+
+        wards = df['Ward'].values.astype(object)
+        new_wards = [ward for ward in dict.fromkeys(wards) if ward not in self.ward_index]
+        for ward in new_wards:
+            self.ward_index[ward] = len(self.ward_index)
+        if len(new_wards) > 0:
+            self.ward_names = np.concatenate((self.ward_names, np.array(new_wards, dtype=object)))
+
+        self._grow(len(self.ward_names), column_idx + 1)
+        ward_codes = np.array([self.ward_index[ward] for ward in wards], dtype=np.int64)
+        for measure, row_values in self.row_measures(df).items():
+            column = np.bincount(ward_codes, weights=row_values, minlength=len(self.ward_names))
+            values = self._values[measure]
+            prefix = self._prefix[measure]
+            values[:, column_idx] = column.astype(np.int64)
+            # skipped months have zero totals so their running total is the last known one
+            prefix[:, self.month_count + 1:column_idx + 1] = prefix[:, self.month_count:self.month_count + 1]
+            prefix[:, column_idx + 1] = prefix[:, column_idx] + values[:, column_idx]
+        self.month_count = column_idx + 1
+        return self
+
+    def month_keys(self):
+        """
+        month keys for the cube columns
+
+        :return array: keys in column order
+        """
+        return np.arange(self.first_key, self.first_key + self.month_count)
+
+    def values(self, measure):
+        """
+        ward x month totals for a measure
+
+        :param measure: one of measures
+        :return array: ward x month view, rows in ward_names order
+        """
+        return self._values[measure][:, :self.month_count]
+
+    def prefix(self, measure):
+        """
+        running totals with a leading zero column
+
+        :param measure: one of measures
+        :return array: ward x (month + 1) view
+        """
+        return self._prefix[measure][:, :self.month_count + 1]
+
+    def window_sum(self, measure, window):
+        """
+        trailing window totals for every month
+
+        cell t holds the sum of months t - window + 1 .. t, early months use what is available
+
+        :param measure: one of measures
+        :param window: number of months in the window
+        :return array: ward x month totals
+        """
+        prefix = self.prefix(measure)
+        ends = np.arange(1, self.month_count + 1)
+        starts = np.maximum(ends - window, 0)
+        return prefix[:, ends] - prefix[:, starts]
+
+    def window_mean(self, measure, window):
+        """
+        trailing window mean for every month
+
+        :param measure: one of measures
+        :param window: number of months in the window
+        :return array: ward x month means
+        """
+        ends = np.arange(1, self.month_count + 1)
+        lengths = ends - np.maximum(ends - window, 0)
+        return self.window_sum(measure, window) / lengths
+
+    def trailing(self, measure, window, how='sum'):
+        """
+        trailing window value ending with the last month, O(wards)
+
+        :param measure: one of measures
+        :param window: number of months in the window
+        :param how: sum or mean
+        :return array: value per ward in ward_names order
+        """
+        prefix = self.prefix(measure)
+        start = max(self.month_count - window, 0)
+        total = prefix[:, self.month_count] - prefix[:, start]
+        if how == 'mean':
+            return total / max(self.month_count - start, 1)
+        return total
+
+
+def merge_cubes(cubes):
+    """
+    add cubes together, rows with the same label are summed
+
+    cubes are additive so the result is the same as building one cube from all the tables. The month
+    range is the union of the month ranges.
+
+    :param cubes: list of WardCube
+    :return WardCube: merged cube
+    """
+    cubes = [item for item in cubes if item.month_count > 0]
+    if len(cubes) == 0:
+        return WardCube()
+    labels = list(dict.fromkeys(ward for item in cubes for ward in item.ward_names))
+    index = {ward: idx for idx, ward in enumerate(labels)}
+    first_key = min(item.first_key for item in cubes)
+    last_key = max(item.first_key + item.month_count for item in cubes)
+
+    values = {measure: np.zeros((len(labels), last_key - first_key), dtype=np.int64)
+              for measure in WardCube.measures}
+    for item in cubes:
+        rows = [index[ward] for ward in item.ward_names]
+        start = item.first_key - first_key
+        for measure in WardCube.measures:
+            values[measure][rows, start:start + item.month_count] += item.values(measure)
+    return WardCube.from_values(labels, first_key, values)
@@ -4,11 +4,13 @@ Handle the files and directories for the reports
 """
 
 # system imports
+import datetime
 import os
 import shutil
-from pathlib import Path
 # package imports
 # module imports
+import fs_reports.config as config
+import fs_reports.reportdir as reportdir
 
 
 def build_path_to_report_directory():
@@ -17,27 +19,19 @@ def build_path_to_report_directory():
 
     :return Path: path to current report directory
     """
-    current = Path.cwd()
-    parent = current.parent
-    report_current = parent.joinpath('reports/current')
+    report_current = config.get_config().reports_root.joinpath('current')
     return report_current
 
 
 def clear_report_directory():
     """
-    remove any files in the current directory (makes sending email easier later
+    empty the current directory (makes sending email easier later), the previous reports are moved
+    into a dated archive by reportdir.ReportDirectory
 
     :return list: return the empty list (for unit testing)
     """
-    report_current = build_path_to_report_directory()
-    file_generator = report_current.glob('*.*')
-    try:
-        for idx, file_name in enumerate(file_generator):
-            os.remove(str(file_name))
-    except PermissionError as e:
-        print(e)
-    file_generator = report_current.glob('*.*')
-    return [x for x in file_generator]
+    report_current = reportdir.ReportDirectory(build_path_to_report_directory().parent).prepare()
+    return [x for x in report_current.glob('*.*')]
 
 
 def build_ward_month_filename(ward, current_month):
@@ -48,22 +42,31 @@ def build_ward_month_filename(ward, current_month):
     :param current_month: month for the report
     :return string: filename with full path
     """
-    this_month = current_month.strftime('_%Y%m')
-    fn = (ward + this_month + '.pdf')
     report_current = build_path_to_report_directory()
-    report_current = report_current.joinpath(fn)
+    report_current = report_current.joinpath(build_ward_month_name(ward, current_month))
     return str(report_current)
 
 
+def build_ward_month_name(ward, current_month):
+    """
+    ward name with month and year
+
+    :param ward: string of ward to use
+    :param current_month: month for the report
+    :return string: file name
+    """
+    this_month = current_month.strftime('_%Y%m')
+    fn = (ward + this_month + '.pdf')
+    return fn
+
+
 def locate_downloaded_lsr():
     """
     find the downloaded month information
 
     :return Path: path to downloaded file
     """
-    home = Path.home()
-    download_directory = home.joinpath("Downloads")
-    download_directory = download_directory.joinpath('LocationStatisticsReport.csv')
+    download_directory = config.get_config().downloads_dir.joinpath('LocationStatisticsReport.csv')
     return download_directory
 
 
@@ -73,8 +76,7 @@ def data_download_directory():
 
     :return:
     """
-    parent = Path.cwd().parent
-    data_downloads = parent.joinpath('data/downloads')
+    data_downloads = config.get_config().data_root.joinpath('downloads')
     return data_downloads
 
 
@@ -84,9 +86,7 @@ def build_data_directory():
 
     :return:
     """
-    parent = Path.cwd().parent
-    data_downloads = parent.joinpath('data')
-    return data_downloads
+    return config.get_config().data_root
 
 
 def build_table_name():
@@ -100,6 +100,146 @@ def build_table_name():
     return str(fn)
 
 
+def last_table_month(file_name, date_format='%Y-%m-%d', block_size=4096):
+    """
+    month of the last row of the table csv, read from the end of the file without pandas
+
+    :param file_name: table csv
+    :param date_format: format of the date column
+    :param block_size: bytes read from the end
+    :return datetime: month of the last row, None for an empty table
+    """
+    with open(str(file_name), 'rb') as fh:
+        fh.seek(0, os.SEEK_END)
+        fh.seek(max(0, fh.tell() - block_size))
+        lines = fh.read().decode().strip().splitlines()
+    if len(lines) == 0:
+        return None
+    date = lines[-1].split(',', 1)[0]
+    try:
+        return datetime.datetime.strptime(date, date_format)
+    except ValueError:
+        # only the header line
+        return None
+
+
+def build_database_name():
+    """
+    build the SQLite database name for the sqlite backend
+
+    :return string: filename with complete path
+    """
+    fn = build_data_directory()
+    fn = fn.joinpath('table.sqlite')
+    return str(fn)
+
+
+def build_columns_directory():
+    """
+    directory for the memory mapped column store of the table
+
+    :return Path: path to the column store
+    """
+    return build_data_directory().joinpath('columns')
+
+
+def build_arrow_directory():
+    """
+    directory for the Arrow IPC export of the table, cube and leaderboards
+
+    :return Path: path to the export
+    """
+    return build_data_directory().joinpath('arrow')
+
+
+def build_archive_directory():
+    """
+    directory for the content addressed archive of lsr files
+
+    :return Path: path to the archive
+    """
+    return build_data_directory().joinpath('archive')
+
+
+def build_snapshot_directory():
+    """
+    directory for the versioned snapshots of the table
+
+    :return Path: path to the snapshots
+    """
+    return build_data_directory().joinpath('snapshots')
+
+
+def build_quality_name():
+    """
+    file holding the data quality table, ward summary totals against the merged rows
+
+    :return Path: quality file name
+    """
+    return build_data_directory().joinpath('quality.csv')
+
+
+def build_quarantine_directory():
+    """
+    directory for the lsr rows that failed validation
+
+    :return Path: path to the quarantine
+    """
+    return build_data_directory().joinpath('quarantine')
+
+
+def build_quarantine_names(current_date):
+    """
+    file names for a month's quarantined rows and its validation report
+
+    :param current_date: month of the lsr
+    :return tuple: (rows file name, report file name)
+    """
+    this_month = current_date.strftime('%Y%m')
+    return 'lsr_' + this_month + '_rows.csv', 'lsr_' + this_month + '_report.csv'
+
+
+def build_stakes_directory():
+    """
+    directory holding one sub directory per stake when more than one stake is kept
+
+    :return Path: path to the stakes directory
+    """
+    return build_data_directory().joinpath('stakes')
+
+
+def build_stake_directory(stake_name):
+    """
+    data directory of one stake, holding its table and everything kept next to it
+
+    :param stake_name: name of the stake
+    :return Path: path to the stake directory
+    """
+    return build_stakes_directory().joinpath(stake_name)
+
+
+def build_stake_table_name(stake_name):
+    """
+    build the table name for one stake
+
+    :param stake_name: name of the stake
+    :return string: filename with complete path
+    """
+    fn = build_stake_directory(stake_name)
+    fn = fn.joinpath('table.csv')
+    return str(fn)
+
+
+def build_stake_reports_root(stake_name):
+    """
+    reports root for one stake, holding its own current and archive directories so stakes never share a name
+
+    :param stake_name: name of the stake
+    :return Path: path to the stake reports root
+    """
+    return config.get_config().reports_root.joinpath('stakes', stake_name)
+
+
 def build_lsr_name(current_date):
     """
     build lsr file name from current month
@@ -124,15 +264,48 @@ def build_lsr_path(current_date):
     return str(fn)
 
 
-def move_and_rename(source, destination, remove_old):
+def archive_unchanged(source, destination, archive, merged_name=None):
+    """
+    record the source in the archive, the result is left in archive.last
+
+    a download already archived under another name (last month downloaded again) must not be written
+    under the destination name, it would later be merged as the wrong month. The same goes for a changed
+    download of the month last merged, it is recorded under that month's name with its diff
+
+    :param source: Path to source file
+    :param destination: Path name for destination
+    :param archive: LsrArchive to record in
+    :param merged_name: lsr file name of the month last merged, None to skip that check
+    :return boolean: True when the source is not to be written, the destination already holds the same
+        content or the content belongs to another name
+    """
+    if merged_name is not None and merged_name != destination.name:
+        result = archive.changed_month(source, merged_name)
+        if result is not None:
+            return True
+    result = archive.add(source, destination.name)
+    if result['previous'] == result['hash']:
+        return destination.exists()
+    # already archived under other names only
+    return len(result['names']) > 0 and destination.name not in result['names']
+
+
+def move_and_rename(source, destination, remove_old, archive=None, merged_name=None):
     """
     move from the download directory to working directory and rename
 
     :param source: Path to source file
     :param destination: Path name for destination
     :param remove_old: boolean to remove duplicate destination
+    :param archive: optional LsrArchive, an identical destination is kept and the source removed, a
+        duplicate of another name or a changed copy of merged_name is removed without being moved
+    :param merged_name: lsr file name of the month last merged, with archive
     :return boolean:
     """
+    if archive is not None and archive_unchanged(source, destination, archive, merged_name):
+        os.remove(str(source))
+        return True
+
     if remove_old:
         try:
             if destination.exists():
@@ -154,15 +327,19 @@ def move_and_rename(source, destination, remove_old):
     return output
 
 
-def copy_and_rename(source, destination, remove_old):
+def copy_and_rename(source, destination, remove_old, archive=None):
     """
     move from the download directory to working directory and rename
 
     :param source: Path to source file
     :param destination: Path name for destination
     :param remove_old: boolean to remove duplicate destination
+    :param archive: optional LsrArchive, an identical destination or a duplicate of another name is not copied
     :return boolean:
     """
+    if archive is not None and archive_unchanged(source, destination, archive):
+        return True
+
     if remove_old:
         try:
             if destination.exists():
@@ -225,3 +402,14 @@ def build_stake_report_name(current_date):
     """
     fn = build_path_to_report_directory()
     return str(fn.joinpath(build_stake_month_name(current_date)))
+
+
+def build_bundle_name(current_date):
+    """
+    base name of the zip bundle of a month's reports, the parts add _part1.zip ...
+
+    :param current_date: date to build for
+    :return string: base name
+    """
+    this_month = current_date.strftime('%Y%m')
+    return 'Reports_' + this_month
@@ -0,0 +1,184 @@
+"""
+Per-individual monthly history of the indexers
+
+Keeps a compact person x month matrix for each of the value columns so that questions about a single
+indexer (or about everyone at once) do not need a scan of the whole table.
+
+"""
+
+# system imports
+# package imports
+import numpy as np
+
+# module imports
+
+
+def month_key(year, month):
+    """
+    Build an integer key for a month, consecutive months have consecutive keys
+
+    works on single values or on numpy arrays / pandas columns
+
+    :param year: year value(s)
+    :param month: month value(s) 1 to 12
+    :return int: year * 12 + month - 1
+    """
+    return year * 12 + month - 1
+
+
+def date_key(date):
+    """
+    Month key for a datetime
+
+    :param date: datetime to convert
+    :return int: month key
+    """
+    return month_key(date.year, date.month)
+
+
+class PersonHistory:
+    """ person by month matrix for the value columns of the table
+
+    row i of each matrix belongs to names[i], column j belongs to the month first_key + j, ward_codes
+    holds the index into ward_names for the ward a person indexed in that month (-1 if not in the table)
+    """
+    columns = ['Indexed', 'Arbitrated']
+
+    def __init__(self):
+        """ initialize with no people and no months
+
+        """
+        self.names = np.array([], dtype=object)
+        self.name_index = {}
+        self.wards = np.array([], dtype=object)
+        self.ward_names = np.array([], dtype=object)
+        self.ward_index = {}
+        self.ward_codes = np.zeros((0, 0), dtype=np.int16)
+        self.first_key = 0
+        self.month_count = 0
+        self.values = {column: np.zeros((0, 0), dtype=np.int64) for column in self.columns}
+
+    def build(self, df, first_month, month_count):
+        """
+        build the matrices from a complete table
+
+        :param df: dataframe with Year, Month, Ward, Name and the value columns
+        :param first_month: datetime of the first column in the matrix
+        :param month_count: number of month columns
+        :return PersonHistory: self
+        """
+        self.first_key = date_key(first_month)
+        self.month_count = month_count
+
+        names = df['Name'].values.astype(object)
+        self.names, person_codes = np.unique(names, return_inverse=True)
+        self.name_index = {name: idx for idx, name in enumerate(self.names)}
+
+        month_codes = month_key(df['Year'].values, df['Month'].values) - self.first_key
+        cells = person_codes * month_count + month_codes
+        size = len(self.names) * month_count
+        for column in self.columns:
+            counts = np.bincount(cells, weights=df[column].values, minlength=size)
+            self.values[column] = counts.astype(np.int64).reshape(len(self.names), month_count)
+
+        # rows are in date order so the last ward seen for each person wins
+        wards = df['Ward'].values.astype(object)
+        self.wards = np.empty(len(self.names), dtype=object)
+        self.wards[person_codes] = wards
+        self.ward_names, ward_codes = np.unique(wards, return_inverse=True)
+        self.ward_index = {ward: idx for idx, ward in enumerate(self.ward_names)}
+        self.ward_codes = np.full((len(self.names), month_count), -1, dtype=np.int16)
+        self.ward_codes[person_codes, month_codes] = ward_codes
+        return self
+
+    def append_month(self, df, month):
+        """
+        add a single month of data as a new column, adding rows for first time indexers
+
+        :param df: dataframe with Ward, Name and the value columns for the month
+        :param month: datetime of the month being added
+        :return PersonHistory: self
+        """
+        key = date_key(month)
+        if self.month_count == 0 and len(self.names) == 0:
+            self.first_key = key
+        column_idx = key - self.first_key
+        if column_idx < self.month_count:
+            raise ValueError('month ' + month.strftime('%Y-%m') + ' already in history')
+
+        # new people go at the bottom, existing rows keep their offsets
+        names = df['Name'].values.astype(object)
+        new_names = [name for name in dict.fromkeys(names) if name not in self.name_index]
+        for name in new_names:
+            self.name_index[name] = len(self.name_index)
+        if len(new_names) > 0:
+            self.names = np.concatenate((self.names, np.array(new_names, dtype=object)))
+            self.wards = np.concatenate((self.wards, np.empty(len(new_names), dtype=object)))
+
+        wards = df['Ward'].values.astype(object)
+        new_wards = [ward for ward in dict.fromkeys(wards) if ward not in self.ward_index]
+        for ward in new_wards:
+            self.ward_index[ward] = len(self.ward_index)
+        if len(new_wards) > 0:
+            self.ward_names = np.concatenate((self.ward_names, np.array(new_wards, dtype=object)))
+
+        # pad any skipped months plus the new month
+        added = column_idx + 1 - self.month_count
+        person_codes = np.array([self.name_index[name] for name in names], dtype=np.int64)
+        ward_codes = np.full((len(self.names), column_idx + 1), -1, dtype=np.int16)
+        ward_codes[:self.ward_codes.shape[0], :self.ward_codes.shape[1]] = self.ward_codes
+        ward_codes[person_codes, column_idx] = [self.ward_index[ward] for ward in wards]
+        self.ward_codes = ward_codes
+        for column in self.columns:
+            old = self.values[column]
+            grown = np.zeros((len(self.names), column_idx + 1), dtype=np.int64)
+            grown[:old.shape[0], :old.shape[1]] = old
+            np.add.at(grown[:, column_idx], person_codes, df[column].values.astype(np.int64))
+            self.values[column] = grown
+        self.month_count += added
+        self.wards[person_codes] = wards
+        return self
+
+    def month_keys(self):
+        """
+        month keys for the matrix columns
+
+        :return array: keys in column order
+        """
+        return np.arange(self.first_key, self.first_key + self.month_count)
+
+    def history(self, name, column='Indexed'):
+        """
+        monthly values for one person
+
+        :param name: name of the individual
+        :param column: Indexed or Arbitrated
+        :return array: value per month, None if the name is unknown
+        """
+        idx = self.name_index.get(name)
+        if idx is None:
+            return None
+        return self.values[column][idx]
+
+    def active(self, column='Indexed'):
+        """
+        boolean activity matrix
+
+        :param column: Indexed or Arbitrated
+        :return array: person x month, True where the value is above zero
+        """
+        return self.values[column] > 0
+
+    def active_in_all(self, first_idx, last_idx, column='Indexed'):
+        """
+        names active in every month of the column range
+
+        :param first_idx: first column (inclusive)
+        :param last_idx: last column (exclusive)
+        :param column: Indexed or Arbitrated
+        :return array: names active in each month of the range
+        """
+        if last_idx <= first_idx:
+            return np.array([], dtype=object)
+        mask = self.active(column)[:, first_idx:last_idx].all(axis=1)
+        return self.names[mask]
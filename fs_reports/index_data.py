@@ -1,16 +1,29 @@
 """Class to store database and associated items"""
 # system imports
-from dateutil.rrule import rrule, MONTHLY
 import datetime
 import calendar
 import configparser
+import os
 
-# package imports
-import pandas as pd
-import numpy as np
+# package imports, imported on first use so creating the module stays cheap
+from fs_reports.lazy import lazy_import
+rrule = lazy_import('dateutil.rrule')
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 # module imports
+import fs_reports.config as config
 import fs_reports.files as files
+arrow_io = lazy_import('fs_reports.arrow_io')
+columnstore = lazy_import('fs_reports.columnstore')
+history = lazy_import('fs_reports.history')
+cube = lazy_import('fs_reports.cube')
+metrics = lazy_import('fs_reports.metrics')
+query = lazy_import('fs_reports.query')
+shared = lazy_import('fs_reports.shared')
+snapshots = lazy_import('fs_reports.snapshots')
+sqlite_store = lazy_import('fs_reports.sqlite_store')
+validate = lazy_import('fs_reports.validate')
 # import fs_indexing.main_window as main_window
 
 
@@ -30,18 +43,26 @@ class IndexerValues:
     hdr_arb = 5
     hdr_sequence = 1
 
-    _fn = '../data/saved.ini'
     _df = 'DEFAULT'
     _un = 'User'
     _sn = 'Stakename'
     _tm = 'ToEmail'
     _fm = 'FromEmail'
+    _be = 'Backend'
+    _we = 'WardEmail'
 
-    def __init__(self):
+    def __init__(self, stake_name=None, as_of=None):
         """ initialize the class
 
+        :param stake_name: stake this instance holds, defaults to the stake in the ini file
+        :param as_of: month to open the table as of (read only), None for the current table
         """
-        self.current_table = pd.DataFrame([1], index=[1])
+        # an opened column store, the table and history are decoded from it when first used
+        self._columns = None
+        self._people = None
+        # the table, the person history and the cube are built when a table is read, so creating an
+        # instance (e.g. for the ini settings) does not import pandas or numpy
+        self.current_table = None
         self.ward_list = []
         self.list_of_months = []
         self.sorted_wards = []
@@ -57,32 +78,131 @@ class IndexerValues:
         self.stake_name = ""
         self.to_email = []
         self.from_email = []
+        # ward name (lower case) to comma separated report recipients
+        self.ward_email = {}
+        # csv (the default) or sqlite
+        self.backend = 'csv'
+        self.store = None
 
         self.month_data = []
         self.bad_wards = []
+        # rows left out of the last month loaded and the problems found in it
+        self.quarantine = None
+        self.validation = None
+        # ward summary totals of the month being loaded and the ward of each row as downloaded
+        self.month_totals = None
+        self.month_wards = None
+        # ward summary totals against the merged rows, one row per ward per month
+        self.quality_table = None
+        self.as_of = as_of
+
+        # ward x month totals, kept in step with current_table like the person history
+        self.cube = None
+
+        # derived values, cleared whenever the table changes
+        self.aggregates = {}
+        self.last_plan = ''
 
         # read the ini data for username etc
         self.read_ini()
+        if stake_name is not None:
+            self.stake_name = stake_name
 
     def read_table(self):
         """
-        Read table using fixed name
+        Read table using fixed name, the column store is used when one has been written and is not older
+        than the csv, with the quality table
 
         :return:
         """
+        if self.as_of is not None:
+            return self.read_table_as_of(self.as_of)
+        if files.build_quality_name().exists():
+            self.read_quality(files.build_quality_name())
+        if self.backend == 'sqlite':
+            return self.read_table_database(files.build_database_name())
+        columns_directory = files.build_columns_directory()
+        if columnstore.is_current(columns_directory, files.build_table_name()):
+            return self.read_table_name(columns_directory)
         return self.read_table_name(files.build_table_name())
 
+    @property
+    def current_table(self):
+        """
+        the table, decoded from an opened column store the first time it is used
+
+        :return dataframe: table with a DatetimeIndex
+        """
+        if self._current_table is None and self._columns is not None:
+            self._current_table = self._columns.table()
+        return self._current_table
+
+    @current_table.setter
+    def current_table(self, df):
+        self._current_table = df
+        self._columns = None
+
+    @property
+    def people(self):
+        """
+        person x month history, built from the table the first time it is used after opening a column store
+
+        :return PersonHistory: the history
+        """
+        if self._people is None:
+            self.build_person_history()
+        return self._people
+
+    @people.setter
+    def people(self, person_history):
+        self._people = person_history
+
     def read_table_name(self, file_name):
         """
         read the CSV file and create the table
 
         After reading in the table set the indexes and calculate the ward list and other items
 
-        :param file_name: file name to load and use
+        A column store is only opened: the cube and ward data come straight from the mapped columns and the
+        table and person history are decoded when first used, so commands that only need the cube (status,
+        aggregates, year over year) never build them
+
+        :param file_name: file name to load and use, or a column store directory
+        :return: the table, or the ColumnStore that was opened
+        """
+        if columnstore.is_column_store(file_name):
+            # memory mapped columns, no csv parsing
+            store = self.open_columns(columnstore.ColumnStore(file_name))
+            self.cube = store.build_cube()
+            self.calculate_ward_data()
+            return store
+
+        return self.read_table_handle(file_name)
+
+    def open_columns(self, store):
+        """
+        take the rows from encoded columns, a ColumnStore or a shared.TableView, the table and person
+        history are decoded from them when first used
+
+        the cube, ward data and aggregates are left as they are
+
+        :param store: object with table() and build_cube()
+        :return: the store
+        """
+        self._current_table = None
+        self._columns = store
+        self._people = None
+        return store
+
+    def read_table_handle(self, fh):
+        """
+        read the table from an open CSV file (or a file name)
+
+        :param fh: file handle
         :return:
         """
         # Coerce the data into a datetimeindex and also create a month and year column
-        temp_df = pd.read_csv(file_name, index_col=0)
+        temp_df = pd.read_csv(fh, index_col=0)
         # TODO handle when the file isn't found
 
         temp_df['Date2'] = pd.to_datetime(temp_df.index, format=self.date_format)
@@ -93,6 +213,79 @@ class IndexerValues:
         self.current_table['Year'] = self.current_table.index.year
 
         self.calculate_ward_data()
+        self.build_person_history()
+        self.build_cube()
+        return self.current_table
+
+    def read_quality(self, file_name):
+        """
+        read the data quality table
+
+        :param file_name: csv written by write_quality, or an open file
+        :return:
+        """
+        df = pd.read_csv(file_name)
+        df['Date'] = pd.to_datetime(df['Date'], format=self.date_format)
+        self.quality_table = df
+        return self.quality_table
+
+    def read_table_as_of(self, month, directory=None):
+        """
+        read the table (and quality table) as it was when month was merged, from the snapshots
+
+        the last snapshot before month is used when there is none for the month itself
+
+        :param month: month wanted
+        :param directory: snapshot directory, default files.build_snapshot_directory
+        :return:
+        """
+        store = snapshots.SnapshotStore(directory, self.date_format)
+        self.as_of = month
+        quality = store.open_quality(month)
+        self.quality_table = None if quality is None else self.read_quality(quality)
+        return self.read_table_handle(store.open_table(month))
+
+    def read_table_database(self, file_name, csv_name=None):
+        """
+        read the table from the SQLite backend, later merges are inserted into the database
+
+        the first time the backend is used the database is empty, it is filled from the csv table in a
+        single transaction
+
+        :param file_name: database file name
+        :param csv_name: csv table to import into an empty database, default files.build_table_name
+        :return:
+        """
+        self.store = sqlite_store.SqliteStore(file_name, self.date_format)
+        if self.store.row_count() == 0:
+            csv_name = csv_name if csv_name is not None else files.build_table_name()
+            if not os.path.exists(str(csv_name)):
+                self.store.close()
+                self.store = None
+                raise ValueError('SQLite table ' + str(file_name) + ' is empty and there is no ' + str(csv_name) +
+                                 ' to import')
+            self.read_table_name(csv_name)
+            self.store.insert_rows(self.current_table)
+            return self.current_table
+        self.current_table = self.store.read_table()
+
+        self.calculate_ward_data()
+        self.build_person_history()
+        self.build_cube()
+        return self.current_table
+
+    def read_table_arrow(self, file_name):
+        """
+        read the table from an Arrow IPC file written by write_arrow, the file is memory mapped
+
+        :param file_name: table.arrow file name
+        :return:
+        """
+        self.current_table = arrow_io.arrow_to_table(arrow_io.read_file(file_name))
+
+        self.calculate_ward_data()
+        self.build_person_history()
+        self.build_cube()
         return self.current_table
 
     def calculate_ward_data(self):
@@ -103,12 +296,57 @@ class IndexerValues:
         :rtype:
         """
 
+        self.aggregates = {}
+        if self._current_table is None and self._columns is not None:
+            self.ward_data_from_cube()
+            return
+
         # get the list of wards in the dataset
         self.get_ward_list()
         self.get_year_count()
         self.build_list_of_dates_by_month()
         self.sort_wards()
 
+    def ward_data_from_cube(self):
+        """
+        the values calculate_ward_data sets, taken from the cube instead of the table
+
+        :return:
+        """
+        counts = self.cube.values('Count')
+        keys = self.cube.month_keys()[counts.sum(axis=0) > 0]
+        present = counts.sum(axis=1) > 0
+        self.ward_list = np.array(sorted(self.cube.ward_names[present]), dtype=object)
+        self.year_count = len(np.unique(keys // 12))
+        self.first_month = pd.Timestamp(int(keys[0]) // 12, int(keys[0]) % 12 + 1, 1)
+        self.last_month = pd.Timestamp(int(keys[-1]) // 12, int(keys[-1]) % 12 + 1, 1)
+        self.next_month = self.add_month(self.last_month)
+        self.list_of_months = [dt for dt in rrule.rrule(rrule.MONTHLY, dtstart=self.first_month, until=self.last_month)]
+        # ward order as groupby gives it, so ties sort as they do from the table
+        indexed = self.cube.values('Indexed').sum(axis=1)
+        ward_series = pd.Series(indexed[present], index=self.cube.ward_names[present]).sort_index()
+        ward_series.sort_values(axis=0, ascending=False, inplace=True)
+        self.sorted_wards = np.array(ward_series.index)
+
+    def build_person_history(self):
+        """
+        build the person x month history from the full table
+
+        :return PersonHistory: the rebuilt history
+        """
+        self.people = history.PersonHistory().build(self.current_table, self.first_month,
+                                                    len(self.list_of_months))
+        return self.people
+
+    def build_cube(self):
+        """
+        build the ward x month cube from the full table
+
+        :return WardCube: the rebuilt cube
+        """
+        self.cube = cube.WardCube().build(self.current_table, self.first_month, len(self.list_of_months))
+        return self.cube
+
     def get_ward_list(self):
         """ get the ward list
 
@@ -149,7 +387,7 @@ class IndexerValues:
         temp_date = self.current_table.tail(1).Date
         self.last_month = temp_date[0]
         self.next_month = self.add_month(self.last_month)
-        self.list_of_months = [dt for dt in rrule(MONTHLY, dtstart=self.first_month, until=self.last_month)]
+        self.list_of_months = [dt for dt in rrule.rrule(rrule.MONTHLY, dtstart=self.first_month, until=self.last_month)]
         return self.list_of_months
 
     def sort_wards(self):
@@ -166,11 +404,19 @@ class IndexerValues:
 
     def write_table(self):
         """
-        write the dataframe to the csv file
+        write the dataframe to the csv file, and the column store when there is one
 
         :return:
         """
+        if self.as_of is not None:
+            raise ValueError('Table opened as of ' + self.as_of.strftime('%B %Y') + ' is read only')
         self.write_table_filename(files.build_table_name())
+        # a column store that is not refreshed would be skipped as stale by read_table
+        if columnstore.is_column_store(files.build_columns_directory()):
+            self.write_columns()
+        if self.quality_table is not None:
+            self.write_quality(files.build_quality_name())
+        self.write_snapshot()
 
     def write_table_filename(self, filename):
         """
@@ -182,6 +428,61 @@ class IndexerValues:
         # any cleanup or manipulation for the table goes here
         self.current_table.to_csv(filename, columns=self.header, date_format=self.date_format)
 
+    def write_snapshot(self, directory=None):
+        """
+        keep the table as the version for the last month, months already kept are shared
+
+        :param directory: snapshot directory, default files.build_snapshot_directory
+        :return Path: manifest of the version
+        """
+        store = snapshots.SnapshotStore(directory, self.date_format)
+        return store.snapshot(self.current_table, self.header, self.last_month, self.quality_table)
+
+    def write_quality(self, filename):
+        """
+        write the data quality table
+
+        :param filename: csv to write
+        :return:
+        """
+        self.quality_table.to_csv(str(filename), index=False, date_format=self.date_format)
+
+    def write_columns(self):
+        """
+        write the memory mapped column store alongside the csv file
+
+        :return:
+        """
+        self.write_columns_directory(files.build_columns_directory())
+
+    def write_columns_directory(self, directory):
+        """
+        write the table as fixed width column files
+
+        :param directory: directory to hold the column store
+        :return:
+        """
+        columnstore.write_columns(self.current_table, directory)
+
+    def write_arrow(self):
+        """
+        export the table, cube and leaderboards as Arrow IPC files in the data directory
+
+        :return:
+        """
+        self.write_arrow_directory(files.build_arrow_directory())
+
+    def write_arrow_directory(self, directory):
+        """
+        export the table, cube and leaderboards as Arrow IPC files (table.arrow, cube.arrow, leaders.arrow)
+
+        needs pyarrow
+
+        :param directory: directory for the files
+        :return list: paths written
+        """
+        return arrow_io.write_files(arrow_io.export_tables(self), directory)
+
     def load_this_month(self, month_to_load):
         """
         Load download month data an add to current table using default file name
@@ -211,8 +512,9 @@ class IndexerValues:
         # build up the download directory (our file should be there)
         df = pd.read_csv(filename)
 
-        # give the first column a better name for convenience
-        df.rename(columns={'Unnamed: 0': 'Desc'}, inplace=True)
+        # check the download, bad rows are set aside in quarantine (this also names the first column Desc)
+        df, self.quarantine, self.validation = validate.validate_lsr(df)
+        self.month_totals = validate.ward_totals(df)
 
         # create a mask for the Ward Summary lines
         ws_mask = df.Desc == 'Ward Summary'
@@ -223,8 +525,9 @@ class IndexerValues:
         # forward fill the missing ward names from the previous summary line
         df.Ward.fillna(method='ffill', inplace=True)
 
-        # get rid of the ward summary lines
+        # get rid of the ward summary lines, their totals are in month_totals
         df = df.ix[~ws_mask]
+        self.month_wards = df['Ward'].values.copy()
 
         # get rid of the Desc column
         if 'Desc' in df.columns:
@@ -269,27 +572,92 @@ class IndexerValues:
 
         return df
 
+    def write_quarantine(self, month=None):
+        """
+        write the rows left out of the last month loaded and the validation report, when there were problems
+
+        :param month: month loaded, default next_month
+        :return list: Paths written
+        """
+        if self.validation is None or len(self.validation.index) == 0:
+            return []
+        month = month if month is not None else self.next_month
+        directory = files.build_quarantine_directory()
+        directory.mkdir(parents=True, exist_ok=True)
+        rows_name, report_name = files.build_quarantine_names(month)
+        self.quarantine.to_csv(str(directory.joinpath(rows_name)), index=False)
+        self.validation.to_csv(str(directory.joinpath(report_name)), index=False)
+        return [directory.joinpath(rows_name), directory.joinpath(report_name)]
+
     def merge_month_to_table(self):
         """ merge the current month into the main table
 
         """
+        self.reconcile_month()
+
         # concatenate downloaded month into full table
         frames = [self.current_table, self.month_data]
         df = pd.concat(frames)
         self.current_table = df.set_index(pd.DatetimeIndex(df.index))
         self.calculate_ward_data()
 
+        # only the new month needs adding to the history and cube, a history not built yet is built from the
+        # merged table when first used
+        if self._people is not None:
+            self._people.append_month(self.month_data, self.last_month)
+        self.cube.append_month(self.month_data, self.last_month)
+        if self.store is not None:
+            self.store.insert_rows(self.month_data)
+
         self.month_data = None
 
+    def reconcile_month(self):
+        """
+        add the month being merged to the quality table
+
+        wards renamed in month_data since loading are renamed in the totals and quarantine as well
+
+        :return dataframe: quality rows for the month
+        """
+        if self.month_totals is None or len(self.month_data.index) == 0:
+            return None
+        renames = dict(zip(self.month_wards, self.month_data['Ward'].values))
+        totals = self.month_totals.rename(index=renames).groupby(level=0).sum()
+        quarantined = self.quarantine
+        if quarantined is not None:
+            quarantined = quarantined.assign(Ward=quarantined['Ward'].replace(renames))
+        date = pd.Timestamp(self.month_data['Date'].iloc[0])
+        quality = validate.reconcile(totals, self.month_data, quarantined, date)
+        if self.quality_table is not None:
+            kept = self.quality_table[self.quality_table['Date'] != date]
+            quality = pd.concat([kept, quality], ignore_index=True)
+        self.quality_table = quality.sort_values(['Date', 'Ward'], kind='mergesort').reset_index(drop=True)
+        self.month_totals = None
+        return quality
+
+    def discrepancies(self, month=None):
+        """
+        wards whose Ward Summary totals differ from the rows merged
+
+        :param month: month to check, None for every month
+        :return dataframe: quality rows with the differences
+        """
+        return validate.discrepancies(self.quality_table, None if month is None else pd.Timestamp(month))
+
     def check_for_month(self, month_to_load):
         """
-        See if current month is already in dataframe
+        See if current month is already in dataframe, without a table loaded the last line of the table
+        csv is read instead
 
         :return boolean: true or false if month in dataframe
         """
-        tail = self.current_table.tail(1)
+        if self._current_table is None and self._columns is None:
+            table_name = files.build_table_name()
+            last = files.last_table_month(table_name, self.date_format) if os.path.exists(table_name) else None
+        else:
+            last = self.last_month
         rc = False
-        if tail.Year[0] == month_to_load.year and tail.Month[0] == month_to_load.month:
+        if last is not None and last.year == month_to_load.year and last.month == month_to_load.month:
             rc = True
             # gc.status_message = str(gc.current_month.strftime('%Y %m ') + 'already in table.')
         return rc
@@ -318,11 +686,12 @@ class IndexerValues:
 
     def write_ini(self):
         """
-        write the ini file using default filename
+        write the ini file using the configured filename, the cached copy is re-read on next use
 
         :return:
         """
-        self.write_ini_filename(self._fn)
+        self.write_ini_filename(str(config.get_config().ini_file))
+        config.get_config().reload()
 
     def write_ini_filename(self, fn):
         """
@@ -349,24 +718,27 @@ class IndexerValues:
         :param fh: file handle, passed to enable unittest
         :return:
         """
-        config = configparser.ConfigParser()
+        parser = configparser.ConfigParser()
 
         # create the default section
-        config[self._df] = {
+        parser[self._df] = {
             self._un: self.username,
             self._sn: self.stake_name,
             self._tm: self.to_email,
-            self._fm: self.from_email
+            self._fm: self.from_email,
+            self._be: self.backend
         }
-        config.write(fh)
+        if len(self.ward_email) > 0:
+            parser[self._we] = self.ward_email
+        parser.write(fh)
 
     def read_ini(self):
         """
-        read ini file using default file name
+        read the ini values from the configuration, the file is only parsed once per process
 
         :return:
         """
-        self.read_ini_filename(self._fn)
+        self.read_ini_parser(config.get_config().ini())
 
     def read_ini_filename(self, fn):
         """
@@ -390,13 +762,26 @@ class IndexerValues:
         :param fh: file handle of file to read
         :return:
         """
-        config = configparser.ConfigParser()
+        parser = configparser.ConfigParser()
         # config.read(file_name)
-        config.read_file(fh)
-        self.username = config[self._df][self._un]
-        self.stake_name = config[self._df][self._sn]
-        self.to_email = config[self._df][self._tm]
-        self.from_email = config[self._df][self._fm]
+        parser.read_file(fh)
+        self.read_ini_parser(parser)
+
+    def read_ini_parser(self, parser):
+        """
+        take the values from a parsed ini file
+
+        :param parser: ConfigParser holding the ini file
+        :return:
+        """
+        self.username = parser[self._df][self._un]
+        self.stake_name = parser[self._df][self._sn]
+        self.to_email = parser[self._df][self._tm]
+        self.from_email = parser[self._df][self._fm]
+        self.backend = parser[self._df].get(self._be, 'csv')
+        if parser.has_section(self._we):
+            self.ward_email = {ward: value for ward, value in parser.items(self._we)
+                               if ward not in parser.defaults()}
 
     def counts_by_date(self, df, columns):
         """
@@ -523,9 +908,13 @@ class IndexerValues:
         :param column: string for total_count or arbitrated
         :return:
         """
-        individuals = df.loc[df.index.to_period('M')
-                             .isin(df.index.to_period('M').unique()[-months:])]
-        individuals = individuals.groupby(['Name'])[column].sum().reset_index()
+        if df is self.current_table:
+            # whole table, the person history already holds the monthly totals
+            individuals = self.trailing_individuals(months, column)
+        else:
+            individuals = df.loc[df.index.to_period('M')
+                                 .isin(df.index.to_period('M').unique()[-months:])]
+            individuals = individuals.groupby(['Name'])[column].sum().reset_index()
         individuals = individuals[individuals[column] > 0]
         individuals = individuals.sort_values(by=column, ascending=False)
         if len(individuals) > max_size:
@@ -544,3 +933,284 @@ class IndexerValues:
             individuals = short_list
 
         return individuals
+
+    def individual_history(self, name, column='Indexed'):
+        """
+        monthly values for a single indexer
+
+        :param name: name of the individual
+        :param column: Indexed or Arbitrated
+        :return Series: value for every month in list_of_months, None if name not found
+        """
+        values = self.people.history(name, column)
+        if values is None:
+            return None
+        return pd.Series(values, index=self.list_of_months, name=column)
+
+    def consistent_individuals(self, year=None, column='Indexed'):
+        """
+        individuals with a value in every month of the year that is in the table
+
+        :param year: year to check, defaults to the year of the last month
+        :param column: Indexed or Arbitrated
+        :return list: names in sorted order
+        """
+        if year is None:
+            year = self.last_month.year
+        first_idx = max(history.month_key(year, 1) - self.people.first_key, 0)
+        last_idx = min(history.month_key(year, 12) + 1 - self.people.first_key, self.people.month_count)
+        return sorted(self.people.active_in_all(first_idx, last_idx, column))
+
+    def participation_counts(self, column='Indexed'):
+        """
+        active, new, returning and lapsed counts for each ward and month (cached)
+
+        :param column: Indexed or Arbitrated
+        :return dict: measure name to ward x month array, rows in people.ward_names order
+        """
+        key = ('participation', column)
+        if key not in self.aggregates:
+            self.aggregates[key] = metrics.participation(self.people.active(column), self.people.ward_codes,
+                                                         len(self.people.ward_names))
+        return self.aggregates[key]
+
+    def participation_by_ward(self, measure='Active', column='Indexed'):
+        """
+        dataframe of one participation measure, wards in sorted order by month
+
+        :param measure: Active, New, Returning or Lapsed
+        :param column: Indexed or Arbitrated
+        :return dataframe: sorted_wards x list_of_months
+        """
+        counts = self.participation_counts(column)[measure]
+        df = pd.DataFrame(counts, index=self.people.ward_names, columns=self.list_of_months)
+        return df.reindex(self.sorted_wards, fill_value=0)
+
+    def participation_by_date(self, measure='Active', column='Indexed'):
+        """
+        stake wide participation measure by month
+
+        :param measure: Active, New, Returning or Lapsed
+        :param column: Indexed or Arbitrated
+        :return Series: count for every month in list_of_months
+        """
+        counts = self.participation_counts(column)[measure]
+        return pd.Series(counts.sum(axis=0), index=self.list_of_months, name=measure)
+
+    def streak_list(self, max_size, column='Indexed'):
+        """
+        individuals with the longest current streak of active months
+
+        :param max_size: int maximum number of lines in list
+        :param column: Indexed or Arbitrated
+        :return dataframe: Name, Ward, Current and Longest sorted by current then longest streak
+        """
+        active = self.people.active(column)
+        df = pd.DataFrame({'Name': self.people.names,
+                           'Ward': self.people.wards,
+                           'Current': metrics.current_streaks(active),
+                           'Longest': metrics.longest_streaks(active)})
+        df = df[df.Current > 0]
+        df = df.sort_values(by=['Current', 'Longest', 'Name'], ascending=[False, False, True])
+        return df[:max_size].reset_index(drop=True)
+
+    def cohort_counts(self, column='Indexed'):
+        """
+        cohort x months since first activity counts for each ward (cached)
+
+        people are placed in the ward they were in for their first active month
+
+        :param column: Indexed or Arbitrated
+        :return array: ward x cohort x offset counts, wards in people.ward_names order
+        """
+        key = ('cohorts', column)
+        if key not in self.aggregates:
+            active = self.people.active(column)
+            first = metrics.first_active_month(active)
+            ward_codes = np.where(first >= 0, self.people.ward_codes[np.arange(len(first)), first], -1)
+            self.aggregates[key] = metrics.cohort_counts(active, ward_codes, len(self.people.ward_names))
+        return self.aggregates[key]
+
+    def cohort_retention(self, ward=None, column='Indexed'):
+        """
+        retention matrix for the stake or a single ward
+
+        dataframe looks like
+                    Size  0     1     2
+        2013-01-01  15    1.0   0.73  0.6
+        2013-02-01  20    1.0   0.55  0.5
+        ...
+
+        :param ward: ward name, None for the whole stake
+        :param column: Indexed or Arbitrated
+        :return dataframe: cohort size and fraction still active n months later, one row per cohort month
+        """
+        counts = self.cohort_counts(column)
+        if ward is None:
+            counts = counts.sum(axis=0)
+        elif ward in self.people.ward_index:
+            counts = counts[self.people.ward_index[ward]]
+        else:
+            counts = np.zeros(counts.shape[1:], dtype=np.int64)
+        df = pd.DataFrame(metrics.retention(counts), index=self.list_of_months,
+                          columns=range(len(self.list_of_months)))
+        df.insert(0, 'Size', counts[:, 0])
+        return df
+
+    def trailing_individuals(self, months, column='Indexed'):
+        """
+        totals per individual over the last months of the table
+
+        :param months: int how many months to go back
+        :param column: Indexed or Arbitrated
+        :return dataframe: Name and column total, one row per individual
+        """
+        totals = self.people.values[column][:, -months:].sum(axis=1)
+        return pd.DataFrame({'Name': self.people.names, column: totals})
+
+    def rolling_by_ward(self, window, measure='Indexed', how='sum'):
+        """
+        trailing window totals or means for every ward and month
+
+        :param window: number of months in the window
+        :param measure: Indexed, Arbitrated, Count or Active
+        :param how: sum or mean
+        :return dataframe: sorted_wards x list_of_months
+        """
+        if how == 'mean':
+            values = self.cube.window_mean(measure, window)
+        else:
+            values = self.cube.window_sum(measure, window)
+        df = pd.DataFrame(values, index=self.cube.ward_names, columns=self.list_of_months)
+        return df.reindex(self.sorted_wards, fill_value=0)
+
+    def trailing_totals(self, window, measure='Indexed', how='sum'):
+        """
+        trailing window value for each ward ending with the last month
+
+        :param window: number of months in the window, e.g. 3, 6 or 12
+        :param measure: Indexed, Arbitrated, Count or Active
+        :param how: sum or mean
+        :return Series: value per ward in sorted order
+        """
+        values = self.cube.trailing(measure, window, how)
+        return pd.Series(values, index=self.cube.ward_names, name=measure).reindex(self.sorted_wards,
+                                                                                   fill_value=0)
+
+    def trailing_active(self, window, column='Indexed'):
+        """
+        distinct individuals active at least once in the trailing window, by current ward
+
+        :param window: number of months in the window
+        :param column: Indexed or Arbitrated
+        :return Series: count per ward in sorted order
+        """
+        active = self.people.active(column)[:, -window:].any(axis=1)
+        counts = pd.Series(self.people.wards[active]).value_counts()
+        return counts.reindex(self.sorted_wards, fill_value=0).rename(column)
+
+    def year_over_year(self, measure='Indexed'):
+        """
+        year to date and year over year arrays for the stake and every ward in one call
+
+        row 0 of every array is the stake, the rest follow sorted_wards
+
+        :param measure: Indexed, Arbitrated, Count or Active
+        :return dict: labels, years, monthly, ytd, last_year, yoy and ytd_yoy (rows x years x 12)
+        """
+        key = ('year_over_year', measure)
+        if key not in self.aggregates:
+            values = self.cube.values(measure)
+            order = [self.cube.ward_index[ward] for ward in self.sorted_wards]
+            rows = np.vstack((values.sum(axis=0), values[order]))
+            comparison = cube.year_comparison(rows, self.cube.first_key)
+            comparison['labels'] = ['Stake'] + list(self.sorted_wards)
+            self.aggregates[key] = comparison
+        return self.aggregates[key]
+
+    def year_month_table(self, measure='Indexed', ward=None, value='monthly'):
+        """
+        year x month table for the stake or a ward
+
+        dataframe looks like
+                1      2      3  ...
+        2013   15     41     45
+        2014   27     33     31
+        2015   37     53     42
+
+        :param measure: Indexed, Arbitrated, Count or Active
+        :param ward: ward name, None for the stake
+        :param value: monthly, ytd, last_year, yoy or ytd_yoy
+        :return dataframe: one row per year, one column per calendar month
+        """
+        comparison = self.year_over_year(measure)
+        row = 0 if ward is None else comparison['labels'].index(ward)
+        return pd.DataFrame(comparison[value][row], index=comparison['years'], columns=range(1, 13))
+
+    def aggregate(self, group_by, measures, filters=None, window=None, force_scan=False):
+        """
+        sum measures by any grouping, answered from the cube when it covers the request
+
+        ::
+          >>> my_data.aggregate(['Ward'], ['Indexed'], filters={'Year': 2015}, window=3)
+          >>> my_data.aggregate(['Name'], ['Arbitrated'], filters={'Ward': 'Hazeldale'})
+
+        the plan used is left in last_plan, see explain_aggregate
+
+        :param group_by: list of Ward, Date, Year, Month or Name, empty for a single total
+        :param measures: list of Indexed, Arbitrated, Count or Active
+        :param filters: dict of column to value, list of values or (low, high) range
+        :param window: only use the last window months of the table
+        :param force_scan: skip the cube and scan the table (or query SQLite with the sqlite backend)
+        :return dataframe: measures indexed by the group columns
+        """
+        filters = {} if filters is None else filters
+        plan = query.plan_aggregate(group_by, measures, filters, self.cube.measures)
+        if force_scan and plan['path'] == 'cube':
+            plan = {'path': 'scan', 'reason': 'scan forced'}
+
+        if plan['path'] == 'scan' and self.store is not None:
+            plan = {'path': 'sql', 'reason': plan['reason'] + ', pushed down to SQLite'}
+            self.last_plan = query.explain(plan, group_by, measures, filters, window, len(self.current_table))
+            return self.store.aggregate(group_by, measures, filters, window)
+
+        if plan['path'] == 'cube':
+            frame = query.cube_frame(self.cube, self.list_of_months, measures)
+        else:
+            frame = query.scan_frame(self.current_table)
+        mask = query.filter_mask(frame, filters)
+        if window is not None:
+            mask &= (frame['Date'] >= self.list_of_months[-window]).values
+
+        self.last_plan = query.explain(plan, group_by, measures, filters, window, len(frame))
+        return query.group_sum(frame[mask], group_by, measures)
+
+    def explain_aggregate(self, group_by, measures, filters=None, window=None):
+        """
+        describe which path aggregate takes without running it
+
+        :param group_by: list of columns to group by
+        :param measures: list of measures
+        :param filters: dict of filters
+        :param window: trailing months or None
+        :return string: path, reason and amount of data read
+        """
+        filters = {} if filters is None else filters
+        plan = query.plan_aggregate(group_by, measures, filters, self.cube.measures)
+        if plan['path'] == 'scan' and self.store is not None:
+            plan = {'path': 'sql', 'reason': plan['reason'] + ', pushed down to SQLite'}
+        if plan['path'] == 'cube':
+            cells = len(self.cube.ward_names) * self.cube.month_count
+        else:
+            cells = len(self.current_table)
+        return query.explain(plan, group_by, measures, filters, window, cells)
+
+    def publish_shared(self):
+        """
+        copy the table into shared memory once for worker processes
+
+        workers attach with shared.TableView(published.handle), close the result when they are done
+
+        :return SharedTable: owner of the shared blocks
+        """
+        return shared.SharedTable(self.current_table, self.stake_name)
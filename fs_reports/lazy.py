@@ -0,0 +1,56 @@
+"""
+Lazy imports for the heavy packages
+
+pandas, numpy, dateutil and matplotlib take most of the start up time. Modules bind them with lazy_import
+so they are only imported when first used, and commands that just move a file or read the ini start fast.
+
+"""
+
+# system imports
+import importlib
+import sys
+import types
+
+# package imports
+# module imports
+
+
+class LazyModule(types.ModuleType):
+    """ stand in for a module, imports it on the first attribute lookup
+
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__dict__['_lazy_name'])
+        # copy the real attributes over so later lookups skip __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__dict__['_lazy_name']))
+
+
+def lazy_import(name):
+    """
+    module that is imported when first used, the module itself if it is already imported
+
+    :param name: full module name, e.g. matplotlib.backends.backend_pdf
+    :return module: the module or a LazyModule for it
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def is_loaded(name):
+    """
+    check if a module has really been imported
+
+    :param name: module name
+    :return boolean: True when imported
+    """
+    return name in sys.modules
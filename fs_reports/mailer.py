@@ -0,0 +1,253 @@
+"""
+Deliver the report PDFs by email
+
+Each run's PDFs are picked up from the report directory and grouped so every recipient gets one message:
+the stake recipients (to_email) get the stake report and every ward report, each ward's recipients
+get their own ward report. All messages go over a single SMTP connection, failed sends are retried
+with exponential backoff on a fresh connection.
+
+"""
+
+# system imports
+import re
+import smtplib
+import socket
+import time
+from email.message import EmailMessage
+from pathlib import Path
+
+# package imports
+# module imports
+import fs_reports.files as files
+
+# ward or stake name and yyyymm, e.g. Aloha I_201512.pdf
+report_pattern = re.compile(r'^(?P<name>.+)_(?P<month>\d{6})\.pdf$')
+stake_report = 'Stake'
+
+
+def split_addresses(addresses):
+    """
+    list of addresses from the comma separated ini value
+
+    :param addresses: string, list or None
+    :return list: addresses
+    """
+    if addresses is None:
+        return []
+    if isinstance(addresses, str):
+        addresses = addresses.split(',')
+    return [address.strip() for address in addresses if address.strip()]
+
+
+def report_files(directory=None, month=None):
+    """
+    PDFs of one run, keyed by ward name or Stake
+
+    :param directory: report directory, default files.build_path_to_report_directory
+    :param month: datetime of the reports, None for every month found
+    :return dict: name to Path
+    """
+    directory = Path(directory) if directory is not None else files.build_path_to_report_directory()
+    reports = {}
+    for path in sorted(directory.glob('*.pdf')):
+        match = report_pattern.match(path.name)
+        if match is None:
+            continue
+        if month is not None and match.group('month') != month.strftime('%Y%m'):
+            continue
+        reports[match.group('name')] = path
+    return reports
+
+
+def build_batches(reports, stake_recipients, ward_recipients):
+    """
+    group attachments so each recipient gets one message
+
+    :param reports: dict of ward (or Stake) to Path from report_files
+    :param stake_recipients: addresses that get every report
+    :param ward_recipients: dict of ward name to addresses, matched ignoring case
+    :return dict: tuple of addresses to list of Paths
+    """
+    ward_recipients = {ward.lower(): split_addresses(addresses) for ward, addresses in ward_recipients.items()}
+    by_address = {}
+    for name, path in reports.items():
+        addresses = split_addresses(stake_recipients)
+        if name != stake_report:
+            addresses += ward_recipients.get(name.lower(), [])
+        for address in addresses:
+            by_address.setdefault(address, [])
+            if path not in by_address[address]:
+                by_address[address].append(path)
+
+    # addresses with the same attachments share one message
+    batches = {}
+    for address, paths in by_address.items():
+        batches.setdefault(tuple(paths), []).append(address)
+    return {tuple(addresses): list(paths) for paths, addresses in batches.items()}
+
+
+def build_message(from_email, recipients, attachments, subject, body=''):
+    """
+    email with PDF attachments
+
+    :param from_email: sender address
+    :param recipients: list of addresses
+    :param attachments: list of Paths
+    :param subject: subject line
+    :param body: plain text body
+    :return EmailMessage: the message
+    """
+    message = EmailMessage()
+    message['From'] = from_email
+    message['To'] = ', '.join(recipients)
+    message['Subject'] = subject
+    message.set_content(body or 'Indexing reports attached:\n' +
+                        '\n'.join(Path(path).name for path in attachments))
+    for path in attachments:
+        with open(str(path), 'rb') as fh:
+            message.add_attachment(fh.read(), maintype='application', subtype='pdf', filename=Path(path).name)
+    return message
+
+
+def is_transient(error):
+    """
+    check if a send is worth retrying
+
+    :param error: exception from smtplib
+    :return boolean: True for dropped connections and 4xx replies
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError,
+                              socket.timeout))
+
+
+class Mailer:
+    """ one pooled SMTP connection reused for every message
+
+    use as a context manager or call close after the last send
+    """
+
+    def __init__(self, host='localhost', port=25, username=None, password=None, use_tls=False,
+                 retries=3, backoff=1.0, timeout=30.0):
+        """ remember the server, the connection is opened on the first send
+
+        :param host: SMTP server
+        :param port: SMTP port
+        :param username: login user, None for no login
+        :param password: login password
+        :param use_tls: start TLS after connecting
+        :param retries: extra attempts for a transient failure
+        :param backoff: seconds before the first retry, doubled each retry
+        :param timeout: socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.smtp = None
+        self.connections = 0
+        self.sent = 0
+
+    def connect(self):
+        """
+        open the connection if it is not open
+
+        :return SMTP: the connection
+        """
+        if self.smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            self.smtp = smtp
+            self.connections += 1
+        return self.smtp
+
+    def close(self):
+        """
+        quit the connection, a dropped connection is just discarded
+
+        :return:
+        """
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp.close()
+            self.smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def send(self, message):
+        """
+        send one message, retrying transient failures on a new connection
+
+        :param message: EmailMessage
+        :return dict: refused recipients from smtplib
+        """
+        attempt = 0
+        while True:
+            try:
+                refused = self.connect().send_message(message)
+                self.sent += 1
+                return refused
+            except (smtplib.SMTPException, OSError) as e:
+                if attempt >= self.retries or not is_transient(e):
+                    raise
+                self.close()
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+
+    def send_all(self, messages):
+        """
+        send every message over the pooled connection
+
+        :param messages: list of EmailMessage
+        :return list: refused recipients for each message
+        """
+        return [self.send(message) for message in messages]
+
+
+def build_messages(my_data, month=None, directory=None):
+    """
+    one message per batch of recipients for a run
+
+    :param my_data: IndexerValues with the stake name, addresses and ward_email
+    :param month: datetime of the reports, default my_data.last_month
+    :param directory: report directory, default files.build_path_to_report_directory
+    :return list: EmailMessage
+    """
+    month = my_data.last_month if month is None else month
+    reports = report_files(directory, month)
+    batches = build_batches(reports, my_data.to_email, my_data.ward_email)
+    subject = my_data.stake_name + ' indexing reports ' + month.strftime('%B %Y')
+    return [build_message(my_data.from_email, list(recipients), attachments, subject)
+            for recipients, attachments in batches.items()]
+
+
+def deliver(my_data, mailer, month=None, directory=None):
+    """
+    package and send a run's reports
+
+    :param my_data: IndexerValues with the stake name, addresses and ward_email
+    :param mailer: Mailer to send with
+    :param month: datetime of the reports, default my_data.last_month
+    :param directory: report directory, default files.build_path_to_report_directory
+    :return int: messages sent
+    """
+    messages = build_messages(my_data, month, directory)
+    with mailer:
+        mailer.send_all(messages)
+    return len(messages)
@@ -0,0 +1,183 @@
+"""
+Participation and streak metrics for all indexers at once
+
+Every function works on the boolean person x month activity matrix from the person history so that
+the whole stake is handled in a few numpy operations instead of a groupby per ward.
+
+"""
+
+# system imports
+# package imports
+import numpy as np
+
+# module imports
+
+
+def run_lengths(active):
+    """
+    length of the run of active months ending at each cell
+
+    :param active: boolean person x month matrix
+    :return array: int matrix, 0 where inactive
+    """
+    counts = np.cumsum(active, axis=1)
+    # value of the running count at the most recent inactive month, carried forward
+    resets = np.maximum.accumulate(np.where(active, 0, counts), axis=1)
+    return counts - resets
+
+
+def longest_streaks(active):
+    """
+    longest run of consecutive active months for each person
+
+    :param active: boolean person x month matrix
+    :return array: int per person
+    """
+    if active.shape[1] == 0:
+        return np.zeros(active.shape[0], dtype=np.int64)
+    return run_lengths(active).max(axis=1)
+
+
+def current_streaks(active):
+    """
+    run of consecutive active months ending with the last month
+
+    :param active: boolean person x month matrix
+    :return array: int per person
+    """
+    if active.shape[1] == 0:
+        return np.zeros(active.shape[0], dtype=np.int64)
+    return run_lengths(active)[:, -1]
+
+
+def first_active_month(active):
+    """
+    column of the first active month for each person
+
+    :param active: boolean person x month matrix
+    :return array: column index per person, -1 if never active
+    """
+    first = np.argmax(active, axis=1)
+    return np.where(active.any(axis=1), first, -1)
+
+
+def new_mask(active):
+    """
+    cells where a person is active for the first time
+
+    :param active: boolean person x month matrix
+    :return array: boolean person x month matrix
+    """
+    return active & (np.cumsum(active, axis=1) == 1)
+
+
+def returning_mask(active):
+    """
+    cells where a person is active again after at least one inactive month
+
+    :param active: boolean person x month matrix
+    :return array: boolean person x month matrix
+    """
+    previous = np.zeros_like(active)
+    previous[:, 1:] = active[:, :-1]
+    return active & ~previous & (np.cumsum(active, axis=1) > 1)
+
+
+def lapsed_mask(active):
+    """
+    cells where a person active the month before is not active
+
+    :param active: boolean person x month matrix
+    :return array: boolean person x month matrix
+    """
+    previous = np.zeros_like(active)
+    previous[:, 1:] = active[:, :-1]
+    return previous & ~active
+
+
+def previous_ward_codes(ward_codes):
+    """
+    ward codes shifted forward one month, used to place lapsed indexers in the ward they left
+
+    :param ward_codes: person x month ward code matrix
+    :return array: ward code matrix, -1 in the first month
+    """
+    previous = np.full_like(ward_codes, -1)
+    previous[:, 1:] = ward_codes[:, :-1]
+    return previous
+
+
+def ward_month_counts(mask, ward_codes, ward_count):
+    """
+    count the flagged cells for each ward and month
+
+    :param mask: boolean person x month matrix
+    :param ward_codes: person x month ward code matrix for the flagged cells
+    :param ward_count: number of wards
+    :return array: ward x month counts
+    """
+    month_count = mask.shape[1]
+    rows, cols = np.nonzero(mask)
+    codes = ward_codes[rows, cols].astype(np.int64)
+    keep = codes >= 0
+    cells = codes[keep] * month_count + cols[keep]
+    counts = np.bincount(cells, minlength=ward_count * month_count)
+    return counts.reshape(ward_count, month_count)
+
+
+def participation(active, ward_codes, ward_count):
+    """
+    active, new, returning and lapsed counts for every ward and month
+
+    :param active: boolean person x month matrix
+    :param ward_codes: person x month ward code matrix
+    :param ward_count: number of wards
+    :return dict: measure name to ward x month count array
+    """
+    return {
+        'Active': ward_month_counts(active, ward_codes, ward_count),
+        'New': ward_month_counts(new_mask(active), ward_codes, ward_count),
+        'Returning': ward_month_counts(returning_mask(active), ward_codes, ward_count),
+        'Lapsed': ward_month_counts(lapsed_mask(active), previous_ward_codes(ward_codes), ward_count)
+    }
+
+
+def cohort_counts(active, group_codes, group_count):
+    """
+    active counts by first activity cohort and months since the first month
+
+    cell [g, c, n] is the number of people in group g whose first active month is c and who are
+    active n months later
+
+    :param active: boolean person x month matrix
+    :param group_codes: group code per person (ward of the first active month), -1 to leave out
+    :param group_count: number of groups
+    :return array: group x cohort x offset counts
+    """
+    month_count = active.shape[1]
+    first = first_active_month(active)
+    rows, cols = np.nonzero(active)
+    offsets = cols - first[rows]
+    groups = group_codes[rows].astype(np.int64)
+    keep = groups >= 0
+    cells = (groups[keep] * month_count + first[rows][keep]) * month_count + offsets[keep]
+    counts = np.bincount(cells, minlength=group_count * month_count * month_count)
+    return counts.reshape(group_count, month_count, month_count)
+
+
+def retention(counts):
+    """
+    fraction of each cohort still active n months later
+
+    offsets past the last month in the data are NaN rather than zero
+
+    :param counts: cohort x offset counts (offset 0 is the cohort size)
+    :return array: cohort x offset fractions, NaN where the cohort is empty or not yet observed
+    """
+    month_count = counts.shape[-1]
+    sizes = counts[..., :1].astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fractions = np.where(sizes > 0, counts / sizes, np.nan)
+    cohort = np.arange(month_count)[:, None]
+    offset = np.arange(month_count)[None, :]
+    return np.where(cohort + offset < month_count, fractions, np.nan)
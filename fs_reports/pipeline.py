@@ -0,0 +1,268 @@
+"""
+Asynchronous monthly pipeline: ingest, aggregate, render and deliver
+
+The stages run on an asyncio loop without any window. Parsing and aggregation run in a thread so the
+loop stays free, rendering runs in a process pool whose workers attach to the table published once in
+shared memory, and each finished report goes through a bounded queue to delivery, so mail for a ward goes
+out while the other reports are still being drawn. A slow mail server fills the queue and holds back new
+renders instead of piling up PDFs.
+
+"""
+
+# system imports
+import asyncio
+import contextlib
+import copy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# package imports
+# module imports
+import fs_reports.mailer as mailer
+import fs_reports.reports as reports
+import fs_reports.shared as shared
+
+# IndexerValues in each render worker, set once by the pool initializer
+worker_data = None
+
+
+def worker_copy(my_data):
+    """
+    copy for render workers without the rows, the person history or the database connection
+
+    the cube, ward data and cached aggregates are kept, the rows go through shared memory
+
+    :param my_data: IndexerValues with the table loaded
+    :return IndexerValues: shallow copy that is cheap to pickle
+    """
+    data = copy.copy(my_data)
+    data.store = None
+    data.current_table = None
+    data.people = None
+    return data
+
+
+def set_worker_data(my_data, handle=None):
+    """
+    pool initializer, keep the table for every report rendered by this worker
+
+    the view stays attached for the life of the worker, the decoded table reads from it
+
+    :param my_data: IndexerValues, from worker_copy when a handle is given
+    :param handle: SharedTable.handle of the published rows, None when my_data has its table
+    :return:
+    """
+    global worker_data
+    if handle is not None:
+        my_data.open_columns(shared.TableView(handle))
+    worker_data = my_data
+
+
+def render_in_worker(name, file_name):
+    """
+    render one report with the worker's table
+
+    :param name: Stake or a ward name
+    :param file_name: pdf to write
+    :return string: file name written
+    """
+    return str(reports.render_report(worker_data, name, file_name))
+
+
+class ReportPipeline:
+    """ one monthly run
+
+    """
+
+    def __init__(self, my_data, lsr_file=None, directory=None, report_mailer=None, processes=None,
+                 queue_size=4, save=True, report_bundle=None):
+        """ set up the run
+
+        :param my_data: IndexerValues with the table loaded
+        :param lsr_file: downloaded lsr to ingest first, None to report on the table as it is
+        :param directory: report directory, default files.build_path_to_report_directory
+        :param report_mailer: Mailer for delivery, None to only render
+        :param processes: render processes, None for one per core, 1 renders in a single thread
+        :param queue_size: finished reports waiting for delivery before rendering pauses
+        :param save: write the table after ingest
+        :param report_bundle: bundle.ReportBundle each report is added to as it is delivered, closed at the end
+        """
+        self.my_data = my_data
+        self.lsr_file = lsr_file
+        self.directory = directory
+        self.report_mailer = report_mailer
+        self.processes = processes
+        self.queue_size = queue_size
+        self.save = save
+        self.report_bundle = report_bundle
+        self.timings = {}
+        self.rendered = []
+        self.sent = 0
+
+    def ingest_month(self):
+        """
+        load and merge the downloaded month, blocking
+
+        :return datetime: month merged, None when it was already in the table
+        """
+        month = self.my_data.next_month
+        if self.my_data.load_this_month_file(self.lsr_file, month) is None:
+            return None
+        if self.my_data.bad_wards is not None:
+            raise ValueError('Unknown wards in ' + str(self.lsr_file) + ': ' +
+                             ', '.join(str(ward) for ward in self.my_data.bad_wards))
+        self.my_data.merge_month_to_table()
+        if self.save:
+            self.my_data.write_quarantine(month)
+            self.my_data.write_table()
+        return month
+
+    def aggregate_month(self):
+        """
+        fill the aggregate cache the reports read, blocking
+
+        done once here so render workers get the results instead of each computing them
+
+        :return:
+        """
+        for measure in ['Indexed', 'Arbitrated', 'Active']:
+            self.my_data.year_over_year(measure)
+
+    @contextlib.asynccontextmanager
+    async def executor(self):
+        """
+        pool for rendering, worker processes attach to the table published once in shared memory
+
+        the pool is shut down and the blocks removed in a thread, waiting for the last renders must not
+        hold up delivery on the loop
+
+        :return Executor: process pool, or one thread when processes is 1
+        """
+        async with contextlib.AsyncExitStack() as stack:
+            if self.processes == 1:
+                executor = ThreadPoolExecutor(1, initializer=set_worker_data, initargs=(self.my_data,))
+            else:
+                published = self.my_data.publish_shared()
+                # the blocks are removed only after the pool has shut down
+                stack.push_async_callback(asyncio.to_thread, published.close)
+                executor = ProcessPoolExecutor(self.processes, initializer=set_worker_data,
+                                               initargs=(worker_copy(self.my_data), published.handle))
+            stack.push_async_callback(asyncio.to_thread, executor.shutdown)
+            yield executor
+
+    async def timed(self, stage, coroutine):
+        """
+        run a stage and record how long it took
+
+        :param stage: stage name
+        :param coroutine: the stage
+        :return: result of the stage
+        """
+        start = time.perf_counter()
+        try:
+            return await coroutine
+        finally:
+            self.timings[stage] = time.perf_counter() - start
+
+    async def render(self, queue, names):
+        """
+        render every report, a full queue holds back new renders
+
+        the end marker is only queued after every report, when a render fails run cancels delivery instead
+        (a put in a finally could wait forever on a full queue nobody reads)
+
+        :param queue: asyncio.Queue to delivery
+        :param names: dict of report name to file name
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        # enough renders in flight to keep every worker busy, plus the reports waiting for delivery
+        slots = asyncio.Semaphore((self.processes or os.cpu_count() or 1) + self.queue_size)
+
+        async def render_one(executor, name, file_name):
+            async with slots:
+                path = await loop.run_in_executor(executor, render_in_worker, name, str(file_name))
+                await queue.put((name, path))
+
+        async with self.executor() as executor:
+            await asyncio.gather(*[render_one(executor, name, file_name)
+                                   for name, file_name in names.items()])
+        await queue.put(None)
+
+    async def deliver(self, queue, names):
+        """
+        send each batch as soon as all of its reports are rendered, and bundle each report as it arrives
+
+        :param queue: asyncio.Queue from render
+        :param names: dict of report name to file name
+        :return:
+        """
+        batches = {}
+        if self.report_mailer is not None:
+            batches = mailer.build_batches(names, self.my_data.to_email, self.my_data.ward_email)
+        subject = self.my_data.stake_name + ' indexing reports ' + self.my_data.last_month.strftime('%B %Y')
+        ready = set()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                name, path = item
+                self.rendered.append(path)
+                ready.add(names[name])
+                if self.report_bundle is not None:
+                    await asyncio.to_thread(self.report_bundle.add, path)
+                for recipients, attachments in list(batches.items()):
+                    if all(attachment in ready for attachment in attachments):
+                        del batches[recipients]
+                        message = mailer.build_message(self.my_data.from_email, list(recipients), attachments,
+                                                       subject)
+                        await asyncio.to_thread(self.report_mailer.send, message)
+                        self.sent += 1
+        finally:
+            if self.report_mailer is not None:
+                await asyncio.to_thread(self.report_mailer.close)
+            if self.report_bundle is not None:
+                await asyncio.to_thread(self.report_bundle.close)
+
+    async def run(self):
+        """
+        run every stage
+
+        :return dict: seconds per stage and in total
+        """
+        start = time.perf_counter()
+        if self.lsr_file is not None:
+            await self.timed('ingest', asyncio.to_thread(self.ingest_month))
+        await self.timed('aggregate', asyncio.to_thread(self.aggregate_month))
+
+        names = reports.report_names(self.my_data, self.directory)
+        for file_name in names.values():
+            file_name.parent.mkdir(parents=True, exist_ok=True)
+        queue = asyncio.Queue(self.queue_size)
+        stages = [asyncio.ensure_future(self.timed('render', self.render(queue, names))),
+                  asyncio.ensure_future(self.timed('deliver', self.deliver(queue, names)))]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            # a failed stage stops the other, otherwise render waits on the full queue or deliver on an empty one
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        self.timings['total'] = time.perf_counter() - start
+        return self.timings
+
+
+def run_pipeline(my_data, **kwargs):
+    """
+    run the monthly pipeline from synchronous code
+
+    :param my_data: IndexerValues with the table loaded
+    :param kwargs: ReportPipeline arguments
+    :return ReportPipeline: finished pipeline with timings, rendered and sent
+    """
+    pipeline = ReportPipeline(my_data, **kwargs)
+    asyncio.run(pipeline.run())
+    return pipeline
@@ -0,0 +1,137 @@
+"""
+Generic aggregate queries over the table
+
+A request is answered from the ward x month cube when every group, measure and filter is at ward /
+month grain, otherwise it falls back to a scan of the full table. Both paths give the same result
+so the plan only changes how long the answer takes.
+
+"""
+
+# system imports
+# package imports
+import numpy as np
+import pandas as pd
+
+# module imports
+
+# columns the cube can group and filter on
+cube_keys = ['Ward', 'Date', 'Year', 'Month']
+
+
+def plan_aggregate(group_by, measures, filters, cube_measures):
+    """
+    decide if the cube covers the request
+
+    :param group_by: list of columns to group by
+    :param measures: list of columns to sum
+    :param filters: dict of column to filter value
+    :param cube_measures: measures held in the cube
+    :return dict: path (cube or scan) and the reason
+    """
+    missing = [key for key in group_by if key not in cube_keys]
+    if missing:
+        return {'path': 'scan', 'reason': 'group by ' + ', '.join(missing) + ' is below ward/month grain'}
+    missing = [key for key in filters if key not in cube_keys]
+    if missing:
+        return {'path': 'scan', 'reason': 'filter on ' + ', '.join(missing) + ' is below ward/month grain'}
+    missing = [measure for measure in measures if measure not in cube_measures]
+    if missing:
+        return {'path': 'scan', 'reason': 'measure ' + ', '.join(missing) + ' not in cube'}
+    return {'path': 'cube', 'reason': 'covered by ward x month cube'}
+
+
+def filter_mask(frame, filters):
+    """
+    rows of the frame that pass every filter
+
+    a filter value can be a single value, a list of values or a (low, high) tuple for an inclusive range
+
+    :param frame: dataframe holding the filter columns
+    :param filters: dict of column to filter value
+    :return array: boolean mask
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    for column, value in filters.items():
+        values = frame[column]
+        if isinstance(value, tuple):
+            low, high = value
+            mask &= ((values >= low) & (values <= high)).values
+        elif isinstance(value, (list, set, np.ndarray)):
+            mask &= values.isin(list(value)).values
+        else:
+            mask &= (values == value).values
+    return mask
+
+
+def cube_frame(ward_cube, months, measures):
+    """
+    long form dataframe of the cube, one row per ward and month
+
+    :param ward_cube: WardCube to read
+    :param months: list of datetimes for the cube columns
+    :param measures: measures to include (Count is always included)
+    :return dataframe: Ward, Date, Year, Month and the measures
+    """
+    ward_count = len(ward_cube.ward_names)
+    month_count = ward_cube.month_count
+    dates = pd.DatetimeIndex(months[:month_count])
+    frame = pd.DataFrame({
+        'Ward': np.repeat(ward_cube.ward_names, month_count),
+        'Date': np.tile(dates.values, ward_count),
+        'Year': np.tile(dates.year.values, ward_count),
+        'Month': np.tile(dates.month.values, ward_count)
+    })
+    for measure in dict.fromkeys(list(measures) + ['Count']):
+        frame[measure] = ward_cube.values(measure).ravel()
+    return frame
+
+
+def scan_frame(df):
+    """
+    raw table with the derived measures added
+
+    :param df: the full table
+    :return dataframe: copy of the table with Count and Active columns
+    """
+    frame = df.reset_index(drop=True)
+    frame['Count'] = 1
+    frame['Active'] = (frame['Indexed'] > 0).astype(np.int64)
+    return frame
+
+
+def group_sum(frame, group_by, measures):
+    """
+    group and sum, dropping groups with no rows in the table
+
+    :param frame: dataframe from cube_frame or scan_frame
+    :param group_by: list of columns to group by, empty for a single total
+    :param measures: measures to sum
+    :return dataframe: summed measures indexed by the group columns
+    """
+    if len(group_by) == 0:
+        totals = frame[list(measures)].sum()
+        return pd.DataFrame([totals.values], index=['Total'], columns=list(measures))
+    totals = frame.groupby(list(group_by))[list(dict.fromkeys(list(measures) + ['Count']))].sum()
+    totals = totals[totals['Count'] > 0]
+    return totals[list(measures)]
+
+
+def explain(plan, group_by, measures, filters, window, cells):
+    """
+    text description of a plan
+
+    :param plan: dict from plan_aggregate
+    :param group_by: list of columns to group by
+    :param measures: list of measures
+    :param filters: dict of filters
+    :param window: trailing months or None
+    :param cells: number of rows or cube cells read
+    :return string: one line explanation
+    """
+    source = {'cube': 'cube cells', 'scan': 'table rows', 'sql': 'table rows in SQLite'}[plan['path']]
+    return (plan['path'] + ': ' + plan['reason'] +
+            '; group_by=' + str(list(group_by)) +
+            ' measures=' + str(list(measures)) +
+            ' filters=' + str(sorted(filters)) +
+            ' window=' + str(window) +
+            '; read ' + str(cells) + ' ' + source)
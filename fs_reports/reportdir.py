@@ -0,0 +1,146 @@
+"""
+Report directory manager
+
+Before a run the previous reports in reports/current are kept by renaming the whole directory into
+reports/archive/<month of the reports>, a single rename however many files there are. Old archives are
+pruned by age and total size, the directories removed in parallel.
+
+"""
+
+# system imports
+import datetime
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# package imports
+# module imports
+import fs_reports.config as config
+
+# yyyymm at the end of a report name, e.g. Aloha I_201512.pdf
+month_pattern = re.compile(r'_(\d{6})\.pdf$')
+
+
+def directory_size(path):
+    """
+    bytes held by every file below a directory
+
+    :param path: directory
+    :return int: total size
+    """
+    total = 0
+    stack = [str(path)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+class ReportDirectory:
+    """ current reports and their archives
+
+    """
+
+    def __init__(self, reports_root=None):
+        """ locate the directories
+
+        :param reports_root: directory holding current and archive, default from the configuration
+        """
+        self.root = Path(reports_root) if reports_root is not None else config.get_config().reports_root
+        self.current = self.root.joinpath('current')
+        self.archive = self.root.joinpath('archive')
+
+    def run_name(self):
+        """
+        archive name for the reports in current, the report month or today when there is none
+
+        :return string: yyyymm
+        """
+        with os.scandir(str(self.current)) as entries:
+            for entry in entries:
+                match = month_pattern.search(entry.name)
+                if match is not None:
+                    return match.group(1)
+        return datetime.date.today().strftime('%Y%m')
+
+    def archive_current(self):
+        """
+        rename current into the archive, a second run for the same month gets a numbered name
+
+        :return Path: archive directory, None when there was nothing to keep
+        """
+        if not self.current.exists():
+            return None
+        with os.scandir(str(self.current)) as entries:
+            if next(entries, None) is None:
+                return None
+        self.archive.mkdir(parents=True, exist_ok=True)
+        name = self.run_name()
+        destination = self.archive.joinpath(name)
+        count = 1
+        while destination.exists():
+            destination = self.archive.joinpath(name + '-' + str(count))
+            count += 1
+        os.rename(str(self.current), str(destination))
+        return destination
+
+    def archives(self):
+        """
+        archived runs, oldest first
+
+        :return list: (Path, modified time, size in bytes)
+        """
+        if not self.archive.exists():
+            return []
+        runs = []
+        with os.scandir(str(self.archive)) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    runs.append((Path(entry.path), entry.stat().st_mtime, directory_size(entry.path)))
+        return sorted(runs, key=lambda run: (run[1], run[0].name))
+
+    def prune(self, max_age_days=None, max_bytes=None, workers=4):
+        """
+        remove archives older than max_age_days, then the oldest until the rest fit in max_bytes
+
+        :param max_age_days: oldest archive to keep, None for no age limit
+        :param max_bytes: total size of the archives kept, None for no size limit
+        :param workers: directories removed at once
+        :return list: Paths removed
+        """
+        runs = self.archives()
+        doomed = []
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 24 * 60 * 60
+            doomed = [run for run in runs if run[1] < cutoff]
+            runs = [run for run in runs if run[1] >= cutoff]
+        if max_bytes is not None:
+            total = sum(run[2] for run in runs)
+            while runs and total > max_bytes:
+                run = runs.pop(0)
+                total -= run[2]
+                doomed.append(run)
+        paths = [run[0] for run in doomed]
+        with ThreadPoolExecutor(max(1, min(workers, len(paths)))) as executor:
+            list(executor.map(shutil.rmtree, paths))
+        return paths
+
+    def prepare(self, max_age_days=None, max_bytes=None):
+        """
+        archive the previous run, prune the archives and leave an empty current directory
+
+        :param max_age_days: oldest archive to keep, None for no age limit
+        :param max_bytes: total size of the archives kept, None for no size limit
+        :return Path: the empty current directory
+        """
+        self.archive_current()
+        self.prune(max_age_days, max_bytes)
+        self.current.mkdir(parents=True, exist_ok=True)
+        return self.current
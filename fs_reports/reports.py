@@ -0,0 +1,328 @@
+"""
+Render the stake and ward reports as PDF
+
+The charts follow the old reporter: year over year bars with the values tabled underneath, running totals
+and the 1, 3 and 6 month lists of individuals. Only the matplotlib object API is used (no pyplot state) so
+reports can be drawn in worker threads or processes.
+
+"""
+
+# system imports
+from pathlib import Path
+
+# package imports
+from fs_reports.lazy import lazy_import
+np = lazy_import('numpy')
+backend_pdf = lazy_import('matplotlib.backends.backend_pdf')
+figure = lazy_import('matplotlib.figure')
+matplotlib = lazy_import('matplotlib')
+
+# module imports
+import fs_reports.files as files
+
+month_labels = "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"
+month_list = list(range(1, 13))
+page_size = (8.5, 11)
+list_size = 11
+
+
+def year_colors(count):
+    """
+    one color per year, newest darkest
+
+    :param count: number of years
+    :return list: rgba colors
+    """
+    color_map = matplotlib.colormaps['Blues']
+    return [color_map(value) for value in np.linspace(0.35, 0.9, max(count, 1))][:count]
+
+
+def year_bars(ax, df, title):
+    """
+    stacked year bars with the values tabled under the chart
+
+    :param ax: axis for the chart
+    :param df: year x month dataframe from year_month_table
+    :param title: chart title
+    :return:
+    """
+    df = df.fillna(0)
+    colors = year_colors(len(df))
+    bottom = np.zeros(len(month_list))
+    cell_text = []
+    for color, (year, row) in zip(colors, df.iterrows()):
+        values = row.values.astype(int)
+        ax.bar(np.arange(len(month_list)), values, width=0.7, bottom=bottom, color=color)
+        bottom = bottom + values
+        cell_text.append(values.tolist())
+    ax.set_title(title)
+    ax.set_xticks([])
+    ax.table(cellText=cell_text, rowLabels=[str(year) for year in df.index], colLabels=month_labels,
+             rowColours=colors, loc='bottom')
+
+
+def running_lines(ax, df, title):
+    """
+    running total of each year
+
+    :param ax: axis for the chart
+    :param df: year x month dataframe from year_month_table
+    :param title: chart title
+    :return:
+    """
+    colors = year_colors(len(df))
+    cumulative = df.fillna(0).cumsum(axis=1)
+    for color, (year, row) in zip(colors, cumulative.iterrows()):
+        ax.plot(month_list, row.values, marker='o', color=color)
+    ax.set_title(title)
+    ax.set_xticks([])
+    ax.table(cellText=cumulative.values.astype(int).tolist(), rowLabels=[str(year) for year in df.index],
+             colLabels=month_labels, rowColours=colors, loc='bottom')
+
+
+def short_name(name):
+    """
+    first and last name only, keeps the lists narrow
+
+    :param name: full name
+    :return string: shortened name
+    """
+    parts = str(name).split()
+    return parts[0] + ' ' + parts[-1] if len(parts) > 2 else str(name)
+
+
+def list_table(ax, df, column, title):
+    """
+    table of names and counts
+
+    :param ax: axis to hold the table
+    :param df: dataframe from individual_list
+    :param column: Indexed or Arbitrated
+    :param title: table title
+    :return:
+    """
+    rows = [[short_name(name), int(value)] for name, value in zip(df['Name'], df[column])]
+    ax.set_title(title)
+    ax.axis('off')
+    if len(rows) > 0:
+        table = ax.table(cellText=rows, loc='upper left', colWidths=[0.75, 0.25])
+        table.set_fontsize(10)
+
+
+def history_page(pdf, df, title):
+    """
+    page with the year bars and the running totals
+
+    :param pdf: PdfPages to add the page to
+    :param df: year x month dataframe from year_month_table
+    :param title: title of the bar chart
+    :return:
+    """
+    fig = figure.Figure(figsize=page_size)
+    ax1 = fig.add_axes([0.12, 0.62, 0.8, 0.3])
+    ax2 = fig.add_axes([0.12, 0.18, 0.8, 0.3])
+    year_bars(ax1, df, title)
+    running_lines(ax2, df, 'Running Total')
+    pdf.savefig(fig)
+
+
+def lists_page(pdf, my_data, df, year_df, column, title):
+    """
+    page with the year bars and the 1, 3 and 6 month lists
+
+    :param pdf: PdfPages to add the page to
+    :param my_data: IndexerValues with the table loaded
+    :param df: rows to list, current_table or a ward slice
+    :param year_df: year x month dataframe for the bars
+    :param column: Indexed or Arbitrated
+    :param title: title of the bar chart
+    :return:
+    """
+    fig = figure.Figure(figsize=page_size)
+    ax1 = fig.add_axes([0.12, 0.62, 0.8, 0.3])
+    year_bars(ax1, year_df, title)
+    month_title = column + ' ' + my_data.last_month.strftime('%B %Y')
+    for idx, (months, list_title) in enumerate([(1, month_title), (3, 'Last 3 Months'), (6, 'Last 6 Months')]):
+        ax = fig.add_axes([0.05 + idx * 0.32, 0.05, 0.28, 0.4])
+        list_table(ax, my_data.individual_list(df, months, list_size, column), column, list_title)
+    pdf.savefig(fig)
+
+
+def quality_page(pdf, df, title):
+    """
+    page listing the wards whose Ward Summary totals differ from the rows merged
+
+    :param pdf: PdfPages to add the page to
+    :param df: dataframe from discrepancies
+    :param title: page title
+    :return:
+    """
+    fig = figure.Figure(figsize=page_size)
+    ax = fig.add_axes([0.05, 0.05, 0.9, 0.85])
+    ax.set_title(title)
+    ax.axis('off')
+    columns = ['Summary Indexed', 'Indexed', 'Summary Arbitrated', 'Arbitrated', 'Quarantined']
+    rows = [[short_name(row['Ward'])] + [int(row[column]) for column in columns] for _, row in df.iterrows()]
+    labels = ['Ward'] + [column.replace(' ', '\n') for column in columns]
+    table = ax.table(cellText=rows, colLabels=labels, loc='upper center',
+                     colWidths=[0.3, 0.14, 0.14, 0.14, 0.14, 0.14])
+    table.set_fontsize(10)
+    table.scale(1, 2)
+    pdf.savefig(fig)
+
+
+def cohort_page(pdf, df, title, cohorts=12):
+    """
+    page with the retention of the latest cohorts, the share of each cohort still active n months later
+
+    :param pdf: PdfPages to add the page to
+    :param df: dataframe from cohort_retention
+    :param title: page title
+    :param cohorts: number of cohort months shown
+    :return:
+    """
+    df = df.iloc[-cohorts:, :cohorts + 2]
+    offsets = [column for column in df.columns[1:] if column != 0]
+    color_map = matplotlib.colormaps['Blues']
+    rows = []
+    colors = []
+    for size, values in zip(df['Size'].values, df[offsets].values):
+        rows.append([str(int(size))] + ['' if np.isnan(value) else '{:.0%}'.format(value) for value in values])
+        colors.append(['white'] + ['white' if np.isnan(value) else color_map(0.1 + 0.6 * value) for value in values])
+    fig = figure.Figure(figsize=page_size)
+    ax = fig.add_axes([0.15, 0.05, 0.8, 0.85])
+    ax.set_title(title)
+    ax.axis('off')
+    table = ax.table(cellText=rows, cellColours=colors, rowLabels=[month.strftime('%b %Y') for month in df.index],
+                     colLabels=['Size'] + ['+' + str(offset) for offset in offsets], loc='upper center')
+    table.set_fontsize(9)
+    table.scale(1, 2)
+    pdf.savefig(fig)
+
+
+def participation_page(pdf, my_data, title, months=12):
+    """
+    page with the stake participation by month, each ward's participation in the last month and the
+    longest current streaks
+
+    :param pdf: PdfPages to add the page to
+    :param my_data: IndexerValues with the table loaded
+    :param title: title of the chart
+    :param months: number of months charted
+    :return:
+    """
+    measures = ['Active', 'New', 'Returning', 'Lapsed']
+    by_date = [my_data.participation_by_date(measure)[-months:] for measure in measures]
+    month_names = [month.strftime('%b') for month in by_date[0].index]
+    colors = year_colors(len(measures))
+    fig = figure.Figure(figsize=page_size)
+    ax1 = fig.add_axes([0.12, 0.62, 0.8, 0.3])
+    for color, series in zip(colors, by_date):
+        ax1.plot(np.arange(len(series)), series.values, marker='o', color=color)
+    ax1.set_title(title)
+    ax1.set_xticks([])
+    ax1.table(cellText=[series.values.astype(int).tolist() for series in by_date], rowLabels=measures,
+              colLabels=month_names, rowColours=colors, loc='bottom')
+
+    ax2 = fig.add_axes([0.05, 0.05, 0.5, 0.4])
+    ax2.set_title('Wards ' + my_data.last_month.strftime('%B %Y'))
+    ax2.axis('off')
+    by_ward = [my_data.participation_by_ward(measure).iloc[:, -1] for measure in measures]
+    rows = [[short_name(ward)] + [int(series[ward]) for series in by_ward] for ward in my_data.sorted_wards]
+    table = ax2.table(cellText=rows, colLabels=['Ward'] + measures, loc='upper left',
+                      colWidths=[0.32, 0.17, 0.17, 0.17, 0.17])
+    table.set_fontsize(10)
+
+    ax3 = fig.add_axes([0.6, 0.05, 0.35, 0.4])
+    ax3.set_title('Longest Streaks')
+    ax3.axis('off')
+    streaks = my_data.streak_list(list_size)
+    if len(streaks.index) > 0:
+        rows = [[short_name(name), int(current), int(longest)]
+                for name, current, longest in zip(streaks['Name'], streaks['Current'], streaks['Longest'])]
+        table = ax3.table(cellText=rows, colLabels=['Name', 'Months', 'Best'], loc='upper left',
+                          colWidths=[0.6, 0.2, 0.2])
+        table.set_fontsize(10)
+    pdf.savefig(fig)
+
+
+def render_stake_report(my_data, file_name):
+    """
+    stake report, history, indexers, arbitration, participation and cohort retention pages, plus a data
+    quality page when the ward summary totals of the month disagree with the rows
+
+    :param my_data: IndexerValues with the table loaded
+    :param file_name: pdf to write
+    :return Path: the report
+    """
+    with backend_pdf.PdfPages(str(file_name)) as pdf:
+        history_page(pdf, my_data.year_month_table('Indexed'), my_data.stake_name + ' Indexed')
+        lists_page(pdf, my_data, my_data.current_table, my_data.year_month_table('Active'), 'Indexed',
+                   'Indexers')
+        lists_page(pdf, my_data, my_data.current_table, my_data.year_month_table('Arbitrated'), 'Arbitrated',
+                   'Arbitrated')
+        participation_page(pdf, my_data, 'Indexer Participation')
+        cohort_page(pdf, my_data.cohort_retention(), 'Indexer Retention by First Month')
+        wrong = my_data.discrepancies(my_data.last_month)
+        if len(wrong.index) > 0:
+            quality_page(pdf, wrong, 'Ward Summary Discrepancies ' + my_data.last_month.strftime('%B %Y'))
+    return Path(file_name)
+
+
+def render_ward_report(my_data, ward, file_name):
+    """
+    ward report, history and indexers pages
+
+    :param my_data: IndexerValues with the table loaded
+    :param ward: ward to report on
+    :param file_name: pdf to write
+    :return Path: the report
+    """
+    with backend_pdf.PdfPages(str(file_name)) as pdf:
+        history_page(pdf, my_data.year_month_table('Indexed', ward), ward + ' Indexed')
+        lists_page(pdf, my_data, my_data.ward_slice(ward), my_data.year_month_table('Active', ward), 'Indexed',
+                   'Indexers')
+    return Path(file_name)
+
+
+def report_names(my_data, directory=None, month=None):
+    """
+    file name of every report in a run
+
+    :param my_data: IndexerValues with the table loaded
+    :param directory: report directory, default files.build_path_to_report_directory
+    :param month: month of the reports, default my_data.last_month
+    :return dict: Stake or ward name to Path
+    """
+    directory = Path(directory) if directory is not None else files.build_path_to_report_directory()
+    month = my_data.last_month if month is None else month
+    names = {'Stake': directory.joinpath(files.build_stake_month_name(month))}
+    for ward in my_data.sorted_wards:
+        names[ward] = directory.joinpath(files.build_ward_month_name(ward, month))
+    return names
+
+
+def render_report(my_data, name, file_name):
+    """
+    render one report by name
+
+    :param my_data: IndexerValues with the table loaded
+    :param name: Stake or a ward name
+    :param file_name: pdf to write
+    :return Path: the report
+    """
+    if name == 'Stake':
+        return render_stake_report(my_data, file_name)
+    return render_ward_report(my_data, name, file_name)
+
+
+def render_all(my_data, directory=None):
+    """
+    render the stake report and every ward report
+
+    :param my_data: IndexerValues with the table loaded
+    :param directory: report directory, default files.build_path_to_report_directory
+    :return list: Paths written
+    """
+    return [render_report(my_data, name, file_name)
+            for name, file_name in report_names(my_data, directory).items()]
@@ -0,0 +1,249 @@
+"""
+Publish the table into shared memory for worker processes
+
+The table is encoded once into fixed width numeric columns (month key, ward code, person code and the
+value columns), each held in a multiprocessing shared memory block. Workers get a small picklable
+handle and attach read-only numpy views, so fanning out to many workers copies nothing.
+
+"""
+
+# system imports
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+# package imports
+import numpy as np
+import pandas as pd
+
+# module imports
+import fs_reports.cube as cube
+import fs_reports.history as history
+
+# column name and dtype of each shared block
+shared_columns = [('MonthKey', np.int32),
+                  ('Ward', np.int16),
+                  ('Name', np.int32),
+                  ('Indexed', np.int64),
+                  ('Arbitrated', np.int64),
+                  ('Sequence', np.int64)]
+
+
+def encode_table(df):
+    """
+    turn the table into numeric columns and the dictionaries to decode them
+
+    :param df: table with Year, Month, Ward, Name, Indexed, Arbitrated and Sequence
+    :return tuple: (dict of column arrays, ward names, individual names)
+    """
+    ward_names, ward_codes = np.unique(df['Ward'].values.astype(object), return_inverse=True)
+    names, name_codes = np.unique(df['Name'].values.astype(object), return_inverse=True)
+    columns = {
+        'MonthKey': history.month_key(df['Year'].values, df['Month'].values),
+        'Ward': ward_codes,
+        'Name': name_codes,
+        'Indexed': df['Indexed'].values,
+        'Arbitrated': df['Arbitrated'].values,
+        'Sequence': df['Sequence'].values
+    }
+    arrays = {column: np.ascontiguousarray(columns[column], dtype=dtype) for column, dtype in shared_columns}
+    return arrays, list(ward_names), list(names)
+
+
+def cube_from_columns(columns, ward_names):
+    """
+    ward x month cube from encoded columns without decoding the table
+
+    :param columns: dict of column arrays as built by encode_table
+    :param ward_names: ward names for the ward codes
+    :return WardCube: the cube
+    """
+    keys = columns['MonthKey'].astype(np.int64)
+    rows = len(keys)
+    first_key = int(keys.min()) if rows > 0 else 0
+    month_count = int(keys.max()) - first_key + 1 if rows > 0 else 0
+    cells = columns['Ward'].astype(np.int64) * month_count + keys - first_key
+    size = len(ward_names) * month_count
+    indexed = columns['Indexed']
+    row_values = {'Indexed': indexed,
+                  'Arbitrated': columns['Arbitrated'],
+                  'Count': None,
+                  'Active': indexed > 0}
+    values = {}
+    for measure, weights in row_values.items():
+        counts = np.bincount(cells, weights=weights, minlength=size).astype(np.int64)
+        values[measure] = counts.reshape(len(ward_names), month_count)
+    return cube.WardCube.from_values(ward_names, first_key, values)
+
+
+def decode_table(columns, ward_names, names):
+    """
+    table in the same shape read_table_name builds from the csv, from encoded columns
+
+    Ward and Name come back as object columns like the csv table, every row refers to one string per name
+
+    :param columns: dict of column arrays as built by encode_table
+    :param ward_names: ward names for the ward codes
+    :param names: individual names for the name codes
+    :return dataframe: table with a DatetimeIndex
+    """
+    keys = np.asarray(columns['MonthKey'])
+    dates = pd.to_datetime(pd.DataFrame({'year': keys // 12, 'month': keys % 12 + 1, 'day': 1}))
+    df = pd.DataFrame({
+        'Sequence': columns['Sequence'],
+        'Ward': np.asarray(ward_names, dtype=object)[np.asarray(columns['Ward'])],
+        'Name': np.asarray(names, dtype=object)[np.asarray(columns['Name'])],
+        'Indexed': columns['Indexed'],
+        'Arbitrated': columns['Arbitrated'],
+        'Date': dates.values
+    })
+    df = df.set_index(pd.DatetimeIndex(df.Date))
+    df.index.name = None
+    df['Month'] = df.index.month
+    df['Year'] = df.index.year
+    return df
+
+
+def _attach(name):
+    """
+    attach to an existing block without leaving it to this process's resource tracker
+
+    the publisher owns the block and unlinks it, a tracked block would be removed when the worker exits.
+    Before 3.13 the block is tracked on attach and unregistered straight after
+
+    :param name: shared memory block name
+    :return SharedMemory: attached block
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    block = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+class SharedTable:
+    """ publisher side, owns the shared memory blocks
+
+    use as a context manager or call close when the workers are done
+    """
+
+    def __init__(self, df, stake_name=''):
+        """ encode the table and copy it into shared memory once
+
+        :param df: table to publish
+        :param stake_name: stake the table belongs to
+        """
+        arrays, ward_names, names = encode_table(df)
+        self.blocks = {}
+        self.handle = {'stake_name': stake_name,
+                       'rows': len(df),
+                       'ward_names': ward_names,
+                       'names': names,
+                       'columns': {}}
+        for column, dtype in shared_columns:
+            array = arrays[column]
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=dtype, buffer=block.buf)[:] = array
+            self.blocks[column] = block
+            self.handle['columns'][column] = (block.name, np.dtype(dtype).str)
+
+    def close(self):
+        """
+        release and remove the blocks
+
+        :return:
+        """
+        for block in self.blocks.values():
+            block.close()
+            if sys.version_info < (3, 13):
+                # a worker sharing this process's resource tracker unregistered the name when it attached
+                resource_tracker.register(block._name, 'shared_memory')
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TableView:
+    """ worker side, read-only view of a published table
+
+    """
+
+    def __init__(self, handle):
+        """ attach to the blocks named in the handle
+
+        :param handle: SharedTable.handle from the publisher
+        """
+        self.stake_name = handle['stake_name']
+        self.rows = handle['rows']
+        self.ward_names = handle['ward_names']
+        self.names = handle['names']
+        self.blocks = {}
+        self.columns = {}
+        for column, (name, dtype) in handle['columns'].items():
+            block = _attach(name)
+            array = np.ndarray((self.rows,), dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            self.blocks[column] = block
+            self.columns[column] = array
+
+    def build_cube(self):
+        """
+        ward x month cube straight from the shared columns
+
+        :return WardCube: the cube
+        """
+        return cube_from_columns(self.columns, self.ward_names)
+
+    def table(self):
+        """
+        the table for IndexerValues.open_columns, the rows a report reads are decoded in the worker
+
+        :return dataframe: table with a DatetimeIndex
+        """
+        return decode_table(self.columns, self.ward_names, self.names)
+
+    def frame(self):
+        """
+        decode into a dataframe, this one does copy
+
+        :return dataframe: Year, Month, Ward, Name, Indexed, Arbitrated and Sequence
+        """
+        keys = self.columns['MonthKey']
+        return pd.DataFrame({
+            'Sequence': self.columns['Sequence'],
+            'Ward': np.array(self.ward_names, dtype=object)[self.columns['Ward']],
+            'Name': np.array(self.names, dtype=object)[self.columns['Name']],
+            'Indexed': self.columns['Indexed'],
+            'Arbitrated': self.columns['Arbitrated'],
+            'Year': keys // 12,
+            'Month': keys % 12 + 1
+        })
+
+    def close(self):
+        """
+        detach from the blocks, the publisher removes them
+
+        :return:
+        """
+        self.columns = {}
+        for block in self.blocks.values():
+            block.close()
+        self.blocks = {}
+
+
+def worker_cube(handle):
+    """
+    build the cube in a worker from a published table
+
+    :param handle: SharedTable.handle from the publisher
+    :return WardCube: the cube
+    """
+    view = TableView(handle)
+    try:
+        return view.build_cube()
+    finally:
+        view.close()
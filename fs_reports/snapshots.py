@@ -0,0 +1,226 @@
+"""
+Versioned snapshots of the table, one per merged month
+
+The table only grows by whole months, so it is kept as one segment per month. Segments are csv rows stored
+once under their sha256 and a version is just the list of segment hashes, so a new month adds one segment
+and the versions share every month that did not change. Each segment also records its row count and a
+digest of the row values, which is cheap to take without writing the rows out: a month whose count and
+digest match the previous version keeps that version's hash, any other month (new or edited) is written
+and hashed. Reading a version back gives the table as it was when that month was merged, for reproducing
+old reports.
+
+"""
+
+# system imports
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+# package imports
+from fs_reports.lazy import lazy_import
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# module imports
+import fs_reports.files as files
+
+version_format = '%Y%m'
+
+
+def month_checks(df, columns):
+    """
+    row count and digest of the row values of each month, hashed in place of the csv text
+
+    :param df: the table, indexed by date
+    :param columns: columns kept in the segments
+    :return dict: yyyymm to (rows, digest)
+    """
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=True).values
+    row_months = np.asarray(df.index.year * 100 + df.index.month)
+    # stable, so the rows of a month stay in table order
+    order = np.argsort(row_months, kind='stable')
+    months, starts = np.unique(row_months[order], return_index=True)
+    checks = {}
+    for value, month_hashes in zip(months, np.split(row_hashes[order], starts[1:])):
+        checks[str(value)] = (len(month_hashes), hashlib.sha256(month_hashes.tobytes()).hexdigest())
+    return checks
+
+
+class SnapshotStore:
+    """ segments and versions of the table
+
+    """
+
+    def __init__(self, directory=None, date_format='%Y-%m-%d'):
+        """ open (or create) the store
+
+        :param directory: snapshot directory, default files.build_snapshot_directory
+        :param date_format: date format of the table csv
+        """
+        self.directory = Path(directory) if directory is not None else files.build_snapshot_directory()
+        self.segments = self.directory.joinpath('segments')
+        self.versions_directory = self.directory.joinpath('versions')
+        self.date_format = date_format
+
+    def segment_path(self, digest):
+        """
+        where the rows for a hash are kept
+
+        :param digest: sha256 hex digest
+        :return Path: segment file
+        """
+        return self.segments.joinpath(digest[:2], digest + '.csv')
+
+    def write_segment(self, data):
+        """
+        store csv rows once
+
+        :param data: bytes of csv rows
+        :return string: hex digest
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.segment_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_name = path.with_suffix('.tmp')
+            with open(str(temp_name), 'wb') as fh:
+                fh.write(data)
+            os.replace(str(temp_name), str(path))
+        return digest
+
+    def read_segment(self, digest):
+        """
+        rows stored for a hash
+
+        :param digest: sha256 hex digest
+        :return bytes: csv rows
+        """
+        with open(str(self.segment_path(digest)), 'rb') as fh:
+            return fh.read()
+
+    def version_path(self, month):
+        """
+        manifest of a version
+
+        :param month: month the version was taken for
+        :return Path: manifest file
+        """
+        return self.versions_directory.joinpath(month.strftime(version_format) + '.json')
+
+    def previous_segments(self, month, header):
+        """
+        segments of the last version taken up to month, to reuse for the months that did not change
+
+        :param month: month of the version being taken
+        :param header: csv header of the table being kept
+        :return dict: yyyymm to segment, empty when there is no version or its columns differ
+        """
+        try:
+            manifest = self.manifest(month)
+        except ValueError:
+            return {}
+        if manifest['header'] != header:
+            return {}
+        return {segment['month']: segment for segment in manifest['segments']}
+
+    def snapshot(self, df, columns, month, quality=None):
+        """
+        keep the table as it is now, as the version for month
+
+        a month with the same row count and digest as in the previous version keeps its hash, the rest are hashed
+
+        :param df: the table, indexed by date
+        :param columns: columns written, as write_table_filename writes them
+        :param month: last month in the table
+        :param quality: data quality table or None
+        :return Path: manifest of the version
+        """
+        header = df.iloc[:0].to_csv(columns=columns, date_format=self.date_format)
+        previous = self.previous_segments(month, header)
+        checks = month_checks(df, columns)
+        segments = {}
+        for key, (rows, digest) in checks.items():
+            segment = previous.get(key, {})
+            if segment.get('rows') == rows and segment.get('digest') == digest:
+                segments[key] = segment
+        row_months = np.asarray(df.index.year * 100 + df.index.month)
+        changed = ~np.isin(row_months, [int(key) for key in segments])
+        for value, rows in df[changed].groupby(row_months[changed], sort=True):
+            key = str(value)
+            data = rows.to_csv(columns=columns, header=False, date_format=self.date_format).encode('utf-8')
+            segments[key] = {'month': key, 'hash': self.write_segment(data), 'rows': checks[key][0],
+                             'digest': checks[key][1]}
+        segments = [segments[key] for key in sorted(segments)]
+        manifest = {'month': month.strftime(version_format), 'header': header, 'segments': segments,
+                    'quality': None}
+        if quality is not None:
+            data = quality.to_csv(index=False, date_format=self.date_format).encode('utf-8')
+            manifest['quality'] = self.write_segment(data)
+
+        self.versions_directory.mkdir(parents=True, exist_ok=True)
+        path = self.version_path(month)
+        temp_name = path.with_suffix('.tmp')
+        with open(str(temp_name), 'w') as fh:
+            json.dump(manifest, fh, indent=1)
+        os.replace(str(temp_name), str(path))
+        return path
+
+    def versions(self):
+        """
+        months with a version, oldest first
+
+        :return list: yyyymm strings
+        """
+        if not self.versions_directory.exists():
+            return []
+        return sorted(path.stem for path in self.versions_directory.glob('*.json'))
+
+    def find_version(self, month):
+        """
+        the version for a month, or the last one taken before it
+
+        :param month: month wanted
+        :return string: yyyymm of the version
+        """
+        wanted = month.strftime(version_format)
+        earlier = [version for version in self.versions() if version <= wanted]
+        if len(earlier) == 0:
+            raise ValueError('No table snapshot as of ' + month.strftime('%B %Y'))
+        return earlier[-1]
+
+    def manifest(self, month):
+        """
+        manifest of the version for a month
+
+        :param month: month wanted, the last version before it when there is none for the month
+        :return dict: month, header, segments and quality hash
+        """
+        version = self.find_version(month)
+        with open(str(self.versions_directory.joinpath(version + '.json')), 'r') as fh:
+            return json.load(fh)
+
+    def open_table(self, month):
+        """
+        the table csv of a version
+
+        :param month: month wanted
+        :return StringIO: csv with header, to read like table.csv
+        """
+        manifest = self.manifest(month)
+        parts = [manifest['header'].encode('utf-8')]
+        parts.extend(self.read_segment(segment['hash']) for segment in manifest['segments'])
+        return io.StringIO(b''.join(parts).decode('utf-8'))
+
+    def open_quality(self, month):
+        """
+        the data quality csv of a version
+
+        :param month: month wanted
+        :return StringIO: csv, None when the version has no quality table
+        """
+        digest = self.manifest(month)['quality']
+        if digest is None:
+            return None
+        return io.StringIO(self.read_segment(digest).decode('utf-8'))
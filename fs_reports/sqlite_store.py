@@ -0,0 +1,204 @@
+"""
+SQLite storage backend for the table
+
+Optional backend selected with Backend = sqlite in the ini file. Rows live in one indexed table,
+months are bulk inserted in a single transaction and aggregate queries are pushed down into SQL.
+
+"""
+
+# system imports
+import sqlite3
+
+# package imports
+import pandas as pd
+
+# module imports
+import fs_reports.history as history
+
+schema = [
+    """CREATE TABLE IF NOT EXISTS indexing (
+        month_key INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        sequence INTEGER NOT NULL,
+        ward TEXT NOT NULL,
+        name TEXT NOT NULL,
+        indexed INTEGER NOT NULL,
+        arbitrated INTEGER NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS idx_month_ward ON indexing (month_key, ward)",
+    "CREATE INDEX IF NOT EXISTS idx_name_month ON indexing (name, month_key)"
+]
+
+# table column to SQL expression for grouping and filtering
+group_expressions = {
+    'Ward': 'ward',
+    'Name': 'name',
+    'Date': 'date',
+    'Year': 'month_key / 12',
+    'Month': 'month_key % 12 + 1'
+}
+
+# measure to SQL aggregate
+measure_expressions = {
+    'Indexed': 'SUM(indexed)',
+    'Arbitrated': 'SUM(arbitrated)',
+    'Count': 'COUNT(*)',
+    'Active': 'SUM(indexed > 0)',
+    'Sequence': 'SUM(sequence)'
+}
+
+
+def sql_value(value, date_format):
+    """
+    convert a filter value to what is stored
+
+    :param value: filter value
+    :param date_format: format of the date column
+    :return: value for a query parameter
+    """
+    if hasattr(value, 'strftime'):
+        return value.strftime(date_format)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class SqliteStore:
+    """ table rows in an SQLite database
+
+    """
+
+    def __init__(self, file_name, date_format="%Y-%m-%d"):
+        """ open (or create) the database
+
+        :param file_name: database file name, ':memory:' for a temporary database
+        :param date_format: format of the date column
+        """
+        self.date_format = date_format
+        self.connection = sqlite3.connect(str(file_name))
+        with self.connection:
+            for statement in schema:
+                self.connection.execute(statement)
+
+    def close(self):
+        """
+        close the database
+
+        :return:
+        """
+        self.connection.close()
+
+    def insert_rows(self, df):
+        """
+        bulk insert table rows in a single transaction
+
+        :param df: rows with a Date column or DatetimeIndex, Sequence, Ward, Name, Indexed and Arbitrated
+        :return int: rows inserted
+        """
+        dates = pd.DatetimeIndex(df['Date'] if 'Date' in df.columns else df.index)
+        keys = history.month_key(dates.year.values, dates.month.values)
+        rows = zip(keys.tolist(),
+                   dates.strftime(self.date_format).tolist(),
+                   df['Sequence'].astype('int64').tolist(),
+                   df['Ward'].astype(object).tolist(),
+                   df['Name'].astype(object).tolist(),
+                   df['Indexed'].astype('int64').tolist(),
+                   df['Arbitrated'].astype('int64').tolist())
+        with self.connection:
+            cursor = self.connection.executemany(
+                'INSERT INTO indexing (month_key, date, sequence, ward, name, indexed, arbitrated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return cursor.rowcount
+
+    def row_count(self):
+        """
+        number of rows stored
+
+        :return int: row count
+        """
+        return self.connection.execute('SELECT COUNT(*) FROM indexing').fetchone()[0]
+
+    def has_month(self, month):
+        """
+        check if a month is stored, uses the month index
+
+        :param month: datetime of the month
+        :return boolean: True if any row has the month
+        """
+        row = self.connection.execute('SELECT 1 FROM indexing WHERE month_key = ? LIMIT 1',
+                                      (history.date_key(month),)).fetchone()
+        return row is not None
+
+    def read_table(self):
+        """
+        table in the same shape read_table_name builds from the csv
+
+        :return dataframe: table with a DatetimeIndex
+        """
+        df = pd.read_sql_query('SELECT date AS Date, sequence AS Sequence, ward AS Ward, name AS Name, '
+                               'indexed AS Indexed, arbitrated AS Arbitrated '
+                               'FROM indexing ORDER BY sequence', self.connection)
+        df['Date'] = pd.to_datetime(df['Date'], format=self.date_format)
+        df = df[['Sequence', 'Ward', 'Name', 'Indexed', 'Arbitrated', 'Date']]
+        df = df.set_index(pd.DatetimeIndex(df.Date))
+        df.index.name = None
+        df['Month'] = df.index.month
+        df['Year'] = df.index.year
+        return df
+
+    def build_query(self, group_by, measures, filters, window):
+        """
+        SQL and parameters for an aggregate
+
+        :param group_by: list of columns to group by
+        :param measures: list of measures
+        :param filters: dict of column to value, list of values or (low, high) range
+        :param window: only use the last window months
+        :return tuple: (sql string, parameter list)
+        """
+        keys = [group_expressions[column] + ' AS "' + column + '"' for column in group_by]
+        values = [measure_expressions[measure] + ' AS "' + measure + '"' for measure in measures]
+        sql = 'SELECT ' + ', '.join(keys + values) + ' FROM indexing'
+
+        where = []
+        parameters = []
+        for column, value in filters.items():
+            expression = group_expressions[column]
+            if isinstance(value, tuple):
+                where.append(expression + ' BETWEEN ? AND ?')
+                parameters.extend([sql_value(value[0], self.date_format), sql_value(value[1], self.date_format)])
+            elif isinstance(value, (list, set)) or hasattr(value, 'tolist'):
+                value = list(value)
+                where.append(expression + ' IN (' + ', '.join('?' * len(value)) + ')')
+                parameters.extend(sql_value(item, self.date_format) for item in value)
+            else:
+                where.append(expression + ' = ?')
+                parameters.append(sql_value(value, self.date_format))
+        if window is not None:
+            where.append('month_key > (SELECT MAX(month_key) FROM indexing) - ?')
+            parameters.append(int(window))
+        if len(where) > 0:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if len(group_by) > 0:
+            columns = ', '.join('"' + column + '"' for column in group_by)
+            sql += ' GROUP BY ' + columns + ' ORDER BY ' + columns
+        return sql, parameters
+
+    def aggregate(self, group_by, measures, filters=None, window=None):
+        """
+        sum measures by any grouping inside SQLite
+
+        :param group_by: list of Ward, Date, Year, Month or Name, empty for a single total
+        :param measures: list of Indexed, Arbitrated, Count or Active
+        :param filters: dict of column to value, list of values or (low, high) range
+        :param window: only use the last window months
+        :return dataframe: measures indexed by the group columns
+        """
+        filters = {} if filters is None else filters
+        sql, parameters = self.build_query(group_by, measures, filters, window)
+        df = pd.read_sql_query(sql, self.connection, params=parameters)
+        if len(group_by) == 0:
+            df.index = ['Total']
+            return df.fillna(0).astype('int64')
+        if 'Date' in group_by:
+            df['Date'] = pd.to_datetime(df['Date'], format=self.date_format)
+        return df.set_index(list(group_by))
@@ -0,0 +1,189 @@
+"""
+Hold the tables for many stakes in one process
+
+Each stake keeps its own IndexerValues (partitioned by stake name, one table per stake directory)
+while the engine interns the Ward and Name strings, so a name found in several stakes is held once, and
+keeps a cache of cross stake results. Worker processes get the configuration of the caller.
+
+"""
+
+# system imports
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# package imports
+import pandas as pd
+
+# module imports
+import fs_reports.config as config
+import fs_reports.cube as cube
+import fs_reports.files as files
+import fs_reports.index_data as index_data
+
+
+def build_stake_cube(stake_file):
+    """
+    map step, read one stake table and collapse it to a single stake row
+
+    runs in a worker process so it only gets and returns picklable values
+
+    :param stake_file: tuple of stake name and table file name
+    :return WardCube: one row cube labeled with the stake name
+    """
+    stake_name, file_name = stake_file
+    stake = index_data.IndexerValues(stake_name)
+    stake.read_table_name(file_name)
+    return stake.cube.collapse(stake_name)
+
+
+def region_cube(stake_files, processes=None):
+    """
+    stake x month cube for a region, one worker process per stake table
+
+    :param stake_files: list of (stake name, table file name)
+    :param processes: number of worker processes, None for one per core
+    :return WardCube: rows are stakes, use collapse for the region total
+    """
+    if processes == 1:
+        return cube.merge_cubes([build_stake_cube(stake_file) for stake_file in stake_files])
+    # a started (not forked) worker would otherwise resolve its own root and read another ini
+    with ProcessPoolExecutor(max_workers=processes, initializer=config.set_config,
+                             initargs=(config.get_config(),)) as executor:
+        # cubes are additive so the reduce is a plain sum
+        return cube.merge_cubes(list(executor.map(build_stake_cube, stake_files)))
+
+
+def area_cube(regions, processes=None):
+    """
+    region x month cube for an area
+
+    :param regions: dict of region name to list of (stake name, table file name)
+    :param processes: number of worker processes, None for one per core
+    :return WardCube: rows are regions
+    """
+    return cube.merge_cubes([region_cube(stake_files, processes).collapse(region_name)
+                             for region_name, stake_files in regions.items()])
+
+
+class StakeEngine:
+    """ many stakes, one process
+
+    """
+
+    def __init__(self):
+        """ initialize with no stakes
+
+        """
+        self.stakes = {}
+        # one interned copy of every ward and individual name across all stakes
+        self.strings = {}
+        # cross stake results, cleared when any stake changes
+        self.cache = {}
+
+    def share_strings(self, df):
+        """
+        replace the Ward and Name values with the interned copies, the columns stay object dtype
+
+        :param df: stake table
+        :return dataframe: same table
+        """
+        for column in ['Ward', 'Name']:
+            unique = pd.unique(df[column])
+            for value in unique:
+                self.strings.setdefault(value, value)
+            df[column] = df[column].map({value: self.strings[value] for value in unique})
+        return df
+
+    def discover(self):
+        """
+        stakes with a table in the stakes directory
+
+        :return list: stake names in sorted order
+        """
+        stakes_dir = files.build_stakes_directory()
+        if not stakes_dir.exists():
+            return []
+        return sorted(p.name for p in stakes_dir.iterdir() if p.joinpath('table.csv').exists())
+
+    def add_stake(self, stake_name, file_name=None):
+        """
+        load a stake table into the engine
+
+        :param stake_name: name of the stake
+        :param file_name: table to read, defaults to the stake table in the stakes directory
+        :return IndexerValues: the loaded stake
+        """
+        if file_name is None:
+            file_name = files.build_stake_table_name(stake_name)
+        stake = index_data.IndexerValues(stake_name)
+        stake.read_table_name(file_name)
+        self.share_strings(stake.current_table)
+        self.stakes[stake_name] = stake
+        self.cache = {}
+        return stake
+
+    def load_all(self):
+        """
+        load every stake found in the stakes directory
+
+        :return list: loaded stake names
+        """
+        for stake_name in self.discover():
+            self.add_stake(stake_name)
+        return list(self.stakes)
+
+    def write_all(self):
+        """
+        write every stake table back to its own directory
+
+        :return:
+        """
+        for stake_name, stake in self.stakes.items():
+            fn = Path(files.build_stake_table_name(stake_name))
+            fn.parent.mkdir(parents=True, exist_ok=True)
+            stake.write_table_filename(str(fn))
+
+    def merge_month(self, stake_name):
+        """
+        merge the loaded month for one stake and clear the shared results
+
+        :param stake_name: stake with month_data loaded
+        :return:
+        """
+        stake = self.stakes[stake_name]
+        self.share_strings(stake.month_data)
+        stake.merge_month_to_table()
+        self.cache = {}
+
+    def region_cube(self, processes=None):
+        """
+        stake x month cube for every stake in the stakes directory, built in worker processes
+
+        :param processes: number of worker processes, None for one per core
+        :return WardCube: rows are stakes
+        """
+        return region_cube([(stake_name, files.build_stake_table_name(stake_name))
+                            for stake_name in self.discover()], processes)
+
+    def for_each(self, func):
+        """
+        run a function on every stake, e.g. to build every stake report in one run
+
+        :param func: callable taking an IndexerValues
+        :return dict: stake name to result
+        """
+        return {stake_name: func(stake) for stake_name, stake in self.stakes.items()}
+
+    def stake_totals(self, measure='Indexed'):
+        """
+        monthly totals of every stake side by side (cached)
+
+        :param measure: Indexed, Arbitrated, Count or Active
+        :return dataframe: one row per month, one column per stake
+        """
+        key = ('stake_totals', measure)
+        if key not in self.cache:
+            columns = {stake_name: stake.aggregate(['Date'], [measure])[measure]
+                       for stake_name, stake in self.stakes.items()}
+            self.cache[key] = pd.DataFrame(columns).fillna(0).astype('int64')
+        return self.cache[key]
@@ -0,0 +1,135 @@
+"""
+Unit tests on the content addressed lsr archive
+
+"""
+import unittest
+from pathlib import Path
+import shutil
+import tempfile
+
+import pandas as pd
+
+import fs_reports.archive as archive
+import fs_reports.files as files
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class LsrArchive(unittest.TestCase):
+    """
+    Test deduplication and row diffs of re-downloads
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with an empty archive in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.archive = archive.LsrArchive(Path(self.temp_dir.name).joinpath('archive'))
+        self.downloads = Path(self.temp_dir.name).joinpath('downloads')
+        self.downloads.mkdir()
+        self.lsr = dummy_locations().joinpath('dummy_lsr_201601.csv')
+        self.fixed = dummy_locations().joinpath('dummy_lsr_201601_fixed.csv')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_duplicate(self):
+        """ the same content is stored once and not copied again """
+        destination = self.downloads.joinpath('lsr_201601.csv')
+        self.assertTrue(files.copy_and_rename(self.lsr, destination, True, self.archive))
+        self.assertTrue(self.archive.last['status'] == archive.NEW)
+        self.assertTrue(destination.exists())
+
+        self.assertTrue(files.copy_and_rename(self.lsr, self.downloads.joinpath('lsr_201602.csv'), True,
+                                              self.archive))
+        self.assertTrue(self.archive.last['status'] == archive.DUPLICATE)
+        self.assertTrue(self.archive.last['names'] == ['lsr_201601.csv'])
+        self.assertTrue(len(list(self.archive.directory.glob('*/*.csv'))) == 1)
+        # last month downloaded again is not kept as the next month
+        self.assertFalse(self.downloads.joinpath('lsr_201602.csv').exists())
+        self.assertTrue(self.archive.names() == ['lsr_201601.csv'])
+
+        # a moved duplicate is dropped from the source directory
+        source = Path(self.temp_dir.name).joinpath('LocationStatisticsReport.csv')
+        shutil.copy(str(self.lsr), str(source))
+        self.assertTrue(files.move_and_rename(source, destination, True, self.archive))
+        self.assertFalse(source.exists())
+        self.assertTrue(self.archive.last['status'] == archive.DUPLICATE)
+
+    def test_duplicate_next_month(self):
+        """ a re-download moved under the next month's name is dropped, data/downloads is left alone """
+        files.copy_and_rename(self.lsr, self.downloads.joinpath('lsr_201601.csv'), True, self.archive)
+        source = Path(self.temp_dir.name).joinpath('LocationStatisticsReport.csv')
+        shutil.copy(str(self.lsr), str(source))
+        self.assertTrue(files.move_and_rename(source, self.downloads.joinpath('lsr_201602.csv'), True, self.archive))
+        self.assertTrue(self.archive.last['status'] == archive.DUPLICATE)
+        self.assertFalse(source.exists())
+        self.assertTrue(sorted(path.name for path in self.downloads.iterdir()) == ['lsr_201601.csv'])
+        self.assertTrue(archive.hash_file(self.downloads.joinpath('lsr_201601.csv')) == archive.hash_file(self.lsr))
+        reopened = archive.LsrArchive(self.archive.directory)
+        self.assertTrue(reopened.names() == ['lsr_201601.csv'])
+        self.assertTrue(reopened.index['hashes'][archive.hash_file(self.lsr)] == ['lsr_201601.csv'])
+
+    def test_changed(self):
+        """ a changed re-download is flagged with its row diff """
+        destination = self.downloads.joinpath('lsr_201601.csv')
+        files.copy_and_rename(self.lsr, destination, True, self.archive)
+        files.copy_and_rename(self.fixed, destination, True, self.archive)
+        result = self.archive.last
+        self.assertTrue(result['status'] == archive.CHANGED)
+        self.assertTrue(result['previous'] == archive.hash_file(self.lsr))
+        removed = result['diff'][result['diff'].Change == 'removed']
+        self.assertTrue(sorted(removed.index.get_level_values('Name')) == ['Aloha 1', 'Cooper Mountain', 'Murrayhill '])
+        self.assertTrue(len(result['diff']) == 3)
+        self.assertTrue(archive.hash_file(destination) == archive.hash_file(self.fixed))
+
+    def test_changed_month(self):
+        """ a changed re-download of the merged month is diffed against it, not named for the next month """
+        files.copy_and_rename(self.lsr, self.downloads.joinpath('lsr_201601.csv'), True, self.archive)
+        source = Path(self.temp_dir.name).joinpath('LocationStatisticsReport.csv')
+        shutil.copy(str(self.fixed), str(source))
+        destination = self.downloads.joinpath('lsr_201602.csv')
+        self.assertTrue(files.move_and_rename(source, destination, True, self.archive, 'lsr_201601.csv'))
+        result = self.archive.last
+        self.assertTrue(result['status'] == archive.CHANGED)
+        self.assertTrue(result['name'] == 'lsr_201601.csv')
+        self.assertTrue(len(result['diff']) == 3)
+        self.assertTrue(archive.not_loaded(result, destination.name).startswith('Changed download of lsr_201601'))
+        self.assertFalse(destination.exists())
+        self.assertFalse(source.exists())
+        self.assertTrue(self.archive.names() == ['lsr_201601.csv'])
+
+    def test_next_month(self):
+        """ a download with new counts is the next month """
+        files.copy_and_rename(self.lsr, self.downloads.joinpath('lsr_201601.csv'), True, self.archive)
+        source = Path(self.temp_dir.name).joinpath('LocationStatisticsReport.csv')
+        df = pd.read_csv(str(self.lsr))
+        df['Indexed'] = df['Indexed'] + 1
+        df.to_csv(str(source), index=False)
+        destination = self.downloads.joinpath('lsr_201602.csv')
+        self.assertTrue(files.move_and_rename(source, destination, True, self.archive, 'lsr_201601.csv'))
+        self.assertTrue(self.archive.last['status'] == archive.NEW)
+        self.assertTrue(archive.not_loaded(self.archive.last, destination.name) is None)
+        self.assertTrue(destination.exists())
+
+    def test_index(self):
+        """ the index survives reopening """
+        files.copy_and_rename(self.lsr, self.downloads.joinpath('lsr_201601.csv'), True, self.archive)
+        reopened = archive.LsrArchive(self.archive.directory)
+        self.assertTrue(reopened.names() == ['lsr_201601.csv'])
+        restored = reopened.restore('lsr_201601.csv', Path(self.temp_dir.name).joinpath('restored.csv'))
+        self.assertTrue(archive.hash_file(restored) == archive.hash_file(self.lsr))
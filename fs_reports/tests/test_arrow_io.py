@@ -0,0 +1,122 @@
+"""
+Unit tests on the Arrow IPC export and import
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import socket
+import tempfile
+import threading
+
+import numpy as np
+
+import fs_reports.index_data as iv
+import fs_reports.arrow_io as arrow_io
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class ArrowIO(unittest.TestCase):
+    """
+    Test the Arrow files and streams round trip against the csv
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with an Arrow export in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.paths = self.my_data.write_arrow_directory(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def check_table(self, from_arrow):
+        """ same table and aggregates as the csv """
+        table = from_arrow.current_table
+        self.assertTrue(len(table) == 1327)
+        self.assertTrue(from_arrow.last_month == datetime.datetime(2015, 12, 1))
+        self.assertTrue(list(from_arrow.sorted_wards) == list(self.my_data.sorted_wards))
+        self.assertTrue(list(table.Name[:5]) == list(self.my_data.current_table.Name[:5]))
+        for measure in from_arrow.cube.measures:
+            self.assertTrue(np.array_equal(from_arrow.cube.values(measure), self.my_data.cube.values(measure)))
+        self.assertTrue(from_arrow.trailing_totals(1)['Hazeldale'] == 3113)
+
+    def test_files(self):
+        """ one IPC file per dataset, ward and name dictionary encoded """
+        self.assertTrue(sorted(path.name for path in self.paths) == ['cube.arrow', 'leaders.arrow', 'table.arrow'])
+        table = arrow_io.read_file(Path(self.temp_dir.name).joinpath('table.arrow'))
+        self.assertTrue(table.num_rows == 1327)
+        self.assertTrue(pyarrow.types.is_dictionary(table.schema.field('Ward').type))
+
+    def test_read(self):
+        """ reading the Arrow file gives the same table and aggregates as the csv """
+        from_arrow = iv.IndexerValues()
+        from_arrow.read_table_arrow(Path(self.temp_dir.name).joinpath('table.arrow'))
+        self.check_table(from_arrow)
+
+    def test_cube(self):
+        """ cube survives the long form """
+        ward_cube = arrow_io.arrow_to_cube(arrow_io.read_file(Path(self.temp_dir.name).joinpath('cube.arrow')))
+        self.assertTrue(list(ward_cube.ward_names) == list(self.my_data.cube.ward_names))
+        self.assertTrue(ward_cube.first_key == self.my_data.cube.first_key)
+        for measure in ward_cube.measures:
+            self.assertTrue(np.array_equal(ward_cube.values(measure), self.my_data.cube.values(measure)))
+
+    def test_leaders(self):
+        """ leaderboards match individual_list """
+        leaders = arrow_io.read_file(Path(self.temp_dir.name).joinpath('leaders.arrow')).to_pandas()
+        one_month = leaders[(leaders.Column == 'Indexed') & (leaders.Months == 1)]
+        expected = self.my_data.individual_list(self.my_data.current_table, 1, 20, 'Indexed')
+        self.assertTrue(list(one_month.Name) == list(expected.Name))
+        self.assertTrue(list(one_month.Value) == list(expected.Indexed))
+
+    def test_stream(self):
+        """ stream every dataset over a socket """
+        sender, receiver = socket.socketpair()
+        tables = arrow_io.export_tables(self.my_data)
+
+        def send():
+            with sender.makefile('wb') as sink:
+                arrow_io.send_tables(sink, tables)
+            sender.close()
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        with receiver.makefile('rb') as source:
+            received = arrow_io.receive_tables(source)
+        thread.join()
+        receiver.close()
+
+        self.assertTrue(sorted(received) == ['cube', 'leaders', 'table'])
+        self.assertTrue(received['cube'].equals(tables['cube']))
+        from_stream = iv.IndexerValues()
+        from_stream.current_table = arrow_io.arrow_to_table(received['table'])
+        from_stream.calculate_ward_data()
+        from_stream.build_person_history()
+        from_stream.build_cube()
+        self.check_table(from_stream)
@@ -0,0 +1,76 @@
+"""
+Unit tests on the report zip bundle
+
+"""
+import unittest
+from pathlib import Path
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import fs_reports.bundle as bundle
+
+
+class ReportBundle(unittest.TestCase):
+    """
+    Test streaming reports into zip parts
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with fake reports in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = Path(self.temp_dir.name).joinpath('current')
+        self.source.mkdir()
+        self.reports = []
+        for name in ['Stake', 'Aloha I', 'Hazeldale', 'Sunset']:
+            path = self.source.joinpath(name + '_201512.pdf')
+            with open(str(path), 'wb') as fh:
+                # random bytes do not compress, like the images in a pdf
+                fh.write(os.urandom(40 * 1024))
+            self.reports.append(path)
+        self.destination = Path(self.temp_dir.name).joinpath('bundle')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_single_part(self):
+        """ every report in one zip with its manifest """
+        report_bundle = bundle.bundle_reports(self.reports, self.destination, 'Reports_201512')
+        self.assertTrue(report_bundle.parts == [self.destination.joinpath('Reports_201512_part1.zip')])
+        with zipfile.ZipFile(str(report_bundle.parts[0])) as zf:
+            self.assertTrue(zf.testzip() is None)
+            names = zf.namelist()
+            self.assertTrue(sorted(names) == sorted([path.name for path in self.reports] + [bundle.manifest_name]))
+            entries = json.loads(zf.read(bundle.manifest_name))
+            for entry in entries:
+                self.assertTrue(hashlib.sha256(zf.read(entry['name'])).hexdigest() == entry['sha256'])
+        with open(str(self.destination.joinpath('Reports_201512_manifest.json'))) as fh:
+            manifest = json.load(fh)
+        self.assertTrue(manifest['parts'] == ['Reports_201512_part1.zip'])
+        self.assertTrue(len(manifest['files']) == 4)
+
+    def test_split(self):
+        """ a new part starts before the size limit, a report larger than the limit gets its own part """
+        with bundle.ReportBundle(self.destination, 'Reports_201512', max_bytes=100 * 1024) as report_bundle:
+            for path in self.reports:
+                report_bundle.add(path)
+        self.assertTrue(len(report_bundle.parts) == 2)
+        self.assertTrue([entry['part'] for entry in report_bundle.entries] == [1, 1, 2, 2])
+        for part in report_bundle.parts:
+            self.assertTrue(part.stat().st_size <= 100 * 1024 + 2048)
+            with zipfile.ZipFile(str(part)) as zf:
+                self.assertTrue(len(json.loads(zf.read(bundle.manifest_name))) == 2)
+
+        with bundle.ReportBundle(self.destination, 'Small', max_bytes=10 * 1024) as report_bundle:
+            for path in self.reports[:2]:
+                report_bundle.add(path)
+        self.assertTrue(len(report_bundle.parts) == 2)
@@ -0,0 +1,99 @@
+"""
+Unit tests on the chunked processing
+
+"""
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import fs_reports.index_data as iv
+import fs_reports.chunked as chunked
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class TopK(unittest.TestCase):
+    """
+    Test the mergeable top K
+
+    """
+
+    def test_merge(self):
+        """ merging partitions gives the overall top K """
+        first = chunked.TopK(3).add(np.array(['a', 'b', 'c', 'd']), np.array([5, 1, 9, 3]))
+        second = chunked.TopK(3).add(np.array(['e', 'f']), np.array([7, 2]))
+        first.merge(second)
+        self.assertTrue(first.items() == [('c', 9), ('e', 7), ('a', 5)])
+
+
+class Chunked(unittest.TestCase):
+    """
+    Test the chunked aggregates against the in memory table
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the chunked tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.fn = dummy_locations().joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(self.fn)
+        # small chunks so months are split across chunks
+        self.aggregator = chunked.aggregate_file(self.fn, chunksize=97, top=5)
+
+    def test_cube(self):
+        """ same cube as the full table """
+        self.assertTrue(self.aggregator.rows == 1327)
+        full = self.my_data.cube
+        order = [self.aggregator.cube.ward_index[ward] for ward in full.ward_names]
+        for measure in full.measures:
+            self.assertTrue(np.array_equal(full.values(measure), self.aggregator.cube.values(measure)[order]))
+
+    def test_leaders(self):
+        """ leaderboards match the individual lists """
+        expected = self.my_data.individual_list(self.my_data.current_table, 36, 500, 'Indexed')[:5]
+        self.assertTrue(list(self.aggregator.leaders().Name) == list(expected.Name))
+
+        expected = self.my_data.individual_list(self.my_data.current_table, 1, 500, 'Indexed')[:5]
+        leaders = self.aggregator.month_leaders(self.my_data.last_month)
+        self.assertTrue(list(leaders.Name) == list(expected.Name))
+        self.assertTrue(leaders.Indexed.iloc[0] == expected.Indexed.iloc[0])
+
+    def test_participation(self):
+        """ new indexers and streaks match the person history """
+        new = self.aggregator.new_by_ward().reindex(self.my_data.sorted_wards)
+        self.assertTrue(np.array_equal(new.values, self.my_data.participation_by_ward('New').values))
+
+        streaks = self.aggregator.streaks()
+        streaks = streaks[streaks.Current > 0]
+        expected = self.my_data.streak_list(1000)
+        self.assertTrue(list(streaks.Name) == list(expected.Name))
+        self.assertTrue(list(streaks.Longest) == list(expected.Longest))
+
+    def test_two_wards(self):
+        """ a person with rows in two wards in one month is one new indexer """
+        chunk = pd.DataFrame({'Year': [2015, 2015, 2015], 'Month': [6, 6, 6],
+                              'Ward': ['Ward A', 'Ward B', 'Ward B'],
+                              'Name': ['Smith, John', 'Smith, John', 'Jones, Mary'],
+                              'Indexed': [10, 5, 7], 'Arbitrated': [0, 0, 0]})
+        aggregator = chunked.ChunkedAggregator().add_chunk(chunk)
+        new = aggregator.new_by_ward()
+        self.assertTrue(new.values.sum() == 2)
+        self.assertTrue(list(new.iloc[:, 0]) == [0, 2])
+        streaks = aggregator.streaks().set_index('Name')
+        self.assertTrue(streaks.loc['Smith, John', 'Current'] == 1)
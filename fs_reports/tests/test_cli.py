@@ -0,0 +1,148 @@
+"""
+Unit tests on the command line entry point
+
+"""
+import unittest
+from pathlib import Path
+import contextlib
+import datetime
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+import fs_reports.cli as cli
+import fs_reports.config as config
+import fs_reports.pipeline as pipeline
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+def stub_render(name, file_name):
+    """ write a stand-in report at once """
+    with open(file_name, 'wb') as fh:
+        fh.write(b'%PDF-')
+    return file_name
+
+
+def stake_root(temp_dir, stake_tables):
+    """
+    project root with the test ini and one table per stake
+
+    :param temp_dir: directory to fill
+    :param stake_tables: stake name to dummy table file name
+    :return Path: the root
+    """
+    root = Path(temp_dir)
+    root.joinpath('data').mkdir()
+    shutil.copy(str(Path.cwd().joinpath('tests', 'test.ini')), str(root.joinpath('data', 'saved.ini')))
+    for stake_name, table_name in stake_tables.items():
+        stake_dir = root.joinpath('data', 'stakes', stake_name)
+        stake_dir.mkdir(parents=True)
+        shutil.copy(str(dummy_locations().joinpath(table_name)), str(stake_dir.joinpath('table.csv')))
+    return root
+
+
+class CommandLine(unittest.TestCase):
+    """
+    Test argument parsing and the read only commands
+
+    """
+
+    def test_parser(self):
+        """ subcommands and flags """
+        args = cli.build_parser().parse_args(['run', '--processes', '2', '--host', 'localhost'])
+        self.assertTrue(args.func is cli.command_run)
+        self.assertTrue(args.processes == 2)
+        self.assertTrue(args.port == 25)
+        args = cli.build_parser().parse_args(['--stake', 'Zion Stake', 'ingest', '--watch'])
+        self.assertTrue(args.stake == 'Zion Stake')
+        self.assertTrue(args.watch)
+        self.assertTrue(args.as_of is None)
+        args = cli.build_parser().parse_args(['--as-of', '201512', 'render'])
+        self.assertTrue(args.as_of == datetime.datetime(2015, 12, 1))
+
+    def test_lsr_month(self):
+        """ month from the renamed file """
+        self.assertTrue(cli.lsr_month(Path('lsr_201601.csv')) == datetime.datetime(2016, 1, 1))
+        self.assertTrue(cli.lsr_month(Path('LocationStatisticsReport.csv')) is None)
+
+    def test_timings(self):
+        """ summary lists each step and the total """
+        timings = cli.Timings()
+        self.assertTrue(timings.time('step', lambda x: x + 1, 1) == 2)
+        timings.add('other', 1.5)
+        lines = timings.summary().splitlines()
+        self.assertTrue([line.split()[0] for line in lines] == ['step', 'other', 'total'])
+
+    def test_bench(self):
+        """ bench runs on the table in the data directory """
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as temp_dir, contextlib.redirect_stdout(output):
+            code = cli.main(['bench', '--repeat', '1', '--bench-directory', temp_dir])
+        self.assertTrue(code == 0)
+        self.assertTrue('render ward' in output.getvalue())
+
+    def test_bench_temporary(self):
+        """ without --bench-directory the benchmark report does not stay behind """
+        output = io.StringIO()
+        before = set(Path.cwd().iterdir())
+        with contextlib.redirect_stdout(output):
+            code = cli.main(['bench', '--repeat', '1'])
+        self.assertTrue(code == 0)
+        self.assertTrue(set(Path.cwd().iterdir()) == before)
+
+    def test_stake(self):
+        """ --stake reads and writes the stake's own table and leaves the ini alone """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = stake_root(temp_dir, {'Zion Stake': 'dummy_table_201601.csv'})
+            stake_dir = root.joinpath('data', 'stakes', 'Zion Stake')
+            shutil.copy(str(dummy_locations().joinpath('dummy_table_201512.csv')),
+                        str(root.joinpath('data', 'table.csv')))
+            ini = root.joinpath('data', 'saved.ini').read_bytes()
+            output = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(output):
+                    code = cli.main(['--root', temp_dir, '--stake', 'Zion Stake', '--quiet', 'status'])
+                self.assertTrue(code == 0)
+                self.assertTrue(output.getvalue().strip() == 'Zion Stake: January 2016')
+
+                args = cli.build_parser().parse_args(['--stake', 'Zion Stake', 'render'])
+                my_data = cli.load_data(args, cli.Timings())
+                self.assertTrue(my_data.stake_name == 'Zion Stake')
+                self.assertTrue(my_data.last_month == datetime.datetime(2016, 1, 1))
+                cli.save(my_data, cli.Timings())
+                self.assertTrue(root.joinpath('data', 'saved.ini').read_bytes() == ini)
+                self.assertTrue(stake_dir.joinpath('snapshots').exists())
+                self.assertFalse(root.joinpath('data', 'snapshots').exists())
+            finally:
+                config.set_config()
+
+    def test_all_stakes(self):
+        """ one run renders every stake into its own report directory """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = stake_root(temp_dir, {'Kolob Stake': 'dummy_table_201512.csv',
+                                         'Zion Stake': 'dummy_table_201601.csv'})
+            output = io.StringIO()
+            try:
+                with mock.patch.object(pipeline, 'render_in_worker', stub_render), \
+                        contextlib.redirect_stdout(output):
+                    code = cli.main(['--root', temp_dir, '--quiet', 'render', '--all-stakes', '--processes', '1'])
+            finally:
+                config.set_config()
+            self.assertTrue(code == 0)
+            self.assertTrue('2 stakes' in output.getvalue())
+            kolob = root.joinpath('reports', 'stakes', 'Kolob Stake', 'current')
+            zion = root.joinpath('reports', 'stakes', 'Zion Stake', 'current')
+            self.assertTrue(kolob.joinpath('Stake_201512.pdf').exists())
+            self.assertTrue(zion.joinpath('Stake_201601.pdf').exists())
+            self.assertTrue(len(list(kolob.glob('*.pdf'))) > 1)
+            self.assertFalse(root.joinpath('reports', 'current').exists())
@@ -0,0 +1,120 @@
+"""
+Unit tests on the memory mapped column store
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import fs_reports.config as config
+import fs_reports.files as files
+import fs_reports.index_data as iv
+import fs_reports.columnstore as columnstore
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class ColumnStore(unittest.TestCase):
+    """
+    Test writing and mapping the column files
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with a column store in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store_dir = Path(self.temp_dir.name).joinpath('columns')
+        self.my_data.write_columns_directory(self.store_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_files(self):
+        """ one mapped file per column """
+        self.assertTrue(columnstore.is_column_store(self.store_dir))
+        self.assertFalse(columnstore.is_column_store(self.temp_dir.name))
+        store = columnstore.ColumnStore(self.store_dir)
+        self.assertTrue(store.rows == 1327)
+        self.assertTrue(isinstance(store.columns['Indexed'], np.memmap))
+        self.assertTrue(store.columns['Ward'].dtype == np.int16)
+
+    def test_read(self):
+        """ reading the store gives the same table and aggregates as the csv """
+        from_store = iv.IndexerValues()
+        from_store.read_table_name(self.store_dir)
+        self.assertTrue(from_store.last_month == datetime.datetime(2015, 12, 1))
+        self.assertTrue(from_store.first_month == self.my_data.first_month)
+        self.assertTrue(from_store.list_of_months == self.my_data.list_of_months)
+        self.assertTrue(from_store.year_count == self.my_data.year_count)
+        self.assertTrue(len(from_store.ward_list) == len(self.my_data.ward_list))
+        self.assertTrue(list(from_store.sorted_wards) == list(self.my_data.sorted_wards))
+        # cube queries run without decoding the table
+        self.assertTrue(from_store.trailing_totals(1)['Hazeldale'] == 3113)
+        comparison = from_store.year_over_year('Indexed')
+        expected = self.my_data.year_over_year('Indexed')
+        for key in expected:
+            np.testing.assert_array_equal(comparison[key], expected[key])
+        self.assertTrue(from_store._current_table is None and from_store._people is None)
+
+        table = from_store.current_table
+        self.assertTrue(len(table) == 1327)
+        self.assertTrue(table.Name.dtype == object and table.Ward.dtype == object)
+        self.assertTrue(list(table.Name[:5]) == list(self.my_data.current_table.Name[:5]))
+        expected = self.my_data.individual_list(self.my_data.current_table, 6, 20, 'Indexed')
+        self.assertTrue(from_store.individual_list(table, 6, 20, 'Indexed').equals(expected))
+        for measure in from_store.cube.measures:
+            self.assertTrue(np.array_equal(from_store.cube.values(measure), self.my_data.cube.values(measure)))
+        self.assertTrue(from_store.trailing_totals(1)['Hazeldale'] == 3113)
+        self.assertTrue(from_store.people.values['Indexed'].sum() == table.Indexed.sum())
+
+    def test_stale(self):
+        """ read_table skips a store older than table.csv, write_table refreshes the store """
+        root = Path(self.temp_dir.name).resolve()
+        root.joinpath('data').mkdir()
+        shutil.copy('tests/test.ini', str(root.joinpath('data/saved.ini')))
+        try:
+            config.set_config(root=root)
+            self.my_data.write_table_filename(files.build_table_name())
+            self.my_data.write_columns()
+            # the csv advanced to 201601 without the store, as an older release would have left it
+            self.my_data.load_this_month_file(dummy_locations().joinpath('dummy_lsr_201601_fixed.csv'),
+                                              datetime.datetime(2016, 1, 1))
+            self.my_data.merge_month_to_table()
+            self.my_data.write_table_filename(files.build_table_name())
+            manifest = files.build_columns_directory().joinpath(columnstore.manifest_name)
+            os.utime(str(manifest), (0, 0))
+            self.assertFalse(columnstore.is_current(files.build_columns_directory(), files.build_table_name()))
+            reader = iv.IndexerValues()
+            reader.read_table()
+            self.assertTrue(reader.last_month == datetime.datetime(2016, 1, 1))
+            self.assertTrue(len(reader.current_table) == len(self.my_data.current_table))
+
+            self.my_data.write_table()
+            self.assertTrue(columnstore.is_current(files.build_columns_directory(), files.build_table_name()))
+            self.assertTrue(columnstore.ColumnStore(files.build_columns_directory()).rows ==
+                            len(self.my_data.current_table))
+        finally:
+            config.set_config()
@@ -0,0 +1,80 @@
+"""
+Unit tests on the cached configuration
+
+"""
+import unittest
+from pathlib import Path
+import os
+import shutil
+import tempfile
+
+import fs_reports.config as config
+import fs_reports.files as files
+import fs_reports.index_data as iv
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class Config(unittest.TestCase):
+    """
+    Test path resolution, the override and the single ini read
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with a project root in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name).resolve()
+        self.root.joinpath('data').mkdir()
+        shutil.copy('tests/test.ini', str(self.root.joinpath('data/saved.ini')))
+
+    def tearDown(self):
+        config.set_config()
+        self.temp_dir.cleanup()
+
+    def test_default(self):
+        """ default root is the parent of the working directory """
+        self.assertTrue(config.get_config() is config.get_config())
+        self.assertTrue(config.get_config().data_root == Path.cwd().parent.resolve().joinpath('data'))
+
+    def test_override(self):
+        """ files and IndexerValues follow the override """
+        config.set_config(root=self.root, downloads_dir=self.root.joinpath('Downloads'))
+        self.assertTrue(files.build_data_directory() == self.root.joinpath('data'))
+        self.assertTrue(files.build_path_to_report_directory() == self.root.joinpath('reports/current'))
+        self.assertTrue(files.locate_downloaded_lsr().parent == self.root.joinpath('Downloads'))
+        self.assertTrue(iv.IndexerValues().stake_name == 'Kolob Stake')
+
+    def test_environment(self):
+        """ FS_REPORTS_ROOT sets the root """
+        os.environ[config.root_variable] = str(self.root)
+        try:
+            self.assertTrue(config.Config().root == self.root)
+        finally:
+            del os.environ[config.root_variable]
+
+    def test_read_once(self):
+        """ the ini is parsed once for any number of instances, writing it re-reads """
+        config.set_config(root=self.root)
+        parser = config.get_config().ini()
+        stakes = [iv.IndexerValues('Stake ' + str(idx)) for idx in range(3)]
+        self.assertTrue(config.get_config().ini() is parser)
+        self.assertTrue([stake.stake_name for stake in stakes] == ['Stake 0', 'Stake 1', 'Stake 2'])
+
+        stakes[0].write_ini()
+        self.assertTrue(config.get_config().ini() is not parser)
+        self.assertTrue(config.get_config().stake_name() == 'Stake 0')
@@ -0,0 +1,143 @@
+"""
+Unit tests on the ward x month cube
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+
+import numpy as np
+
+import fs_reports.index_data as iv
+import fs_reports.cube as cube
+import fs_reports.history as history
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class WardCube(unittest.TestCase):
+    """
+    Test the cube and the rolling windows
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the cube tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def test_build(self):
+        """ cube rows match the ward count arrays """
+        ward_cube = self.my_data.cube
+        hazeldale = ward_cube.values('Indexed')[ward_cube.ward_index['Hazeldale']]
+        self.assertTrue(list(hazeldale[:3]) == [10593, 9192, 1641])
+        self.assertTrue(ward_cube.values('Count').sum() == 1327)
+
+    def test_windows(self):
+        """ trailing windows """
+        ward_cube = self.my_data.cube
+        hazeldale = ward_cube.ward_index['Hazeldale']
+        sums = ward_cube.window_sum('Indexed', 3)
+        self.assertTrue(sums[hazeldale, 0] == 10593)
+        self.assertTrue(sums[hazeldale, 2] == 10593 + 9192 + 1641)
+        self.assertTrue(sums[hazeldale, 3] == 9192 + 1641 + 5635)
+        self.assertTrue(ward_cube.window_mean('Indexed', 2)[hazeldale, 1] == (10593 + 9192) / 2)
+
+        trailing = self.my_data.trailing_totals(1)
+        self.assertTrue(trailing['Hazeldale'] == 3113)
+        self.assertTrue(trailing['Murrayhill'] == 8447)
+        self.assertTrue(self.my_data.trailing_totals(36).sum() == self.my_data.current_table.Indexed.sum())
+
+        rolling = self.my_data.rolling_by_ward(12, 'Active', 'mean')
+        self.assertTrue(rolling.shape == (8, 36))
+
+    def test_append(self):
+        """ merging a month gives the same cube as a rebuild """
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_lsr_201601_fixed.csv')
+        self.my_data.load_this_month_file(fn, datetime.datetime(2016, 1, 1))
+        self.my_data.merge_month_to_table()
+
+        ward_cube = self.my_data.cube
+        rebuilt = cube.WardCube().build(self.my_data.current_table, self.my_data.first_month,
+                                        len(self.my_data.list_of_months))
+        order = [rebuilt.ward_index[ward] for ward in ward_cube.ward_names]
+        for measure in ward_cube.measures:
+            self.assertTrue(np.array_equal(ward_cube.values(measure), rebuilt.values(measure)[order]))
+            self.assertTrue(np.array_equal(ward_cube.prefix(measure), rebuilt.prefix(measure)[order]))
+
+    def test_skipped_month(self):
+        """ a gap in the months is filled with zero totals """
+        import pandas as pd
+        ward_cube = cube.WardCube()
+        month = pd.DataFrame({'Ward': ['A', 'B'], 'Indexed': [5, 7], 'Arbitrated': [0, 1]})
+        ward_cube.append_month(month, datetime.datetime(2016, 1, 1))
+        ward_cube.append_month(month, datetime.datetime(2016, 3, 1))
+        self.assertTrue(ward_cube.month_count == 3)
+        self.assertTrue(list(ward_cube.values('Indexed')[0]) == [5, 0, 5])
+        self.assertTrue(list(ward_cube.trailing('Indexed', 2)) == [5, 7])
+        self.assertTrue(list(ward_cube.trailing('Indexed', 3, 'mean')) == [10 / 3, 14 / 3])
+
+
+class YearOverYear(unittest.TestCase):
+    """
+    Test the year to date and year over year arrays
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the year tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def test_year_grid(self):
+        """ months outside the data are NaN """
+        first_year, grid = cube.year_grid(np.array([[1, 2, 3]]), history.month_key(2015, 11))
+        self.assertTrue(first_year == 2015)
+        self.assertTrue(grid.shape == (1, 2, 12))
+        self.assertTrue(grid[0, 0, 10] == 1 and grid[0, 1, 0] == 3)
+        self.assertTrue(np.isnan(grid[0, 1, 1]))
+
+    def test_stake(self):
+        """ stake year totals """
+        ytd = self.my_data.year_month_table(value='ytd')
+        self.assertTrue(list(ytd.index) == [2013, 2014, 2015])
+        self.assertTrue(list(ytd[12]) == [247585, 228676, 272745])
+
+        monthly = self.my_data.year_month_table()
+        self.assertTrue(monthly.loc[2015, 12] == 15628)
+        yoy = self.my_data.year_month_table(value='yoy')
+        self.assertTrue(np.isnan(yoy.loc[2013, 1]))
+        self.assertTrue(yoy.loc[2015, 12] == monthly.loc[2015, 12] - monthly.loc[2014, 12])
+
+    def test_wards(self):
+        """ every ward in the same call """
+        comparison = self.my_data.year_over_year()
+        self.assertTrue(comparison['labels'][1] == 'Hazeldale')
+        self.assertTrue(comparison['monthly'].shape == (9, 3, 12))
+        self.assertTrue(np.array_equal(comparison['monthly'][1:].sum(axis=0), comparison['monthly'][0]))
+        self.assertTrue(self.my_data.year_month_table('Indexed', 'Hazeldale').loc[2015, 12] == 3113)
@@ -158,3 +158,12 @@ class DownloadFiles(TestCase):
         # destination = destination.joinpath(files.build_lsr_name(gc.current_month))
         # self.assertTrue(destination.exists())
         pass
+
+    def test_last_table_month(self):
+        """
+        month of the last table row without reading the table
+
+        :return:
+        """
+        fn = dummy_locations().joinpath('dummy_table_201512.csv')
+        self.assertTrue(files.last_table_month(fn) == datetime.datetime(2015, 12, 1))
@@ -0,0 +1,79 @@
+"""
+Unit tests on the person history
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+
+import fs_reports.index_data as iv
+import fs_reports.history as history
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class PersonHistory(unittest.TestCase):
+    """
+    Test the person x month matrix
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the history tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def test_month_key(self):
+        """ consecutive months have consecutive keys """
+        self.assertTrue(history.month_key(2015, 12) + 1 == history.month_key(2016, 1))
+        self.assertTrue(history.date_key(datetime.datetime(2016, 1, 1)) == history.month_key(2016, 1))
+
+    def test_build(self):
+        """ matrix matches the table """
+        people = self.my_data.people
+        self.assertTrue(people.values['Indexed'].shape == (277, 36))
+        self.assertTrue(people.values['Indexed'].sum() == self.my_data.current_table.Indexed.sum())
+        self.assertTrue(people.values['Arbitrated'].sum() == self.my_data.current_table.Arbitrated.sum())
+
+    def test_individual_history(self):
+        """ history for one person """
+        name = 'Shirley Gebbie'
+        values = self.my_data.individual_history(name)
+        table = self.my_data.current_table
+        self.assertTrue(len(values) == 36)
+        self.assertTrue(values.sum() == table[table.Name == name].Indexed.sum())
+        self.assertTrue(self.my_data.individual_history('Nobody Here') is None)
+
+    def test_consistent(self):
+        """ people indexing every month of the year """
+        names = self.my_data.consistent_individuals(2015)
+        self.assertTrue(len(names) == 7)
+        self.assertTrue('Edda Junod' in names)
+
+    def test_merge(self):
+        """ merging a month adds a column and new people """
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_lsr_201601_fixed.csv')
+        self.my_data.load_this_month_file(fn, datetime.datetime(2016, 1, 1))
+        self.my_data.merge_month_to_table()
+
+        people = self.my_data.people
+        self.assertTrue(people.values['Indexed'].shape == (281, 37))
+        self.assertTrue(people.values['Indexed'].sum() == self.my_data.current_table.Indexed.sum())
+        self.assertTrue(len(self.my_data.individual_history('Shirley Gebbie')) == 37)
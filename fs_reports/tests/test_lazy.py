@@ -0,0 +1,45 @@
+"""
+Unit tests on the lazy imports
+
+"""
+import unittest
+import subprocess
+import sys
+
+from fs_reports.lazy import lazy_import, is_loaded
+
+
+class LazyImport(unittest.TestCase):
+    """
+    Test that heavy packages wait until they are used
+
+    """
+
+    def test_lazy_module(self):
+        """ the module is imported on first use """
+        if is_loaded('colorsys'):
+            self.skipTest('colorsys already imported')
+        colorsys = lazy_import('colorsys')
+        self.assertFalse(is_loaded('colorsys'))
+        self.assertTrue(colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0))
+        self.assertTrue(is_loaded('colorsys'))
+
+    def test_loaded_module(self):
+        """ an imported module is returned as is """
+        self.assertTrue(lazy_import('sys') is sys)
+
+    def test_light_core(self):
+        """ the core modules import without pandas, numpy, dateutil or matplotlib """
+        code = ('import sys, fs_reports.cli, fs_reports.index_data, fs_reports.reports; '
+                'print(sorted(m for m in ("pandas", "numpy", "dateutil", "matplotlib") if m in sys.modules))')
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        self.assertTrue(output.strip() == '[]')
+
+    def test_light_values(self):
+        """ an IndexerValues without a table read, and the month check, do not import pandas or numpy """
+        code = ('import sys, fs_reports.files as files, fs_reports.index_data as iv; my_data = iv.IndexerValues(); '
+                'last = files.last_table_month(files.build_table_name()); '
+                'print(my_data.check_for_month(last), my_data.check_for_month(my_data.add_month(last)), '
+                'sorted(m for m in ("pandas", "numpy") if m in sys.modules))')
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        self.assertTrue(output.strip() == 'True False []')
@@ -0,0 +1,154 @@
+"""
+Unit tests on report delivery against a local SMTP stand-in
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import email
+import email.policy
+import socketserver
+import threading
+
+import fs_reports.index_data as iv
+import fs_reports.mailer as mailer
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    """ just enough SMTP to accept messages """
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip().strip('<>'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                if server.drops > 0:
+                    # drop the connection mid send
+                    server.drops -= 1
+                    return
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b'.\r\n', b''):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                message = email.message_from_bytes(b''.join(lines), policy=email.policy.default)
+                server.messages.append((recipients, message))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), SmtpHandler)
+        self.connections = 0
+        self.drops = 0
+        self.messages = []
+
+
+class Mailer(unittest.TestCase):
+    """
+    Test batching, connection reuse and retries
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the dummy reports and a running SMTP stand-in
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.my_data = iv.IndexerValues()
+        self.my_data.stake_name = 'Kolob Stake'
+        self.my_data.to_email = 'stake@example.com'
+        self.my_data.from_email = 'reports@example.com'
+        self.my_data.ward_email = {'hazeldale': 'bishop@example.com, clerk@example.com',
+                                   'reedville': 'bishop@example.com'}
+        self.month = datetime.datetime(2015, 12, 1)
+        self.server = SmtpStandIn()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.mailer = mailer.Mailer(*self.server.server_address, backoff=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_report_files(self):
+        """ ward and stake reports for the month """
+        reports = mailer.report_files(dummy_locations(), self.month)
+        self.assertTrue(len(reports) == 9)
+        self.assertTrue(reports['Stake'].name == 'Stake_201512.pdf')
+        self.assertTrue(mailer.report_files(dummy_locations(), datetime.datetime(2016, 1, 1)) == {})
+
+    def test_batches(self):
+        """ each address is in exactly one batch """
+        reports = mailer.report_files(dummy_locations(), self.month)
+        batches = mailer.build_batches(reports, self.my_data.to_email, self.my_data.ward_email)
+        self.assertTrue(len(batches[('stake@example.com',)]) == 9)
+        self.assertTrue([path.name for path in batches[('bishop@example.com',)]] ==
+                        ['Hazeldale_201512.pdf', 'Reedville_201512.pdf'])
+        self.assertTrue([path.name for path in batches[('clerk@example.com',)]] == ['Hazeldale_201512.pdf'])
+
+    def test_deliver(self):
+        """ every message over one connection """
+        sent = mailer.deliver(self.my_data, self.mailer, self.month, dummy_locations())
+        self.assertTrue(sent == 3)
+        self.assertTrue(self.server.connections == 1)
+        received = {tuple(recipients): message for recipients, message in self.server.messages}
+        attachments = [part.get_filename() for part in received[('bishop@example.com',)].iter_attachments()]
+        self.assertTrue(attachments == ['Hazeldale_201512.pdf', 'Reedville_201512.pdf'])
+        self.assertTrue(received[('stake@example.com',)]['Subject'] == 'Kolob Stake indexing reports December 2015')
+
+    def test_retry(self):
+        """ a dropped connection is retried on a new one """
+        self.server.drops = 2
+        sent = mailer.deliver(self.my_data, self.mailer, self.month, dummy_locations())
+        self.assertTrue(sent == 3)
+        self.assertTrue(len(self.server.messages) == 3)
+        self.assertTrue(self.mailer.connections == 3)
+
+    def test_give_up(self):
+        """ retries are limited """
+        self.server.drops = 10
+        self.mailer.retries = 1
+        with self.assertRaises(Exception):
+            mailer.deliver(self.my_data, self.mailer, self.month, dummy_locations())
@@ -0,0 +1,156 @@
+"""
+Unit tests on the participation and streak metrics
+
+"""
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import fs_reports.index_data as iv
+import fs_reports.metrics as metrics
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class Streaks(unittest.TestCase):
+    """
+    Test the matrix functions on a small hand built matrix
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the streak tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.active = np.array([[1, 1, 0, 1, 1, 1],
+                                [0, 0, 1, 1, 0, 0],
+                                [0, 0, 0, 0, 0, 0]], dtype=bool)
+        self.ward_codes = np.array([[0, 0, -1, 1, 1, 1],
+                                    [-1, -1, 0, 0, -1, -1],
+                                    [-1, -1, -1, -1, -1, -1]], dtype=np.int16)
+
+    def test_streaks(self):
+        """ longest and current streaks """
+        self.assertTrue(list(metrics.longest_streaks(self.active)) == [3, 2, 0])
+        self.assertTrue(list(metrics.current_streaks(self.active)) == [3, 0, 0])
+        self.assertTrue(list(metrics.first_active_month(self.active)) == [0, 2, -1])
+
+    def test_masks(self):
+        """ new, returning and lapsed cells """
+        self.assertTrue(metrics.new_mask(self.active).sum() == 2)
+        self.assertTrue(list(np.nonzero(metrics.returning_mask(self.active))[1]) == [3])
+        self.assertTrue(list(np.nonzero(metrics.lapsed_mask(self.active))[1]) == [2, 4])
+
+    def test_participation(self):
+        """ counts per ward and month """
+        counts = metrics.participation(self.active, self.ward_codes, 2)
+        self.assertTrue(list(counts['Active'][0]) == [1, 1, 1, 1, 0, 0])
+        self.assertTrue(list(counts['Active'][1]) == [0, 0, 0, 1, 1, 1])
+        self.assertTrue(list(counts['Lapsed'][0]) == [0, 0, 1, 0, 1, 0])
+        self.assertTrue(list(counts['Returning'][1]) == [0, 0, 0, 1, 0, 0])
+
+
+class Participation(unittest.TestCase):
+    """
+    Test the participation tables from the index class
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the participation tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def test_active(self):
+        """ active counts by date and ward """
+        active = self.my_data.participation_by_date('Active')
+        self.assertTrue(len(active) == 36)
+        self.assertTrue(active[0] == 15)
+
+        by_ward = self.my_data.participation_by_ward('Active')
+        self.assertTrue(by_ward.index[0] == 'Hazeldale')
+        self.assertTrue(by_ward.loc['Aloha I'].iloc[0] == 4)
+        self.assertTrue((by_ward.sum(axis=0).values == active.values).all())
+
+    def test_new(self):
+        """ every indexer is new exactly once """
+        self.assertTrue(self.my_data.participation_by_date('New').sum() == 275)
+
+    def test_streak_list(self):
+        """ streak list """
+        streaks = self.my_data.streak_list(5)
+        self.assertTrue(len(streaks) == 5)
+        self.assertTrue(streaks.iloc[0]['Current'] == 36)
+        self.assertTrue(streaks.iloc[0]['Name'] == 'Edda Junod')
+
+
+class Cohorts(unittest.TestCase):
+    """
+    Test the cohort retention matrix
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the cohort tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def test_small_matrix(self):
+        """ cohorts on a hand built matrix """
+        active = np.array([[1, 1, 0, 1],
+                           [0, 1, 1, 0],
+                           [0, 1, 0, 0]], dtype=bool)
+        counts = metrics.cohort_counts(active, np.array([0, 0, 1]), 2)
+        self.assertTrue(list(counts[0, 0]) == [1, 1, 0, 1])
+        self.assertTrue(list(counts[0, 1]) == [1, 1, 0, 0])
+        self.assertTrue(list(counts[1, 1]) == [1, 0, 0, 0])
+
+        fractions = metrics.retention(counts.sum(axis=0))
+        self.assertTrue(fractions[1, 1] == 0.5)
+        self.assertTrue(np.isnan(fractions[1, 3]))
+
+    def test_stake_retention(self):
+        """ stake wide retention """
+        retention = self.my_data.cohort_retention()
+        self.assertTrue(len(retention) == 36)
+        self.assertTrue(retention.Size.sum() == 275)
+        self.assertTrue(retention.iloc[0]['Size'] == 15)
+        self.assertTrue(retention[1].iloc[0] == 0.8)
+        self.assertTrue(np.isnan(retention[1].iloc[-1]))
+
+    def test_ward_retention(self):
+        """ ward retention adds up to the stake """
+        total = 0
+        for ward in self.my_data.sorted_wards:
+            total += self.my_data.cohort_retention(ward).Size.sum()
+        self.assertTrue(total == 275)
+        self.assertTrue(self.my_data.cohort_retention('Aloha I').iloc[0]['Size'] == 4)
@@ -0,0 +1,171 @@
+"""
+Unit tests on the asynchronous report pipeline
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import fs_reports.bundle as bundle
+import fs_reports.index_data as iv
+import fs_reports.mailer as mailer
+import fs_reports.pipeline as pipeline
+from fs_reports.tests.test_mailer import SmtpStandIn
+
+
+class DownMailer:
+    """ mailer for an SMTP server that is down """
+
+    def send(self, message):
+        raise OSError('connection refused')
+
+    def close(self):
+        pass
+
+
+def stub_render(name, file_name):
+    """ write a stand-in report at once """
+    with open(file_name, 'wb') as fh:
+        fh.write(b'%PDF-')
+    return file_name
+
+
+def failed_render(name, file_name):
+    """ a report that cannot be drawn """
+    raise ValueError('no data for ' + name)
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class ReportPipeline(unittest.TestCase):
+    """
+    Test a full run against a temp report directory and a local SMTP stand-in
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the 201512 table
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+        self.my_data.to_email = 'stake@example.com'
+        self.my_data.from_email = 'reports@example.com'
+        self.my_data.ward_email = {'hazeldale': 'bishop@example.com'}
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.server = SmtpStandIn()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def test_run(self):
+        """ ingest, render in worker processes, deliver and bundle """
+        report_mailer = mailer.Mailer(*self.server.server_address)
+        report_bundle = bundle.ReportBundle(Path(self.temp_dir.name).joinpath('bundle'), 'Reports_201601')
+        finished = pipeline.run_pipeline(self.my_data,
+                                         lsr_file=dummy_locations().joinpath('dummy_lsr_201601_fixed.csv'),
+                                         directory=self.temp_dir.name, report_mailer=report_mailer,
+                                         processes=2, queue_size=1, save=False, report_bundle=report_bundle)
+        self.assertTrue(self.my_data.last_month == datetime.datetime(2016, 1, 1))
+        self.assertTrue(sorted(finished.timings) == ['aggregate', 'deliver', 'ingest', 'render', 'total'])
+        self.assertTrue(len(finished.rendered) == 9)
+        self.assertTrue(Path(self.temp_dir.name).joinpath('Stake_201601.pdf').exists())
+        self.assertTrue(finished.sent == 2)
+        self.assertTrue(self.server.connections == 1)
+        recipients = sorted(tuple(recipients) for recipients, message in self.server.messages)
+        self.assertTrue(recipients == [('bishop@example.com',), ('stake@example.com',)])
+        self.assertTrue(len(report_bundle.parts) == 1)
+        self.assertTrue(sorted(entry['name'] for entry in report_bundle.entries) ==
+                        sorted(Path(path).name for path in finished.rendered))
+
+    def run_in_thread(self, **kwargs):
+        """ run the pipeline where a hang shows up as a timeout, returns the exception raised """
+        outcome = []
+
+        def target():
+            try:
+                pipeline.run_pipeline(self.my_data, directory=self.temp_dir.name, processes=1, save=False, **kwargs)
+                outcome.append(None)
+            except Exception as e:
+                outcome.append(e)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        return outcome[0]
+
+    def test_deliver_fails(self):
+        """ an SMTP outage ends the run with the error instead of hanging on the full queue """
+        with mock.patch.object(pipeline, 'render_in_worker', stub_render):
+            error = self.run_in_thread(report_mailer=DownMailer(), queue_size=1)
+        self.assertTrue(isinstance(error, OSError))
+
+    def test_render_fails(self):
+        """ a failed render stops delivery waiting for reports that will not come """
+        with mock.patch.object(pipeline, 'render_in_worker', failed_render):
+            error = self.run_in_thread(report_mailer=DownMailer())
+        self.assertTrue(isinstance(error, ValueError))
+
+    def test_worker_copy(self):
+        """ workers get the table through shared memory, the copy they are sent has no rows """
+        copied = pipeline.worker_copy(self.my_data)
+        self.assertTrue(copied.current_table is None)
+        self.assertTrue(self.my_data.current_table is not None)
+        with self.my_data.publish_shared() as published:
+            pipeline.set_worker_data(copied, published.handle)
+            try:
+                worker = pipeline.worker_data
+                self.assertTrue(len(worker.current_table) == len(self.my_data.current_table))
+                self.assertTrue(worker.ward_slice('Hazeldale').Indexed.sum() ==
+                                self.my_data.ward_slice('Hazeldale').Indexed.sum())
+                expected = self.my_data.individual_list(self.my_data.current_table, 3, 11, 'Indexed')
+                listed = worker.individual_list(worker.current_table, 3, 11, 'Indexed')
+                self.assertTrue(list(listed.Name) == list(expected.Name))
+                for ward in self.my_data.sorted_wards:
+                    expected = self.my_data.individual_list(self.my_data.ward_slice(ward), 6, 11, 'Indexed')
+                    listed = worker.individual_list(worker.ward_slice(ward), 6, 11, 'Indexed')
+                    self.assertTrue(list(listed.Name) == list(expected.Name))
+                    self.assertTrue(list(listed.Indexed) == list(expected.Indexed))
+                self.assertTrue(worker.streak_list(11).equals(self.my_data.streak_list(11)))
+            finally:
+                pipeline.worker_data = None
+
+    def test_shutdown_off_loop(self):
+        """ the render pool is shut down in a thread, not on the event loop """
+        calls = []
+
+        class Pool(ThreadPoolExecutor):
+            def shutdown(self, *args, **kwargs):
+                calls.append(threading.current_thread())
+                super().shutdown(*args, **kwargs)
+
+        with mock.patch.object(pipeline, 'render_in_worker', stub_render), \
+                mock.patch.object(pipeline, 'ThreadPoolExecutor', Pool):
+            finished = pipeline.run_pipeline(self.my_data, directory=self.temp_dir.name, processes=1, save=False)
+        self.assertTrue(len(finished.rendered) == 9)
+        self.assertTrue(len(calls) == 1)
+        self.assertFalse(calls[0] is threading.main_thread())
@@ -0,0 +1,82 @@
+"""
+Unit tests on the generic aggregate queries
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+
+import fs_reports.index_data as iv
+import fs_reports.query as query
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class Aggregate(unittest.TestCase):
+    """
+    Test the aggregate query and its planning
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the query tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def test_plan(self):
+        """ cube covers ward and month grain only """
+        measures = self.my_data.cube.measures
+        self.assertTrue(query.plan_aggregate(['Ward', 'Year'], ['Indexed'], {}, measures)['path'] == 'cube')
+        self.assertTrue(query.plan_aggregate(['Name'], ['Indexed'], {}, measures)['path'] == 'scan')
+        self.assertTrue(query.plan_aggregate([], ['Indexed'], {'Name': 'x'}, measures)['path'] == 'scan')
+        self.assertTrue(query.plan_aggregate([], ['Sequence'], {}, measures)['path'] == 'scan')
+
+    def test_matches_scan(self):
+        """ cube and scan paths agree """
+        requests = [(['Ward'], ['Indexed'], {'Year': 2015}, 3),
+                    (['Date'], ['Indexed', 'Active', 'Count'], None, None),
+                    (['Year', 'Month'], ['Arbitrated'], {'Ward': ['Hazeldale', 'Aloha I']}, None),
+                    ([], ['Indexed'], {'Date': (datetime.datetime(2014, 1, 1), datetime.datetime(2014, 12, 1))},
+                     None)]
+        for group_by, measures, filters, window in requests:
+            from_cube = self.my_data.aggregate(group_by, measures, filters, window)
+            self.assertTrue(self.my_data.last_plan.startswith('cube'))
+            from_scan = self.my_data.aggregate(group_by, measures, filters, window, force_scan=True)
+            self.assertTrue(self.my_data.last_plan.startswith('scan'))
+            self.assertTrue(from_cube.equals(from_scan))
+
+    def test_replaces_hand_written(self):
+        """ same answers as the chart methods """
+        df = self.my_data.aggregate(['Date'], ['Indexed'], {'Ward': 'Aloha I'})
+        self.assertTrue(df['Indexed'].iloc[0] == 1874)
+        self.assertTrue(df['Indexed'].iloc[-1] == 814)
+
+        df = self.my_data.aggregate(['Ward'], ['Indexed'], {'Year': 2015})
+        self.assertTrue(df.loc['Hazeldale', 'Indexed'] == 110663)
+
+        total = self.my_data.aggregate([], ['Indexed'])
+        self.assertTrue(total['Indexed'].iloc[0] == self.my_data.current_table.Indexed.sum())
+
+    def test_explain(self):
+        """ explain output names the path """
+        text = self.my_data.explain_aggregate(['Name'], ['Indexed'])
+        self.assertTrue(text.startswith('scan'))
+        self.assertTrue('Name' in text)
+        text = self.my_data.explain_aggregate(['Ward'], ['Indexed'])
+        self.assertTrue(text.startswith('cube'))
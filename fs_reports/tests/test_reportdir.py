@@ -0,0 +1,70 @@
+"""
+Unit tests on the report directory manager
+
+"""
+import unittest
+from pathlib import Path
+import os
+import tempfile
+import time
+
+import fs_reports.reportdir as reportdir
+
+
+class ReportDirectory(unittest.TestCase):
+    """
+    Test archiving the previous run and pruning
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with a report root in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manager = reportdir.ReportDirectory(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_run(self, month, size=10):
+        """ reports for one run in current """
+        self.manager.current.mkdir(parents=True, exist_ok=True)
+        for name in ['Stake', 'Aloha I', 'Hazeldale']:
+            with open(str(self.manager.current.joinpath(name + '_' + month + '.pdf')), 'wb') as fh:
+                fh.write(b'x' * size)
+
+    def test_prepare(self):
+        """ the previous run is renamed into the archive by month """
+        self.assertTrue(self.manager.prepare() == self.manager.current)
+        self.assertTrue(self.manager.archives() == [])
+
+        self.write_run('201512')
+        self.manager.prepare()
+        self.assertTrue(list(self.manager.current.iterdir()) == [])
+        archived = self.manager.archive.joinpath('201512')
+        self.assertTrue(len(list(archived.iterdir())) == 3)
+
+        # a second run for the same month does not overwrite the first
+        self.write_run('201512')
+        self.manager.prepare()
+        self.assertTrue(sorted(run[0].name for run in self.manager.archives()) == ['201512', '201512-1'])
+
+    def test_prune(self):
+        """ archives are removed by age and then by size, oldest first """
+        now = time.time()
+        for age, month in [(90, '201510'), (40, '201511'), (10, '201512'), (0, '201601')]:
+            self.write_run(month, 100)
+            archived = self.manager.archive_current()
+            os.utime(str(archived), (now - age * 86400, now - age * 86400))
+        removed = self.manager.prune(max_age_days=60)
+        self.assertTrue([path.name for path in removed] == ['201510'])
+
+        removed = self.manager.prune(max_bytes=700)
+        self.assertTrue([path.name for path in removed] == ['201511'])
+        self.assertTrue([run[0].name for run in self.manager.archives()] == ['201512', '201601'])
+        self.assertTrue(reportdir.directory_size(self.manager.archive) == 600)
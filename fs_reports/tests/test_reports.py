@@ -0,0 +1,99 @@
+"""
+Unit tests on rendering the PDF reports
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import tempfile
+
+from matplotlib.backends import backend_pdf
+
+import fs_reports.index_data as iv
+import fs_reports.reports as reports
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class Reports(unittest.TestCase):
+    """
+    Test report names and a ward report
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the 201512 table
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_names(self):
+        """ same names as the reports already sent """
+        names = reports.report_names(self.my_data, dummy_locations())
+        self.assertTrue(len(names) == 9)
+        self.assertTrue(all(file_name.exists() for file_name in names.values()))
+
+    def test_ward_report(self):
+        """ a ward report is a pdf """
+        file_name = Path(self.temp_dir.name).joinpath('Hazeldale_201512.pdf')
+        reports.render_ward_report(self.my_data, 'Hazeldale', file_name)
+        with open(str(file_name), 'rb') as fh:
+            self.assertTrue(fh.read(5) == b'%PDF-')
+
+    def test_quality_page(self):
+        """ ward summary discrepancies get a page of their own """
+        self.my_data.load_this_month_file(dummy_locations().joinpath('dummy_lsr_201601_fixed.csv'),
+                                          datetime.datetime(2016, 1, 1))
+        self.my_data.merge_month_to_table()
+        wrong = self.my_data.discrepancies(self.my_data.last_month)
+        self.assertTrue(list(wrong['Ward']) == ['Aloha I', 'Cooper Mtn', 'Murrayhill'])
+        file_name = Path(self.temp_dir.name).joinpath('quality.pdf')
+        with backend_pdf.PdfPages(str(file_name)) as pdf:
+            reports.quality_page(pdf, wrong, 'Ward Summary Discrepancies')
+            self.assertTrue(pdf.get_pagecount() == 1)
+
+    def test_stake_report(self):
+        """ the stake report has the history, lists, participation and cohort pages """
+        file_name = Path(self.temp_dir.name).joinpath('Stake_201512.pdf')
+        reports.render_stake_report(self.my_data, file_name)
+        with open(str(file_name), 'rb') as fh:
+            self.assertTrue(fh.read(5) == b'%PDF-')
+
+    def test_cohort_page(self):
+        """ the latest cohorts, months not reached yet are left blank """
+        retention = self.my_data.cohort_retention()
+        file_name = Path(self.temp_dir.name).joinpath('cohorts.pdf')
+        with backend_pdf.PdfPages(str(file_name)) as pdf:
+            reports.cohort_page(pdf, retention, 'Indexer Retention by First Month')
+            self.assertTrue(pdf.get_pagecount() == 1)
+
+    def test_participation_page(self):
+        """ stake participation, wards and streaks on one page """
+        file_name = Path(self.temp_dir.name).joinpath('participation.pdf')
+        with backend_pdf.PdfPages(str(file_name)) as pdf:
+            reports.participation_page(pdf, self.my_data, 'Indexer Participation')
+            self.assertTrue(pdf.get_pagecount() == 1)
+
+    def test_short_name(self):
+        """ middle names are dropped from the lists """
+        self.assertTrue(reports.short_name('John Elwood Hunt') == 'John Hunt')
+        self.assertTrue(reports.short_name('Remaining') == 'Remaining')
@@ -0,0 +1,88 @@
+"""
+Unit tests on the shared memory table
+
+"""
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker
+from pathlib import Path
+
+import numpy as np
+
+import fs_reports.index_data as iv
+import fs_reports.shared as shared
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class SharedTable(unittest.TestCase):
+    """
+    Test publishing and attaching
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment for the shared table tests
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+    def check_cube(self, shared_cube):
+        """
+        compare a cube against the one from the table
+
+        :param shared_cube: cube built from the shared columns
+        :return:
+        """
+        full = self.my_data.cube
+        order = [shared_cube.ward_index[ward] for ward in full.ward_names]
+        self.assertTrue(shared_cube.first_key == full.first_key)
+        for measure in full.measures:
+            self.assertTrue(np.array_equal(full.values(measure), shared_cube.values(measure)[order]))
+
+    def test_view(self):
+        """ view in the same process is read-only and decodes back """
+        with self.my_data.publish_shared() as published:
+            view = shared.TableView(published.handle)
+            self.assertTrue(view.rows == 1327)
+            self.assertFalse(view.columns['Indexed'].flags.writeable)
+            self.check_cube(view.build_cube())
+
+            df = view.frame()
+            self.assertTrue(df.Indexed.sum() == self.my_data.current_table.Indexed.sum())
+            self.assertTrue(list(df.Name[:3]) == list(self.my_data.current_table.Name[:3]))
+            view.close()
+
+    def test_workers(self):
+        """ worker processes attach without copies of the table """
+        with self.my_data.publish_shared() as published:
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                cubes = list(executor.map(shared.worker_cube, [published.handle] * 2))
+        for shared_cube in cubes:
+            self.check_cube(shared_cube)
+
+    def test_attach_threads(self):
+        """ views attached from threads leave the resource tracker functions alone """
+        register = resource_tracker.register
+        with self.my_data.publish_shared() as published:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                views = list(executor.map(shared.TableView, [published.handle] * 8))
+            self.assertTrue(resource_tracker.register is register)
+            for view in views:
+                self.check_cube(view.build_cube())
+                view.close()
@@ -0,0 +1,137 @@
+"""
+Unit tests on the versioned table snapshots
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import tempfile
+from unittest import mock
+
+import fs_reports.index_data as iv
+import fs_reports.snapshots as snapshots
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class SnapshotStore(unittest.TestCase):
+    """
+    Test a version per merged month and opening the table as of a month
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the 201512 table and an empty store in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(dummy_locations().joinpath('dummy_table_201512.csv'))
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temp_dir.name).joinpath('snapshots')
+        self.store = snapshots.SnapshotStore(self.directory)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def segment_files(self):
+        """ segments stored """
+        return list(self.store.segments.glob('*/*.csv'))
+
+    def merge_january(self):
+        """ merge the 201601 download """
+        self.my_data.load_this_month_file(dummy_locations().joinpath('dummy_lsr_201601_fixed.csv'),
+                                          datetime.datetime(2016, 1, 1))
+        self.my_data.merge_month_to_table()
+
+    def test_versions_share_segments(self):
+        """ the next month adds one segment, the other months are shared """
+        self.my_data.write_snapshot(self.directory)
+        months = len(self.my_data.list_of_months)
+        self.assertTrue(len(self.segment_files()) == months)
+
+        self.merge_january()
+        self.my_data.write_snapshot(self.directory)
+        self.assertTrue(self.store.versions() == ['201512', '201601'])
+        # the new month and the quality table
+        self.assertTrue(len(self.segment_files()) == months + 2)
+
+        old = self.store.manifest(datetime.datetime(2015, 12, 1))['segments']
+        new = self.store.manifest(datetime.datetime(2016, 1, 1))['segments']
+        self.assertTrue(new[:-1] == old)
+
+    def test_reuse_hashes(self):
+        """ the months that did not change are not written out and hashed again """
+        self.my_data.write_snapshot(self.directory)
+        self.merge_january()
+        with mock.patch.object(snapshots.SnapshotStore, 'write_segment', autospec=True,
+                               side_effect=snapshots.SnapshotStore.write_segment) as write_segment:
+            self.my_data.write_snapshot(self.directory)
+        # January and the quality table
+        self.assertTrue(write_segment.call_count == 2)
+        new = self.store.manifest(datetime.datetime(2016, 1, 1))['segments']
+        self.assertTrue([segment['month'] for segment in new] ==
+                        [month.strftime('%Y%m') for month in self.my_data.list_of_months])
+
+        # other columns share nothing with the previous version
+        store = snapshots.SnapshotStore(self.directory)
+        with mock.patch.object(snapshots.SnapshotStore, 'write_segment', autospec=True,
+                               side_effect=snapshots.SnapshotStore.write_segment) as write_segment:
+            store.snapshot(self.my_data.current_table, self.my_data.header[:-1], self.my_data.last_month)
+        self.assertTrue(write_segment.call_count == len(self.my_data.list_of_months))
+
+    def test_edited_month(self):
+        """ a past month edited before the table is written again gets a new segment """
+        self.my_data.write_snapshot(self.directory)
+        self.merge_january()
+        table = self.my_data.current_table
+        edited = table.index[table.index == datetime.datetime(2015, 6, 1)][0]
+        position = list(table.index).index(edited)
+        table.iloc[position, table.columns.get_loc('Indexed')] += 7
+        self.my_data.write_snapshot(self.directory)
+
+        old = {segment['month']: segment['hash'] for segment in
+               self.store.manifest(datetime.datetime(2015, 12, 1))['segments']}
+        new = {segment['month']: segment['hash'] for segment in
+               self.store.manifest(datetime.datetime(2016, 1, 1))['segments']}
+        self.assertTrue([month for month in old if old[month] != new[month]] == ['201506'])
+
+        past = iv.IndexerValues()
+        past.read_table_as_of(datetime.datetime(2016, 1, 1), self.directory)
+        self.assertTrue(past.current_table.Indexed.sum() == table.Indexed.sum())
+
+    def test_as_of(self):
+        """ a version reads back as the table it was """
+        original = self.my_data.current_table.copy()
+        self.my_data.write_snapshot(self.directory)
+        self.merge_january()
+        self.my_data.write_snapshot(self.directory)
+
+        past = iv.IndexerValues()
+        past.read_table_as_of(datetime.datetime(2015, 12, 1), self.directory)
+        self.assertTrue(past.last_month == datetime.datetime(2015, 12, 1))
+        self.assertTrue(past.quality_table is None)
+        self.assertTrue(len(past.current_table.index) == len(original.index))
+        self.assertTrue((past.current_table[self.my_data.header].values == original[self.my_data.header].values).all())
+        with self.assertRaises(ValueError):
+            past.write_table()
+
+        # a month without its own version opens the last version before it
+        later = iv.IndexerValues(as_of=datetime.datetime(2016, 3, 1))
+        later.read_table_as_of(later.as_of, self.directory)
+        self.assertTrue(later.last_month == datetime.datetime(2016, 1, 1))
+        self.assertTrue(len(later.discrepancies(later.last_month)) == 3)
+
+        with self.assertRaises(ValueError):
+            iv.IndexerValues().read_table_as_of(datetime.datetime(2010, 1, 1), self.directory)
@@ -0,0 +1,120 @@
+"""
+Unit tests on the SQLite backend
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import tempfile
+
+import numpy as np
+
+import fs_reports.index_data as iv
+import fs_reports.sqlite_store as sqlite_store
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class SqliteStore(unittest.TestCase):
+    """
+    Test the database against the csv table
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with a database in a temp directory
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_name = str(Path(self.temp_dir.name).joinpath('table.sqlite'))
+        store = sqlite_store.SqliteStore(self.db_name)
+        store.insert_rows(self.my_data.current_table)
+        store.close()
+
+        self.from_db = iv.IndexerValues()
+        self.from_db.read_table_database(self.db_name)
+
+    def tearDown(self):
+        self.from_db.store.close()
+        self.temp_dir.cleanup()
+
+    def test_indexes(self):
+        """ both indexes are created """
+        rows = self.from_db.store.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        self.assertTrue({'idx_month_ward', 'idx_name_month'} <= {row[0] for row in rows})
+
+    def test_read(self):
+        """ table read from the database matches the csv """
+        self.assertTrue(self.from_db.store.row_count() == 1327)
+        self.assertTrue(len(self.from_db.current_table) == 1327)
+        self.assertTrue(list(self.from_db.sorted_wards) == list(self.my_data.sorted_wards))
+        self.assertTrue(self.from_db.last_month == datetime.datetime(2015, 12, 1))
+        self.assertTrue(self.from_db.store.has_month(datetime.datetime(2015, 12, 1)))
+        self.assertFalse(self.from_db.store.has_month(datetime.datetime(2016, 1, 1)))
+
+    def test_push_down(self):
+        """ scans are answered by SQL with the same result """
+        requests = [(['Name'], ['Indexed', 'Arbitrated'], {'Ward': 'Hazeldale'}, None),
+                    (['Name', 'Year'], ['Count', 'Active'], {'Year': (2014, 2015)}, 3),
+                    ([], ['Indexed'], {'Name': ['Edda Junod', 'Starla Verges']}, None)]
+        for group_by, measures, filters, window in requests:
+            from_sql = self.from_db.aggregate(group_by, measures, filters, window)
+            self.assertTrue(self.from_db.last_plan.startswith('sql'))
+            from_scan = self.my_data.aggregate(group_by, measures, filters, window)
+            self.assertTrue(self.my_data.last_plan.startswith('scan'))
+            self.assertTrue(list(from_sql.index) == list(from_scan.index))
+            self.assertTrue(np.array_equal(from_sql.values, from_scan.values))
+
+        # covered requests still use the cube
+        self.from_db.aggregate(['Ward'], ['Indexed'])
+        self.assertTrue(self.from_db.last_plan.startswith('cube'))
+
+    def test_import(self):
+        """ an empty database is filled from the csv table the first time it is read """
+        db_name = str(Path(self.temp_dir.name).joinpath('empty.sqlite'))
+        first = iv.IndexerValues()
+        first.read_table_database(db_name, dummy_locations().joinpath('dummy_table_201512.csv'))
+        self.assertTrue(first.store.row_count() == 1327)
+        self.assertTrue(first.last_month == datetime.datetime(2015, 12, 1))
+        first.store.close()
+
+        again = iv.IndexerValues()
+        again.read_table_database(db_name, Path(self.temp_dir.name).joinpath('missing.csv'))
+        self.assertTrue(len(again.current_table) == 1327)
+        self.assertTrue(list(again.sorted_wards) == list(self.my_data.sorted_wards))
+        again.store.close()
+
+        with self.assertRaises(ValueError):
+            iv.IndexerValues().read_table_database(str(Path(self.temp_dir.name).joinpath('other.sqlite')),
+                                                   Path(self.temp_dir.name).joinpath('missing.csv'))
+
+    def test_merge(self):
+        """ merging a month inserts it into the database """
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_lsr_201601_fixed.csv')
+        self.from_db.load_this_month_file(fn, datetime.datetime(2016, 1, 1))
+        self.from_db.merge_month_to_table()
+        self.assertTrue(self.from_db.store.row_count() == 1361)
+        self.assertTrue(self.from_db.store.has_month(datetime.datetime(2016, 1, 1)))
+
+    def test_ini(self):
+        """ backend defaults to csv when the ini file does not name one """
+        self.assertTrue(self.my_data.backend == 'csv')
@@ -0,0 +1,138 @@
+"""
+Unit tests on holding many stakes
+
+"""
+import functools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+import fs_reports.config as config
+import fs_reports.cube as cube
+import fs_reports.stakes as stakes
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class StakeEngine(unittest.TestCase):
+    """
+    Test the multi stake engine
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with two stakes
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.engine = stakes.StakeEngine()
+        self.engine.add_stake('Kolob Stake', dummy_locations().joinpath('dummy_table_201512.csv'))
+        self.engine.add_stake('Zion Stake', dummy_locations().joinpath('dummy_table_201601.csv'))
+
+    def test_stakes(self):
+        """ each stake keeps its own table and name """
+        self.assertTrue(len(self.engine.stakes) == 2)
+        self.assertTrue(self.engine.stakes['Kolob Stake'].stake_name == 'Kolob Stake')
+        self.assertTrue(self.engine.stakes['Zion Stake'].stake_name == 'Zion Stake')
+        self.assertTrue(len(self.engine.stakes['Kolob Stake'].current_table) == 1327)
+
+    def test_shared_strings(self):
+        """ the same ward name is one object across stakes """
+        first = self.engine.stakes['Kolob Stake'].current_table.Ward.iloc[0]
+        table = self.engine.stakes['Zion Stake'].current_table
+        second = table.Ward[table.Ward == first].iloc[0]
+        self.assertTrue(first is second)
+
+    def test_for_each(self):
+        """ run over all stakes """
+        results = self.engine.for_each(lambda stake: len(stake.sorted_wards))
+        self.assertTrue(results == {'Kolob Stake': 8, 'Zion Stake': 8})
+
+    def test_totals(self):
+        """ stake totals side by side """
+        totals = self.engine.stake_totals()
+        self.assertTrue(list(totals.columns) == ['Kolob Stake', 'Zion Stake'])
+        self.assertTrue(totals['Kolob Stake'].sum() == 749006)
+        self.assertTrue(self.engine.stake_totals() is totals)
+
+
+class RegionCube(unittest.TestCase):
+    """
+    Test the map reduce over stake tables
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup the stake files
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.stake_files = [('Kolob Stake', str(dummy_locations().joinpath('dummy_table_201512.csv'))),
+                            ('Zion Stake', str(dummy_locations().joinpath('dummy_table_201601.csv')))]
+
+    def test_merge(self):
+        """ merged cubes add up """
+        first = stakes.build_stake_cube(self.stake_files[0])
+        second = stakes.build_stake_cube(self.stake_files[1])
+        merged = cube.merge_cubes([first, first.collapse('Kolob Stake'), second])
+        self.assertTrue(list(merged.ward_names) == ['Kolob Stake', 'Zion Stake'])
+        self.assertTrue(merged.values('Indexed')[0].sum() == 2 * 749006)
+        self.assertTrue(merged.month_count == max(first.month_count, second.month_count))
+
+    def test_region(self):
+        """ worker processes give the same answer as a single process """
+        serial = stakes.region_cube(self.stake_files, processes=1)
+        parallel = stakes.region_cube(self.stake_files, processes=2)
+        self.assertTrue(list(parallel.ward_names) == ['Kolob Stake', 'Zion Stake'])
+        for measure in cube.WardCube.measures:
+            self.assertTrue(np.array_equal(serial.values(measure), parallel.values(measure)))
+        self.assertTrue(parallel.collapse('Region').values('Indexed').sum() ==
+                        serial.values('Indexed').sum())
+
+    def test_region_config(self):
+        """ started workers use the caller's configuration, not a root found from their working directory """
+        spawn = functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            root.joinpath('data').mkdir()
+            shutil.copy(str(Path(cwd).parent.joinpath('data', 'saved.ini')), str(root.joinpath('data', 'saved.ini')))
+            # the default root of the workers would be 'elsewhere', which has no ini
+            work = root.joinpath('elsewhere', 'work')
+            work.mkdir(parents=True)
+            try:
+                config.set_config(root=root)
+                os.chdir(str(work))
+                with mock.patch.object(stakes, 'ProcessPoolExecutor', spawn):
+                    region = stakes.region_cube(self.stake_files, processes=2)
+            finally:
+                os.chdir(cwd)
+                config.set_config()
+        self.assertTrue(list(region.ward_names) == ['Kolob Stake', 'Zion Stake'])
+
+    def test_area(self):
+        """ regions roll up into an area """
+        area = stakes.area_cube({'North': self.stake_files[:1], 'South': self.stake_files[1:]}, processes=1)
+        self.assertTrue(list(area.ward_names) == ['North', 'South'])
+        self.assertTrue(area.values('Indexed')[0].sum() == 749006)
@@ -0,0 +1,165 @@
+"""
+Unit tests on the LSR checks run before a month is merged
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import io
+import tempfile
+
+import pandas as pd
+
+import fs_reports.config as config
+import fs_reports.index_data as iv
+import fs_reports.validate as validate
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class ValidateLsr(unittest.TestCase):
+    """
+    Test finding and quarantining bad rows
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the lines of a good download
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        with open(str(dummy_locations().joinpath('dummy_lsr_201601.csv')), 'r') as fh:
+            self.lines = fh.read().splitlines()
+
+    def read(self, lines):
+        """ lines as pd.read_csv would read the download """
+        return pd.read_csv(io.StringIO('\n'.join(lines)))
+
+    def test_good_file(self):
+        """ nothing is reported or set aside """
+        df, quarantined, report = validate.validate_lsr(self.read(self.lines))
+        self.assertTrue(len(df.index) == len(self.lines) - 1)
+        self.assertTrue(len(quarantined.index) == 0)
+        self.assertTrue(len(report.index) == 0)
+        self.assertTrue('Desc' in df.columns)
+
+    def test_bad_rows(self):
+        """ bad rows are quarantined and reported by line, stray columns dropped """
+        lines = list(self.lines)
+        lines[0] += ',Extra'
+        lines[2] = 'Individual Statistics,Javier Mervis,lots,0,0'
+        lines.insert(5, lines[4])
+        lines.insert(1, 'Individual Statistics,Orphan,1,0,0')
+        lines.insert(6, 'Individual Statistics,,3,0,0')
+        df, quarantined, report = validate.validate_lsr(self.read(lines))
+        self.assertTrue('Extra' not in df.columns)
+        self.assertTrue(df['Indexed'].dtype.kind == 'i')
+        self.assertTrue(len(quarantined.index) == 4)
+        self.assertTrue(len(df.index) + len(quarantined.index) == len(lines) - 1)
+        problems = list(zip(report['Line'], report['Problem']))
+        self.assertTrue((1, 'stray columns Extra') in problems)
+        self.assertTrue((2, 'no ward summary above') in problems)
+        self.assertTrue((4, 'bad count') in problems)
+        self.assertTrue((7, 'missing name') in problems)
+        self.assertTrue((8, 'duplicate name in ward') in problems)
+        # the row with the bad count leaves its ward summary short
+        self.assertTrue((3, 'summary total Indexed 35 vs 0') in problems)
+
+    def test_summary_totals(self):
+        """ summary totals are compared with the individual rows but nothing is set aside """
+        df = pd.read_csv(str(dummy_locations().joinpath('dummy_lsr_201601_fixed.csv')))
+        checked, quarantined, report = validate.validate_lsr(df)
+        self.assertTrue(len(checked.index) == len(df.index))
+        self.assertTrue(len(quarantined.index) == 0)
+        self.assertTrue(list(report['Ward']) == ['Aloha I', 'Cooper Mtn', 'Murrayhill'])
+        self.assertTrue(report['Problem'][0] == 'summary total Indexed 927 vs 962')
+
+    def test_format_error(self):
+        """ a file without the LSR columns is refused """
+        with self.assertRaises(validate.LsrFormatError):
+            validate.validate_lsr(self.read(['Name,Count', 'Someone,3']))
+
+    def test_load_month(self):
+        """ load_this_month_file leaves the quarantine for write_quarantine """
+        my_data = iv.IndexerValues()
+        my_data.read_table_name(dummy_locations().joinpath('dummy_table_201512.csv'))
+        lines = list(self.lines)
+        lines[4] = 'Individual Statistics,Myesha Leimbach,-5,0,0'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fn = Path(temp_dir).joinpath('lsr_201601.csv')
+            with open(str(fn), 'w') as fh:
+                fh.write('\n'.join(lines))
+            df = my_data.load_this_month_file(fn, datetime.datetime(2016, 1, 1))
+            self.assertTrue('Myesha Leimbach' not in list(df['Name']))
+            self.assertTrue(list(my_data.quarantine['Name']) == ['Myesha Leimbach'])
+            try:
+                config.set_config(root=temp_dir)
+                written = my_data.write_quarantine(datetime.datetime(2016, 1, 1))
+            finally:
+                config.set_config()
+            self.assertTrue([path.name for path in written] == ['lsr_201601_rows.csv', 'lsr_201601_report.csv'])
+            self.assertTrue(all(path.exists() for path in written))
+
+
+class Reconcile(unittest.TestCase):
+    """
+    Test keeping the Ward Summary totals in the quality table
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the 201512 table and the 201601 download loaded
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(dummy_locations().joinpath('dummy_table_201512.csv'))
+        self.month = datetime.datetime(2016, 1, 1)
+        self.my_data.load_this_month_file(dummy_locations().joinpath('dummy_lsr_201601.csv'), self.month)
+        self.fixes = {'Aloha 1': 'Aloha I', 'Cooper Mountain': 'Cooper Mtn', 'Murrayhill ': 'Murrayhill'}
+
+    def fix_wards(self):
+        """ fix the unknown wards the way the window driver does, by renaming them in month_data """
+        self.my_data.month_data['Ward'] = self.my_data.month_data['Ward'].replace(self.fixes)
+
+    def test_reconcile(self):
+        """ totals are kept against the merged rows, a renamed ward keeps its totals """
+        self.assertTrue(sorted(self.my_data.bad_wards) == sorted(self.fixes))
+        self.fix_wards()
+        self.my_data.merge_month_to_table()
+        quality = self.my_data.quality_table
+        self.assertTrue(list(quality.columns) == validate.quality_columns)
+        self.assertTrue(not any(ward in list(quality['Ward']) for ward in self.fixes))
+        aloha = quality[quality['Ward'] == 'Aloha I'].iloc[0]
+        self.assertTrue(aloha['Summary Indexed'] == 927 + 35)
+        self.assertTrue(aloha['Indexed'] == aloha['Summary Indexed'])
+        self.assertTrue(len(self.my_data.discrepancies()) == 0)
+        self.assertTrue(len(self.my_data.month_wards) == len(self.my_data.current_table[
+            self.my_data.current_table.index == self.month]))
+
+    def test_write_read(self):
+        """ the quality table is written next to the table and read back """
+        self.fix_wards()
+        self.my_data.merge_month_to_table()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fn = Path(temp_dir).joinpath('quality.csv')
+            self.my_data.write_quality(fn)
+            other = iv.IndexerValues()
+            other.read_quality(fn)
+        self.assertTrue(other.quality_table.equals(self.my_data.quality_table))
+        self.assertTrue(len(other.discrepancies(self.month)) == 0)
+        self.assertTrue(len(other.discrepancies(datetime.datetime(2015, 12, 1))) == 0)
@@ -0,0 +1,145 @@
+"""
+Unit tests on the downloads watcher
+
+"""
+import unittest
+from pathlib import Path
+import datetime
+import shutil
+import tempfile
+
+import fs_reports.archive as archive
+import fs_reports.index_data as iv
+import fs_reports.watcher as watcher
+
+
+def dummy_locations():
+    """
+    folder name for dummy locations
+
+    :return path: path to dummy locations (have to add in filename)
+    """
+    p = Path.cwd()
+    return p.joinpath('tests/dummy_files')
+
+
+class DownloadWatcher(unittest.TestCase):
+    """
+    Test that a download is moved, merged and rendered
+
+    """
+
+    @classmethod
+    def setUp(self):
+        """
+        Setup environment with the 201512 table and temp download directories
+
+        :return:
+        """
+        unittest.TestCase.setUp(self)
+        fn = dummy_locations()
+        fn = fn.joinpath('dummy_table_201512.csv')
+        self.my_data = iv.IndexerValues()
+        self.my_data.read_table_name(fn)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.downloads = Path(self.temp_dir.name).joinpath('Downloads')
+        self.data = Path(self.temp_dir.name).joinpath('downloads')
+        self.downloads.mkdir()
+        self.data.mkdir()
+        self.rendered = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def build(self, use_inotify, lsr_archive=None):
+        return watcher.DownloadWatcher(self.my_data, lambda my_data, month: self.rendered.append(month),
+                                       self.downloads, self.data, stable_interval=0.01, poll_interval=0.01,
+                                       use_inotify=use_inotify, save=False, lsr_archive=lsr_archive)
+
+    def download(self, name):
+        """ finish a download the way a browser does, write a partial file and rename it """
+        partial = self.downloads.joinpath(name + '.crdownload')
+        shutil.copy(str(dummy_locations().joinpath('dummy_lsr_201601_fixed.csv')), str(partial))
+        partial.rename(self.downloads.joinpath(name))
+
+    def check_merged(self, merged):
+        month = datetime.datetime(2016, 1, 1)
+        self.assertTrue(merged == [month])
+        self.assertTrue(self.rendered == [month])
+        self.assertTrue(self.my_data.last_month == month)
+        self.assertTrue(self.data.joinpath('lsr_201601.csv').exists())
+        self.assertTrue(list(self.downloads.iterdir()) == [])
+
+    def test_names(self):
+        """ only completed lsr downloads are picked up """
+        self.assertTrue(watcher.is_partial(Path('LocationStatisticsReport.csv.crdownload')))
+        self.assertTrue(watcher.is_lsr_download(Path('LocationStatisticsReport (1).csv')))
+        self.assertFalse(watcher.is_lsr_download(Path('LocationStatisticsReport.csv.part')))
+        self.assertFalse(watcher.is_lsr_download(Path('other.csv')))
+
+    def test_polling(self):
+        """ polling picks up the download """
+        download_watcher = self.build(False)
+        self.assertTrue(isinstance(download_watcher.watcher, watcher.PollingWatcher))
+        self.assertTrue(download_watcher.run_once(0.01) == [])
+        self.download('LocationStatisticsReport.csv')
+        self.check_merged(download_watcher.run_once(0.01))
+        download_watcher.close()
+
+    def test_inotify(self):
+        """ inotify picks up the download """
+        download_watcher = self.build(True)
+        if not isinstance(download_watcher.watcher, watcher.InotifyWatcher):
+            download_watcher.close()
+            self.skipTest('inotify is not available')
+        self.assertTrue(download_watcher.run_once(0.01) == [])
+        self.download('LocationStatisticsReport.csv')
+        self.check_merged(download_watcher.run_once(1.0))
+        download_watcher.close()
+
+    def test_existing(self):
+        """ a download finished before the watcher started is picked up """
+        self.download('LocationStatisticsReport.csv')
+        download_watcher = self.build(False)
+        self.check_merged(download_watcher.run_once(0.01))
+        self.assertTrue(download_watcher.run_once(0.01) == [])
+        download_watcher.close()
+
+    def test_duplicate(self):
+        """ downloading the same lsr again is not loaded as the next month """
+        lsr_archive = archive.LsrArchive(Path(self.temp_dir.name).joinpath('archive'))
+        download_watcher = self.build(False, lsr_archive)
+        self.download('LocationStatisticsReport.csv')
+        self.check_merged(download_watcher.run_once(0.01))
+        self.download('LocationStatisticsReport (1).csv')
+        self.assertTrue(download_watcher.run_once(0.01) == [])
+        self.assertTrue(download_watcher.status.startswith('Duplicate of lsr_201601.csv'))
+        self.assertTrue(self.rendered == [self.my_data.last_month])
+        download_watcher.close()
+
+    def test_bad_download(self):
+        """ a download that is not an LSR is reported and the watch goes on """
+        lsr_archive = archive.LsrArchive(Path(self.temp_dir.name).joinpath('archive'))
+        download_watcher = self.build(False, lsr_archive)
+        self.downloads.joinpath('LocationStatisticsReport.csv').write_text('Name,Count\nsomeone,3\n')
+        self.assertTrue(download_watcher.run_once(0.01) == [])
+        self.assertTrue(download_watcher.status.startswith('Failed to load LocationStatisticsReport.csv'))
+        self.assertTrue(self.my_data.last_month == datetime.datetime(2015, 12, 1))
+        self.download('LocationStatisticsReport (1).csv')
+        self.check_merged(download_watcher.run_once(0.01))
+        download_watcher.close()
+
+    def test_changed_month(self):
+        """ a corrected download of the month just merged is flagged, not merged as the next month """
+        lsr_archive = archive.LsrArchive(Path(self.temp_dir.name).joinpath('archive'))
+        download_watcher = self.build(False, lsr_archive)
+        self.download('LocationStatisticsReport.csv')
+        self.check_merged(download_watcher.run_once(0.01))
+        shutil.copy(str(dummy_locations().joinpath('dummy_lsr_201601.csv')),
+                    str(self.downloads.joinpath('LocationStatisticsReport (1).csv')))
+        self.assertTrue(download_watcher.run_once(0.01) == [])
+        self.assertTrue(download_watcher.status.startswith('Changed download of lsr_201601.csv'))
+        self.assertTrue(len(download_watcher.changes) == 3)
+        self.assertTrue(self.my_data.last_month == datetime.datetime(2016, 1, 1))
+        self.assertFalse(self.data.joinpath('lsr_201602.csv').exists())
+        download_watcher.close()
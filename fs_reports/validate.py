@@ -0,0 +1,194 @@
+"""
+Checks on a downloaded LSR before it is merged
+
+The download is checked in one vectorized pass: the column set, counts that are not whole non-negative
+numbers, individual rows without a name or without a Ward Summary line above them, names repeated within
+a ward and Ward Summary totals that do not match the individual rows. Bad individual rows are quarantined
+(left out of the month) and every problem is listed in a report, a file that cannot be read as an LSR at
+all raises LsrFormatError.
+
+The Ward Summary totals are kept and reconciled against the rows merged for each ward, giving the data
+quality table held next to current_table.
+
+"""
+
+# system imports
+# package imports
+from fs_reports.lazy import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# module imports
+
+# columns every LSR has, Desc is the unnamed first column
+required_columns = ['Desc', 'Name', 'Indexed', 'Arbitrated']
+# columns that are expected but not used
+optional_columns = ['Redo Batches']
+count_columns = ['Indexed', 'Arbitrated']
+ward_summary = 'Ward Summary'
+individual = 'Individual Statistics'
+report_columns = ['Line', 'Ward', 'Name', 'Problem']
+# one row per ward per month, Summary columns are the Ward Summary totals, the others the rows merged
+quality_columns = ['Date', 'Ward', 'Summary Indexed', 'Indexed', 'Summary Arbitrated', 'Arbitrated', 'Quarantined']
+
+
+class LsrFormatError(ValueError):
+    """ the file is not an LSR
+
+    """
+
+
+def to_counts(column):
+    """
+    whole non-negative counts, thousands separators allowed
+
+    :param column: Series read from the csv
+    :return Series: float counts, NaN where the value is not a count
+    """
+    if column.dtype.kind in 'iu':
+        column = column.astype('float64')
+    elif column.dtype.kind != 'f':
+        column = pd.to_numeric(column.astype(str).str.replace(',', '', regex=False).str.strip(), errors='coerce')
+    good = (column >= 0) & (column == np.floor(column))
+    return column.where(good)
+
+
+def validate_lsr(df):
+    """
+    check an LSR as read by pd.read_csv
+
+    :param df: raw lsr
+    :return tuple: (lsr without the bad rows or stray columns, quarantined rows, report of every problem)
+    """
+    df = df.rename(columns={'Unnamed: 0': 'Desc'})
+    missing = [column for column in required_columns if column not in df.columns]
+    if missing:
+        raise LsrFormatError('LSR is missing columns: ' + ', '.join(missing))
+    problems = []
+
+    # line in the csv file, the header is line 1
+    line = pd.Series(np.arange(2, len(df.index) + 2), index=df.index)
+    stray = [column for column in df.columns if column not in required_columns + optional_columns]
+    if stray:
+        problems.append(pd.DataFrame({'Line': [1], 'Ward': [''], 'Name': [''],
+                                      'Problem': ['stray columns ' + ', '.join(str(c) for c in stray)]}))
+        df = df.drop(stray, axis=1)
+
+    desc = df['Desc'].astype(str).str.strip()
+    ws_mask = (desc == ward_summary).values
+    ward = df['Name'].where(ws_mask).ffill()
+    counts = pd.DataFrame({column: to_counts(df[column]) for column in count_columns})
+    missing_name = df['Name'].isna() | (df['Name'].astype(str).str.strip() == '')
+
+    checks = [
+        ('unknown row type', ~ws_mask & (desc != individual).values),
+        ('ward summary without a ward name', ws_mask & missing_name.values),
+        ('bad count', counts.isna().any(axis=1).values),
+        ('missing name', ~ws_mask & missing_name.values),
+        ('no ward summary above', ~ws_mask & ward.isna().values),
+        ('duplicate name in ward', ~ws_mask & pd.DataFrame({'Ward': ward, 'Name': df['Name']}).duplicated().values),
+    ]
+    bad = np.zeros(len(df.index), dtype=bool)
+    for problem, mask in checks:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            problems.append(pd.DataFrame({'Line': line[mask].values, 'Ward': ward[mask].fillna('').values,
+                                          'Name': df['Name'][mask].fillna('').values, 'Problem': problem}))
+            # a bad summary line is only reported, it still names the ward for the rows below it
+            bad |= mask & ~ws_mask
+
+    df = df.assign(**{column: counts[column] for column in count_columns})
+    quarantined = df[bad].assign(Ward=ward[bad])
+    df = df[~bad]
+
+    # totals are only compared, which row is wrong cannot be told
+    mismatched = summary_mismatches(df)
+    if len(mismatched.index) > 0:
+        problems.append(pd.DataFrame({'Line': line[mismatched.index].values, 'Ward': mismatched['Ward'].values,
+                                      'Name': '', 'Problem': mismatched['Problem'].values}))
+
+    df = df.assign(**{column: df[column].fillna(0).astype('int64') for column in count_columns})
+    if problems:
+        report = pd.concat(problems, ignore_index=True).sort_values('Line', kind='mergesort')
+        report = report.reset_index(drop=True)[report_columns]
+    else:
+        report = pd.DataFrame(columns=report_columns)
+    return df, quarantined, report
+
+
+def summary_mismatches(df):
+    """
+    Ward Summary lines whose totals differ from the sum of the individual rows below them
+
+    :param df: lsr with Desc and numeric counts
+    :return dataframe: Ward and Problem, indexed like the summary lines
+    """
+    ws_mask = (df['Desc'].astype(str).str.strip() == ward_summary).values
+    ward = df['Name'].where(ws_mask).ffill()
+    # number the summary lines so a ward listed twice is not summed together
+    block = pd.Series(np.cumsum(ws_mask), index=df.index)
+    sums = df.loc[~ws_mask, count_columns].groupby(block[~ws_mask]).sum()
+    totals = df.loc[ws_mask, count_columns]
+    expected = sums.reindex(block[ws_mask].values).fillna(0)
+    expected.index = totals.index
+    # a summary total that is not a count has already been reported
+    difference = (totals - expected).fillna(0)
+    wrong = difference.ne(0).any(axis=1)
+    problems = []
+    for index in difference.index[wrong.values]:
+        parts = [column + ' ' + str(int(totals.at[index, column])) + ' vs ' + str(int(expected.at[index, column]))
+                 for column in count_columns if difference.at[index, column] != 0]
+        problems.append('summary total ' + ', '.join(parts))
+    return pd.DataFrame({'Ward': ward[wrong[wrong].index].values, 'Problem': problems}, index=wrong[wrong].index)
+
+
+def ward_totals(df):
+    """
+    Ward Summary totals, a ward listed twice is added up
+
+    :param df: checked lsr from validate_lsr
+    :return dataframe: Indexed and Arbitrated indexed by Ward
+    """
+    ws_mask = (df['Desc'].astype(str).str.strip() == ward_summary).values
+    return df.loc[ws_mask, ['Name'] + count_columns].rename(columns={'Name': 'Ward'}).groupby('Ward').sum()
+
+
+def reconcile(totals, month_data, quarantined, date):
+    """
+    Ward Summary totals next to the sums of the rows merged for each ward
+
+    :param totals: dataframe from ward_totals
+    :param month_data: rows being merged, with Ward
+    :param quarantined: rows left out, with Ward, or None
+    :param date: month of the rows
+    :return dataframe: quality_columns, one row per ward
+    """
+    sums = month_data.groupby('Ward')[count_columns].sum()
+    quality = totals.add_prefix('Summary ').join(sums, how='outer')
+    if quarantined is not None and len(quarantined.index) > 0:
+        quality = quality.join(quarantined.groupby('Ward').size().rename('Quarantined'), how='outer')
+    else:
+        quality['Quarantined'] = 0
+    quality = quality.fillna(0).astype('int64')
+    quality.index.name = 'Ward'
+    quality = quality.reset_index()
+    quality.insert(0, 'Date', date)
+    return quality[quality_columns]
+
+
+def discrepancies(quality, date=None):
+    """
+    wards whose summary totals differ from their merged rows
+
+    :param quality: data quality table
+    :param date: month to check, None for every month
+    :return dataframe: the quality rows plus Indexed Difference and Arbitrated Difference (summary less rows)
+    """
+    if quality is None:
+        return pd.DataFrame(columns=quality_columns + [column + ' Difference' for column in count_columns])
+    if date is not None:
+        quality = quality[quality['Date'] == date]
+    quality = quality.assign(**{column + ' Difference': quality['Summary ' + column] - quality[column]
+                                for column in count_columns})
+    wrong = (quality[[column + ' Difference' for column in count_columns]] != 0).any(axis=1)
+    return quality[wrong].reset_index(drop=True)
@@ -0,0 +1,334 @@
+"""
+Watch the downloads directory and ingest the LSR as soon as it is downloaded
+
+Uses inotify where the platform has it and falls back to polling the directory. A completed download
+is moved and renamed into data/downloads, loaded into the table and handed to a render callback so
+the reports for the new month can be built without anyone pressing a button.
+
+"""
+
+# system imports
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+# package imports
+# module imports
+import fs_reports.archive as archive
+import fs_reports.files as files
+
+# suffixes browsers use while a download is still being written
+partial_suffixes = ['.crdownload', '.part', '.partial', '.download', '.tmp']
+
+# inotify events for a file that is complete, written and closed or renamed into place
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+event_header = struct.Struct('iIII')
+
+
+def is_partial(path):
+    """
+    check if a file is a download still in progress
+
+    :param path: Path to check
+    :return boolean: True for a partial download
+    """
+    return Path(path).suffix.lower() in partial_suffixes
+
+
+def is_lsr_download(path):
+    """
+    check if a file is a completed LSR download, browsers may add ' (1)' to a repeated download
+
+    :param path: Path to check
+    :return boolean: True for a completed LSR csv
+    """
+    path = Path(path)
+    lsr = files.locate_downloaded_lsr()
+    return path.suffix.lower() == lsr.suffix and path.stem.startswith(lsr.stem)
+
+
+def wait_for_stable(path, interval=1.0, checks=2, timeout=60.0):
+    """
+    wait until the size and modified time stop changing
+
+    :param path: Path to watch
+    :param interval: seconds between checks
+    :param checks: number of matching checks in a row needed
+    :param timeout: seconds to wait before giving up
+    :return boolean: True when the file is stable, False if it vanished or never settled
+    """
+    path = Path(path)
+    end = time.monotonic() + timeout
+    last = None
+    matches = 0
+    while time.monotonic() < end:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        current = (stat.st_size, stat.st_mtime_ns)
+        if current == last and stat.st_size > 0:
+            matches += 1
+            if matches >= checks:
+                return True
+        else:
+            matches = 0
+        last = current
+        time.sleep(interval)
+    return False
+
+
+def load_inotify():
+    """
+    the C library when it has inotify
+
+    :return: libc handle or None
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class PollingWatcher:
+    """ find new or changed files by listing the directory
+
+    """
+
+    def __init__(self, directory, interval=1.0):
+        """ remember the directory, the first poll reports files already there
+
+        :param directory: directory to watch
+        :param interval: seconds between listings
+        """
+        self.directory = Path(directory)
+        self.interval = interval
+        self.seen = {}
+        self.first = True
+
+    def poll(self, timeout=None):
+        """
+        wait up to timeout seconds and return the files that appeared or changed
+
+        :param timeout: seconds to wait, None for the polling interval
+        :return list: Paths
+        """
+        if not self.first:
+            time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        self.first = False
+        changed = []
+        current = {}
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            current[path] = (stat.st_size, stat.st_mtime_ns)
+            if self.seen.get(path) != current[path]:
+                changed.append(path)
+        self.seen = current
+        return changed
+
+    def close(self):
+        self.seen = {}
+
+
+class InotifyWatcher:
+    """ find files closed after writing or renamed into the directory with inotify
+
+    """
+
+    def __init__(self, directory, libc):
+        """ start watching
+
+        :param directory: directory to watch
+        :param libc: C library from load_inotify
+        """
+        self.directory = Path(directory)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, str(self.directory).encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for ' + str(self.directory))
+        self.first = True
+
+    def poll(self, timeout=None):
+        """
+        wait up to timeout seconds and return the files completed, the first poll reports files already there
+
+        :param timeout: seconds to wait, None to wait for an event
+        :return list: Paths
+        """
+        if self.first:
+            self.first = False
+            return [path for path in self.directory.iterdir() if path.is_file()]
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = event_header.unpack_from(data, offset)
+            offset += event_header.size
+            name = data[offset:offset + length].rstrip(b'\0').decode()
+            offset += length
+            if name:
+                changed.append(self.directory.joinpath(name))
+        return list(dict.fromkeys(changed))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(directory, interval=1.0, use_inotify=True):
+    """
+    inotify watcher where available, otherwise polling
+
+    :param directory: directory to watch
+    :param interval: polling interval in seconds
+    :param use_inotify: False to always poll
+    :return: watcher with poll and close
+    """
+    libc = load_inotify() if use_inotify else None
+    if libc is not None:
+        try:
+            return InotifyWatcher(directory, libc)
+        except OSError:
+            pass
+    return PollingWatcher(directory, interval)
+
+
+class DownloadWatcher:
+    """ move, ingest and render each LSR that lands in the downloads directory
+
+    """
+
+    def __init__(self, my_data, render=None, directory=None, destination_directory=None,
+                 stable_interval=1.0, poll_interval=1.0, use_inotify=True, save=True, lsr_archive=None):
+        """ set up the watcher
+
+        :param my_data: IndexerValues holding the table
+        :param render: callable(my_data, month) run after a month is merged, for the new month's reports
+        :param directory: directory to watch, default is the folder of files.locate_downloaded_lsr
+        :param destination_directory: where the renamed lsr goes, default files.data_download_directory
+        :param stable_interval: seconds between file stability checks
+        :param poll_interval: seconds between listings when polling
+        :param use_inotify: False to always poll
+        :param save: write the table after each merge
+        :param lsr_archive: LsrArchive, downloads already archived are dropped without ingesting
+        """
+        self.my_data = my_data
+        self.render = render
+        self.directory = Path(directory) if directory is not None else files.locate_downloaded_lsr().parent
+        self.destination_directory = (Path(destination_directory) if destination_directory is not None
+                                      else files.data_download_directory())
+        self.stable_interval = stable_interval
+        self.save = save
+        self.lsr_archive = lsr_archive
+        self.changes = None
+        self.watcher = make_watcher(self.directory, poll_interval, use_inotify)
+        self.status = ''
+
+    def handle(self, path):
+        """
+        process one file reported by the watcher
+
+        :param path: Path of the new file
+        :return datetime: month merged, None when nothing was merged
+        """
+        if is_partial(path) or not is_lsr_download(path):
+            return None
+        if not wait_for_stable(path, self.stable_interval):
+            self.status = 'Download did not finish ' + str(path)
+            return None
+
+        month = self.my_data.next_month
+        destination = self.destination_directory.joinpath(files.build_lsr_name(month))
+        if not files.move_and_rename(path, destination, True, self.lsr_archive,
+                                     files.build_lsr_name(self.my_data.last_month)):
+            self.status = 'Failed to move ' + str(path)
+            return None
+        if self.lsr_archive is not None:
+            result = self.lsr_archive.last
+            # keep the row diff of a changed re-download for the user to review
+            self.changes = result['diff']
+            skipped = archive.not_loaded(result, destination.name)
+            if skipped is not None:
+                self.status = skipped
+                return None
+        return self.ingest(destination, month)
+
+    def ingest(self, file_name, month):
+        """
+        load the month and merge it, then render
+
+        a month with ward names not in the table is left in month_data and bad_wards for the user to fix
+
+        :param file_name: renamed lsr file
+        :param month: month in the file
+        :return datetime: month merged, None when nothing was merged
+        """
+        if self.my_data.load_this_month_file(file_name, month) is None:
+            self.status = month.strftime('%Y %m ') + 'already in table.'
+            return None
+        if self.my_data.bad_wards is not None:
+            self.status = 'Unknown wards ' + ', '.join(str(ward) for ward in self.my_data.bad_wards)
+            return None
+
+        self.my_data.merge_month_to_table()
+        if self.save:
+            self.my_data.write_quarantine(month)
+            self.my_data.write_table()
+        self.status = month.strftime('%Y %m ') + 'loaded.'
+        if self.render is not None:
+            self.render(self.my_data, month)
+        return month
+
+    def run_once(self, timeout=None):
+        """
+        wait for files once and process them
+
+        a file that cannot be loaded (not an LSR, unreadable) or rendered only sets status, the watch goes on
+
+        :param timeout: seconds to wait
+        :return list: months merged
+        """
+        merged = []
+        for path in self.watcher.poll(timeout):
+            try:
+                month = self.handle(path)
+            except (OSError, ValueError) as e:
+                self.status = 'Failed to load ' + path.name + ': ' + str(e)
+                continue
+            if month is not None:
+                merged.append(month)
+        return merged
+
+    def run(self, stop=None, timeout=1.0):
+        """
+        process downloads until stop is set
+
+        :param stop: threading.Event to end the loop, None to run forever
+        :param timeout: seconds between checks of stop
+        :return:
+        """
+        try:
+            while stop is None or not stop.is_set():
+                self.run_once(timeout)
+        finally:
+            self.close()
+
+    def close(self):
+        self.watcher.close()
@@ -27,5 +27,8 @@ setup(name='fs_indexing_reports',
           'Topic :: Religion'
       ],
       keywords='familysearch reports indexing',
-      install_requires=['pandas','numpy'],
+      install_requires=['pandas','numpy','matplotlib'],
+      entry_points={
+          'console_scripts': ['fs-reports=fs_reports.cli:main']
+      },
       zip_safe=False)
\ No newline at end of file